@@ -1,36 +1,58 @@
+import click
+import importlib
+from datetime import datetime, timedelta
 from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import config
-from database import db, init_db
-from data.seed_data import seed_data
+from database import db, init_db, init_engine
+from utils.cache import init_cache
+from utils.fastjson import FastJSONProvider
+from utils.http import init_http
+from utils.metrics import init_metrics
+from utils.passwords import init_password_hasher
+from utils.querywatch import init_query_watch
 
-# Import blueprints
-from routes.auth import auth_bp
-from routes.patient import patient_bp
-from routes.pharmacist import pharmacist_bp
-from routes.admin import admin_bp
+# Blueprints are imported when an app is built rather than when this module
+# is imported, so tooling that only needs the factory doesn't load the routes
+BLUEPRINTS = [
+    ('routes.auth', 'auth_bp', '/api/auth'),
+    ('routes.patient', 'patient_bp', '/api/patient'),
+    ('routes.pharmacist', 'pharmacist_bp', '/api/pharmacist'),
+    ('routes.admin', 'admin_bp', '/api/admin'),
+]
+
+def register_blueprints(app):
+    for module_name, name, url_prefix in BLUEPRINTS:
+        module = importlib.import_module(module_name)
+        app.register_blueprint(getattr(module, name), url_prefix=url_prefix)
 
 def create_app(config_name='default'):
+    # Builds the app without touching the database; schema setup and seeding
+    # are the `flask db upgrade` and `flask seed` commands
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     app.config.from_object(config[config_name])
     
     # Initialize extensions
-    db.init_app(app)
+    init_engine(app)
     JWTManager(app)
     CORS(app)
+    init_cache(app)
+    init_password_hasher(app)
+    init_metrics(app)
+    init_query_watch(app)
+    init_http(app)
     
     # Register blueprints
-    app.register_blueprint(auth_bp, url_prefix='/api/auth')
-    app.register_blueprint(patient_bp, url_prefix='/api/patient')
-    app.register_blueprint(pharmacist_bp, url_prefix='/api/pharmacist')
-    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    register_blueprints(app)
     
-    # Initialize database
-    with app.app_context():
-        init_db(app)
-        # Seed initial data
-        seed_data()
+    from utils.replica import init_replica
+    init_replica(app)
+    
+    if app.config.get('HOLD_SWEEPER_ENABLED') and not app.testing:
+        from utils.holds import start_hold_sweeper
+        start_hold_sweeper(app)
     
     # Error handlers
     @app.errorhandler(404)
@@ -41,6 +63,94 @@ def create_app(config_name='default'):
     def internal_error(error):
         return jsonify({'message': 'Internal server error'}), 500
     
+    @app.cli.command('rebuild-stats')
+    @click.option('--days', type=int, default=None, help='Only rebuild the last N days')
+    def rebuild_stats_command(days):
+        """Recompute the daily analytics rollup from the base tables."""
+        from utils.rollups import rebuild_daily_stats
+        
+        start = datetime.utcnow().date() - timedelta(days=days) if days else None
+        click.echo(f'Rebuilt {rebuild_daily_stats(start=start)} rollup rows')
+    
+    @app.cli.group('db')
+    def db_command():
+        """Schema migrations."""
+    
+    @db_command.command('upgrade')
+    def db_upgrade_command():
+        """Create missing tables, apply pending migrations and build the search index."""
+        applied = init_db(app)
+        for version, description in applied:
+            click.echo(f'Applied {version}: {description}')
+        click.echo(f'{len(applied)} migration(s) applied')
+    
+    @db_command.command('current')
+    def db_current_command():
+        """Show the schema version and pending migrations."""
+        from migrations import current_version, pending_migrations
+        
+        with db.engine.begin() as conn:
+            click.echo(f'Schema version: {current_version(conn)}')
+            for version, description, _ in pending_migrations(conn):
+                click.echo(f'Pending {version}: {description}')
+    
+    @db_command.command('sync-replica')
+    def db_sync_replica_command():
+        """Copy the primary SQLite database over the replica (local testing)."""
+        import sqlite3
+        
+        engines = db.engines
+        if 'replica' not in engines:
+            raise click.ClickException('No replica bind configured, set REPLICA_DATABASE_URL')
+        if {engine.dialect.name for engine in (db.engine, engines['replica'])} != {'sqlite'}:
+            raise click.ClickException('sync-replica only copies SQLite files')
+            
+        source = sqlite3.connect(db.engine.url.database)
+        target = sqlite3.connect(engines['replica'].url.database)
+        with target:
+            source.backup(target)
+        source.close()
+        target.close()
+        click.echo(f"Copied {db.engine.url.database} to {engines['replica'].url.database}")
+    
+    @app.cli.command('seed')
+    def seed_command():
+        """Insert the demo medications, users, pharmacies and inventory."""
+        from data.seed_data import seed_data
+    
+        added = seed_data()
+        click.echo('Added ' + ', '.join(f'{count} {table}' for table, count in added.items()))
+    
+    @app.cli.command('generate-data')
+    @click.option('--pharmacies', type=int, default=200, show_default=True)
+    @click.option('--medications', type=int, default=500, show_default=True)
+    @click.option('--density', type=float, default=0.2, show_default=True, help='Fraction of the catalogue each pharmacy stocks')
+    @click.option('--patients', type=int, default=5000, show_default=True)
+    @click.option('--reservations', type=int, default=50000, show_default=True)
+    @click.option('--months', type=int, default=6, show_default=True, help='History covered by reservations and subscriptions')
+    @click.option('--advertisements', type=int, default=50, show_default=True)
+    @click.option('--seed', type=int, default=42, show_default=True)
+    @click.option('--end', type=click.DateTime(['%Y-%m-%d']), default=None, help='Last day of history (default: today)')
+    @click.option('--batch-size', type=int, default=20000, show_default=True)
+    def generate_data_command(**options):
+        """Add a reproducible synthetic dataset for load and performance testing."""
+        from data.generator import generate_dataset
+
+        def progress(table, rows, seconds):
+            click.echo(f'{table:<16} {rows:>10} rows {seconds:>8.1f} s {rows / max(seconds, 1e-9):>10.0f} rows/s')
+
+        start = datetime.utcnow()
+        added = generate_dataset(progress=progress, **options)
+        click.echo(f'Added {sum(added.values())} rows in {(datetime.utcnow() - start).total_seconds():.1f} s')
+
+    @app.cli.command('sweep-holds')
+    def sweep_holds_command():
+        """Expire overdue reservations and return their stock."""
+        from utils.holds import run_sweep
+    
+        released, units, duration = run_sweep(app)
+        click.echo(f'Released {released} holds ({units} units) in {duration * 1000:.1f} ms')
+    
     # Health check endpoint
     @app.route('/api/health')
     def health_check():
@@ -49,5 +159,11 @@ def create_app(config_name='default'):
     return app
 
 if __name__ == '__main__':
+    from data.seed_data import seed_data
+    
     app = create_app()
+    # The development server prepares its own database
+    init_db(app)
+    with app.app_context():
+        seed_data()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""SQL statements per protected request: DB-backed auth vs. token claims.
+
+A "legacy" token carries only the user id, which is what every token looked
+like before role/pharmacy claims were added, so it exercises the old
+lookup-per-request path.
+
+Usage: python benchmarks/bench_auth_queries.py [--requests 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings('ignore')
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_db_dir, 'bench.db'))
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import create_app
+from data.seed_data import seed_data
+from database import db, init_db
+from models import User
+from utils.helpers import create_user_token
+
+ENDPOINTS = [
+    ('pharmacist@example.com', '/api/pharmacist/inventory'),
+    ('pharmacist@example.com', '/api/pharmacist/reservations'),
+    ('pharmacist@example.com', '/api/pharmacist/dashboard'),
+    ('patient@example.com', '/api/patient/reservations'),
+    ('admin@example.com', '/api/admin/users'),
+]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    init_db(app)
+    with app.app_context():
+        seed_data()
+    client = app.test_client()
+    statements = [0]
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+        tokens = {}
+        for email, _ in ENDPOINTS:
+            user = User.query.filter_by(email=email).first()
+            tokens[email] = {
+                'legacy': create_access_token(identity=user.id),
+                'claims': create_user_token(user)
+            }
+
+    print(f"{'endpoint':<32} {'legacy q/req':>12} {'claims q/req':>12} {'legacy ms':>10} {'claims ms':>10}")
+    for email, url in ENDPOINTS:
+        row = {}
+        for kind in ('legacy', 'claims'):
+            headers = {'Authorization': 'Bearer ' + tokens[email][kind]}
+            client.get(url, headers=headers)  # warm caches
+
+            statements[0] = 0
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                response = client.get(url, headers=headers)
+                assert response.status_code == 200, response.get_json()
+            elapsed = time.perf_counter() - start
+            row[kind] = (statements[0] / args.requests, elapsed / args.requests * 1000)
+
+        print(f"{url:<32} {row['legacy'][0]:>12.1f} {row['claims'][0]:>12.1f} "
+              f"{row['legacy'][1]:>10.2f} {row['claims'][1]:>10.2f}")
+
+if __name__ == '__main__':
+    main()
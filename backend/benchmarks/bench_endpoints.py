@@ -0,0 +1,252 @@
+"""Endpoint benchmark suite: the real blueprints through the Flask test client.
+
+Generates a synthetic dataset (data/generator.py) at --scale, or reuses the
+SQLite file given with --database, then runs each endpoint in ENDPOINTS
+--requests times after --warmup requests. The dataset's end date is kept
+next to the database (<file>.json) so a reused file is measured over the
+same analytics windows. Reported per endpoint:
+
+  p50/p95/p99   latency in ms, including reading the body
+  req/s         serial throughput (one client, no think time)
+  sql/req       median SQL statements executed per request
+  peak KiB      largest Python allocation peak of one request (tracemalloc,
+                measured in a separate pass so it doesn't skew latency)
+
+--output writes the results as JSON. --baseline compares against an earlier
+file and exits non-zero when an endpoint's p50 or p95 grew by more than
+--threshold percent (and by more than --min-delta-ms), or when it started
+issuing more SQL statements. Runs entirely offline.
+
+Usage: python benchmarks/bench_endpoints.py [--scale small|medium|large] [--database PATH]
+                                            [--requests 200] [--warmup 5] [--only NAME ...]
+                                            [--output results.json]
+                                            [--baseline results.json] [--threshold 20]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings('ignore')
+
+# generate_dataset() arguments per scale
+SCALES = {
+    'small': {'pharmacies': 200, 'medications': 500, 'density': 0.2, 'patients': 5000, 'reservations': 50000, 'months': 6},
+    'medium': {'pharmacies': 1000, 'medications': 2000, 'density': 0.1, 'patients': 50000, 'reservations': 500000, 'months': 12},
+    'large': {'pharmacies': 2000, 'medications': 5000, 'density': 0.1, 'patients': 200000, 'reservations': 5000000, 'months': 12},
+}
+
+# (name, role, url); {start} and {end} are the last 30 days of the dataset
+ENDPOINTS = [
+    ('search_pharmacies', 'patient', '/api/patient/pharmacies/search?medication=amoxicillin&lat=-1.2864&lng=36.8172&max_distance=10'),
+    ('search_pharmacies_nearest', 'patient', '/api/patient/pharmacies/search?medication=paracetamol&lat=-1.2864&lng=36.8172&limit=20'),
+    ('search_medications', 'patient', '/api/patient/medications/search?q=amoxicilin'),
+    ('patient_reservations', 'patient', '/api/patient/reservations'),
+    ('patient_reservations_cursor', 'patient', '/api/patient/reservations?after='),
+    ('pharmacist_dashboard', 'pharmacist', '/api/pharmacist/dashboard'),
+    ('pharmacist_inventory', 'pharmacist', '/api/pharmacist/inventory?page=3&per_page=20'),
+    ('pharmacist_reservations', 'pharmacist', '/api/pharmacist/reservations?page=10&per_page=20'),
+    ('pharmacist_reservations_cursor', 'pharmacist', '/api/pharmacist/reservations?after=&per_page=20'),
+    ('admin_dashboard', 'admin', '/api/admin/dashboard'),
+    ('admin_users', 'admin', '/api/admin/users?page=50&per_page=20'),
+    ('admin_users_cursor', 'admin', '/api/admin/users?after=&per_page=20'),
+    ('admin_analytics', 'admin', '/api/admin/analytics?start_date={start}&end_date={end}'),
+    ('admin_analytics_monthly', 'admin', '/api/admin/analytics?start_date={year_start}&end_date={end}&bucket=month'),
+]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def prepare_database(app, database, scale, seed):
+    # Returns (generation stats or None when reused, the dataset's end)
+    from sqlalchemy import func
+    from data.generator import generate_dataset
+    from database import db, init_db
+    from models import Reservation, User
+
+    info_path = database + '.json'
+    init_db(app)
+    with app.app_context():
+        if User.query.first() is not None:
+            if os.path.exists(info_path):
+                with open(info_path) as info:
+                    return None, datetime.fromisoformat(json.load(info)['end'])
+            # Generated before the end was recorded: the newest reservation is close
+            return None, db.session.query(func.max(Reservation.created_at)).scalar() or datetime.utcnow()
+
+        end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = time.perf_counter()
+        added = generate_dataset(seed=seed, end=end, **SCALES[scale])
+        with open(info_path, 'w') as info:
+            json.dump({'scale': scale, 'seed': seed, 'end': end.isoformat()}, info)
+        return {'rows': sum(added.values()), 'seconds': round(time.perf_counter() - start, 1)}, end
+
+def pick_users(app):
+    # The busiest patient and pharmacy, so list endpoints have pages to serve
+    from sqlalchemy import func
+    from database import db
+    from models import Inventory, Pharmacy, Reservation, User
+    from utils.helpers import create_user_token
+
+    with app.app_context():
+        patient_id = db.session.query(Reservation.user_id).group_by(Reservation.user_id).order_by(
+            func.count(Reservation.id).desc()
+        ).limit(1).scalar()
+        # current_auth() resolves a pharmacist to their first pharmacy
+        first_pharmacies = db.session.query(func.min(Pharmacy.id)).group_by(Pharmacy.owner_id).subquery()
+        pharmacy_id = db.session.query(Inventory.pharmacy_id).filter(
+            Inventory.pharmacy_id.in_(db.session.query(first_pharmacies))
+        ).group_by(Inventory.pharmacy_id).order_by(func.count(Inventory.id).desc()).limit(1).scalar()
+        pharmacist_id = db.session.get(Pharmacy, pharmacy_id).owner_id
+        admin = User.query.filter_by(role='admin').order_by(User.id).first()
+
+        return {
+            role: {'Authorization': 'Bearer ' + create_user_token(db.session.get(User, user_id))}
+            for role, user_id in (('patient', patient_id), ('pharmacist', pharmacist_id), ('admin', admin.id))
+        }
+
+def run_endpoint(client, headers, url, requests, warmup, counter):
+    def get():
+        response = client.get(url, headers=headers)
+        body = response.get_data()
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} returned {response.status_code}: {body[:200]!r}')
+        return body
+
+    for _ in range(warmup):
+        get()
+
+    latencies = []
+    statements = []
+    for _ in range(requests):
+        counter[0] = 0
+        start = time.perf_counter()
+        get()
+        latencies.append((time.perf_counter() - start) * 1000)
+        statements.append(counter[0])
+
+    # Separate pass for memory: tracemalloc slows every allocation down
+    peak = 0
+    tracemalloc.start()
+    for _ in range(min(requests, 5)):
+        tracemalloc.reset_peak()
+        get()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'rps': round(requests / (sum(latencies) / 1000), 1),
+        'sql_per_request': statistics.median(statements),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+def compare(results, baseline, threshold, min_delta_ms):
+    # Returns the regressions against a baseline results file
+    regressions = []
+    print(f"\n{'endpoint':<32} {'p50 base':>9} {'p50 now':>9} {'p95 base':>9} {'p95 now':>9} {'sql':>9}  verdict")
+    for name, now in results['endpoints'].items():
+        base = baseline['endpoints'].get(name)
+        if base is None:
+            continue
+
+        problems = []
+        for metric in ('p50_ms', 'p95_ms'):
+            delta = now[metric] - base[metric]
+            if delta > min_delta_ms and delta > base[metric] * threshold / 100:
+                problems.append(f'{metric} +{delta / base[metric] * 100:.0f}%')
+        if now['sql_per_request'] > base['sql_per_request']:
+            problems.append(f"sql {base['sql_per_request']:g} -> {now['sql_per_request']:g}")
+
+        sql = f"{base['sql_per_request']:g}->{now['sql_per_request']:g}"
+        verdict = 'REGRESSED ' + ', '.join(problems) if problems else 'ok'
+        print(f"{name:<32} {base['p50_ms']:>9.2f} {now['p50_ms']:>9.2f} {base['p95_ms']:>9.2f} {now['p95_ms']:>9.2f} {sql:>9}  {verdict}")
+        if problems:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--database', help='SQLite file to reuse (generated on first use)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='run only these endpoints')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=20, help='allowed p50/p95 growth in percent')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='ignore latency changes smaller than this')
+    args = parser.parse_args()
+
+    database = args.database or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(database)
+
+    from sqlalchemy import event
+    from app import create_app
+    from database import db
+
+    app = create_app()
+    app.config['DEBUG'] = False
+    generated, end = prepare_database(app, os.path.abspath(database), args.scale, args.seed)
+    headers = pick_users(app)
+    client = app.test_client()
+
+    counter = [0]
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', lambda *_: counter.__setitem__(0, counter[0] + 1))
+
+    last_day = end.date()
+    dates = {
+        'start': (last_day - timedelta(days=30)).isoformat(), 'end': last_day.isoformat(),
+        'year_start': (last_day - timedelta(days=365)).isoformat()
+    }
+
+    results = {
+        'meta': {
+            'scale': args.scale if generated or not args.database else 'reused',
+            'database': database, 'generated': generated, 'dataset_end': end.isoformat(), 'requests': args.requests,
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+        },
+        'endpoints': {}
+    }
+
+    print(f"{'endpoint':<32} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'sql/req':>8} {'peak KiB':>9}")
+    for name, role, url in ENDPOINTS:
+        if args.only and name not in args.only:
+            continue
+        result = run_endpoint(client, headers[role], url.format(**dates), args.requests, args.warmup, counter)
+        results['endpoints'][name] = result
+        print(f"{name:<32} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+              f"{result['rps']:>8.0f} {result['sql_per_request']:>8g} {result['peak_kib']:>9.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f'\nwrote {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} endpoint(s) regressed beyond {args.threshold:g}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print('\nno regressions')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Write and read throughput per database engine profile.
+
+Runs the same workload against each profile with --workers concurrent
+worker processes (like gunicorn workers sharing one database):
+
+  write  POST /api/patient/reservations (conditional stock UPDATE + INSERT)
+  read   GET /api/patient/reservations and a medication search
+  mixed  one write to three reads
+
+Profiles:
+  sqlite-default  no pragmas (rollback journal, synchronous=FULL)
+  sqlite-tuned    Config.SQLITE_PRAGMAS (WAL, synchronous=NORMAL, busy_timeout, mmap, cache)
+  postgresql      only with --postgres-url (needs psycopg2-binary and an empty database)
+
+Usage: python benchmarks/bench_engine_profiles.py [--requests 1000] [--workers 8]
+                                                 [--postgres-url postgresql://...]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings('ignore')
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_db_dir, 'bench.db'))
+
+from config import Config, config
+from app import create_app
+from data.seed_data import seed_data
+from database import db, init_db
+from models import Inventory, User
+from utils.helpers import create_user_token
+
+_app = None
+_client = None
+_headers = None
+_target = None
+
+def _init_worker():
+    # Forked workers must not share the parent's pooled connections
+    global _client
+    with _app.app_context():
+        db.engine.dispose(close=False)
+    _client = _app.test_client()
+
+def _write(_):
+    start = time.perf_counter()
+    response = _client.post('/api/patient/reservations', headers=_headers, json=_target)
+    return response.status_code == 201, time.perf_counter() - start
+
+def _read(i):
+    url = '/api/patient/reservations?after=' if i % 2 else '/api/patient/pharmacies/search?medication=panadol'
+    start = time.perf_counter()
+    response = _client.get(url, headers=_headers)
+    return response.status_code == 200, time.perf_counter() - start
+
+def _mixed(i):
+    # Readers and writers at once, where rollback-journal readers block on the writer
+    return _write(i) if i % 4 == 0 else _read(i)
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def profiles(postgres_url):
+    yield 'sqlite-default', {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(_db_dir, 'default.db'),
+        'SQLITE_PRAGMAS': {}
+    }
+    yield 'sqlite-tuned', {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(_db_dir, 'tuned.db'),
+        'SQLITE_PRAGMAS': Config.SQLITE_PRAGMAS
+    }
+    if postgres_url:
+        yield 'postgresql', {'SQLALCHEMY_DATABASE_URI': postgres_url}
+
+def run_phase(task, requests, workers):
+    context = multiprocessing.get_context('fork')
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        results = list(pool.map(task, range(requests), chunksize=8))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency * 1000 for _, latency in results]
+    errors = sum(1 for ok, _ in results if not ok)
+    return requests / elapsed, percentile(latencies, 50), percentile(latencies, 99), errors
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--postgres-url', help='empty PostgreSQL database to include in the comparison')
+    args = parser.parse_args()
+
+    global _app, _headers, _target
+    print(f"{'profile':<16} {'phase':<6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+
+    for name, overrides in profiles(args.postgres_url):
+        config['bench'] = type('BenchConfig', (Config,), overrides)
+        _app = create_app('bench')
+        init_db(_app)
+        with _app.app_context():
+            seed_data()
+
+        with _app.app_context():
+            inventory = Inventory.query.order_by(Inventory.id).first()
+            inventory.stock_quantity = 10 ** 9
+            db.session.commit()
+            _target = {'pharmacy_id': inventory.pharmacy_id, 'medication_id': inventory.medication_id, 'quantity': 1}
+            patient = User.query.filter_by(role='patient').first()
+            _headers = {'Authorization': 'Bearer ' + create_user_token(patient)}
+            db.engine.dispose()
+
+        for phase, task in (('write', _write), ('read', _read), ('mixed', _mixed)):
+            rate, p50, p99, errors = run_phase(task, args.requests, args.workers)
+            print(f'{name:<16} {phase:<6} {rate:>8.0f} {p50:>8.1f} {p99:>8.1f} {errors:>7}')
+
+if __name__ == '__main__':
+    main()
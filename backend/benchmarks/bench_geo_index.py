@@ -0,0 +1,58 @@
+"""Pharmacy search latency: full haversine scan vs. grid index.
+
+Usage: python benchmarks/bench_geo_index.py [--queries 50] [--radius 10]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.geo import GridIndex, calculate_distance
+
+# Rough bounding box of Kenya
+LAT_RANGE = (-4.7, 5.0)
+LNG_RANGE = (33.9, 41.9)
+SIZES = [100, 1000, 10000, 100000]
+
+def random_point(rng):
+    return rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)
+
+def full_scan(points, lat, lng, radius_km):
+    matches = []
+    for point_id, plat, plng in points:
+        distance = calculate_distance(lat, lng, plat, plng)
+        if distance <= radius_km:
+            matches.append((distance, point_id))
+    matches.sort()
+    return matches
+
+def timed(fn, origins):
+    start = time.perf_counter()
+    for lat, lng in origins:
+        fn(lat, lng)
+    return (time.perf_counter() - start) / len(origins) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--radius', type=float, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    origins = [random_point(rng) for _ in range(args.queries)]
+
+    print(f"{'pharmacies':>10} {'scan ms':>10} {'grid ms':>10} {'speedup':>8}")
+    for size in SIZES:
+        points = [(i, *random_point(rng)) for i in range(size)]
+        grid = GridIndex().build(points)
+
+        scan_ms = timed(lambda lat, lng: full_scan(points, lat, lng, args.radius), origins)
+        grid_ms = timed(lambda lat, lng: grid.within(lat, lng, args.radius), origins)
+
+        print(f"{size:>10} {scan_ms:>10.3f} {grid_ms:>10.3f} {scan_ms / grid_ms:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Scalar calculate_distance loop vs. vectorized haversine_many.
+
+Usage: python benchmarks/bench_haversine.py [--repeat 5] [--top 10]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from utils.geo import calculate_distance, haversine_many, nearest_k
+
+LAT_RANGE = (-4.7, 5.0)
+LNG_RANGE = (33.9, 41.9)
+SIZES = [1000, 10000, 100000]
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    lat, lng = -1.286389, 36.817223  # Nairobi
+
+    print(f"{'points':>8} {'scalar ms':>10} {'numpy ms':>10} {'top-k ms':>9} {'speedup':>8} {'mismatches':>11}")
+    for size in SIZES:
+        lats = [rng.uniform(*LAT_RANGE) for _ in range(size)]
+        lngs = [rng.uniform(*LNG_RANGE) for _ in range(size)]
+
+        # Radians are cached once per index build, so they are not timed
+        lat_rad = np.radians(np.array(lats))
+        lng_rad = np.radians(np.array(lngs))
+        cos_lat = np.cos(lat_rad)
+
+        scalar_ms, expected = best_of(
+            lambda: [calculate_distance(lat, lng, a, b) for a, b in zip(lats, lngs)], args.repeat
+        )
+        numpy_ms, actual = best_of(
+            lambda: haversine_many(lat, lng, lat_rad, lng_rad, cos_lat), args.repeat
+        )
+        top_ms, _ = best_of(lambda: nearest_k(actual, args.top), args.repeat)
+
+        mismatches = int(np.count_nonzero(np.array(expected) != actual))
+        print(f"{size:>8} {scalar_ms:>10.3f} {numpy_ms:>10.3f} {top_ms:>9.3f} "
+              f"{scalar_ms / numpy_ms:>7.1f}x {mismatches:>11}")
+
+if __name__ == '__main__':
+    main()
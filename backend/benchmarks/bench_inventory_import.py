@@ -0,0 +1,81 @@
+"""Bulk inventory import vs. one POST /inventory call per item.
+
+Creates --rows medications, then imports stock for all of them through
+POST /api/pharmacist/inventory/import (CSV and NDJSON) and times a sample
+of --sample single-item calls for comparison.
+
+Usage: python benchmarks/bench_inventory_import.py [--rows 50000] [--sample 500]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings('ignore')
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_db_dir, 'bench.db'))
+
+from app import create_app
+from data.seed_data import seed_data
+from database import db, init_db
+from models import Medication, User
+from utils.helpers import create_user_token
+
+def build_file(fmt, names):
+    if fmt == 'csv':
+        lines = ['name,stock_quantity,price']
+        lines += [f'{name},{i % 200},{1 + i % 50}.50' for i, name in enumerate(names)]
+    else:
+        lines = [json.dumps({'name': name, 'stock_quantity': i % 200, 'price': 1 + i % 50 + 0.5})
+                 for i, name in enumerate(names)]
+    return ('\n'.join(lines) + '\n').encode()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--sample', type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    init_db(app)
+    with app.app_context():
+        seed_data()
+    client = app.test_client()
+
+    with app.app_context():
+        first = (db.session.query(db.func.max(Medication.id)).scalar() or 0) + 1
+        names = [f'Bench Medication {i}' for i in range(args.rows)]
+        db.session.execute(Medication.__table__.insert(), [{'name': name, 'category': 'Bench'} for name in names])
+        db.session.commit()
+
+        pharmacist = User.query.filter_by(email='pharmacist@example.com').first()
+        headers = {'Authorization': 'Bearer ' + create_user_token(pharmacist)}
+
+    print(f"{'method':<24} {'rows':>8} {'seconds':>9} {'rows/s':>10} {'failed':>7}")
+    for fmt, content_type in (('csv', 'text/csv'), ('ndjson', 'application/x-ndjson')):
+        body = build_file(fmt, names)
+        start = time.perf_counter()
+        response = client.post(
+            '/api/pharmacist/inventory/import', headers=headers,
+            data={'file': (io.BytesIO(body), f'stock.{fmt}', content_type)}
+        )
+        elapsed = time.perf_counter() - start
+        report = response.get_json()['report']
+        print(f"{'import ' + fmt:<24} {report['rows']:>8} {elapsed:>9.2f} {report['rows'] / elapsed:>10.0f} {report['failed']:>7}")
+
+    start = time.perf_counter()
+    for i in range(args.sample):
+        client.post('/api/pharmacist/inventory', headers=headers,
+                    json={'medication_id': first + i, 'stock_quantity': 5, 'price': 2.5})
+    elapsed = time.perf_counter() - start
+    print(f"{'single-item calls':<24} {args.sample:>8} {elapsed:>9.2f} {args.sample / elapsed:>10.0f} {'-':>7}")
+    print(f"projected single-item time for {args.rows} rows: {elapsed / args.sample * args.rows:.0f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Response serialization: to_dict() + stdlib json vs. serializer dumps + orjson.
+
+Loads --rows reservations (with medication and pharmacy eager-loaded) and
+times turning them into a JSON body with each half of the change on its own
+and both together, plus peak memory of a buffered body against stream_json().
+Checks that every variant produces the same bytes as Flask's stock jsonify()
+(exits non-zero if not).
+
+Usage: python benchmarks/bench_json.py [--rows 5000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings('ignore')
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_db_dir, 'bench.db'))
+
+from flask.json.provider import DefaultJSONProvider
+from app import create_app
+from data.seed_data import seed_data
+from database import db, init_db
+from models import Inventory, Reservation, User
+from utils import serializers
+from utils.fastjson import stream_json
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best * 1000
+
+def peak_kib(function):
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    init_db(app)
+    with app.app_context():
+        seed_data()
+    app.config['DEBUG'] = False
+    stock = DefaultJSONProvider(app)
+    fast = app.json
+
+    with app.app_context():
+        patient = User.query.filter_by(role='patient').first()
+        inventory = Inventory.query.first()
+        now = datetime.utcnow()
+        db.session.execute(Reservation.__table__.insert(), [{
+            'user_id': patient.id, 'pharmacy_id': inventory.pharmacy_id, 'medication_id': inventory.medication_id,
+            'quantity': 1 + i % 3, 'unit_price': inventory.price, 'status': 'pending',
+            'customer_name': f'Customer {i}', 'customer_phone': '+254700000000', 'notes': 'Pick up after 5pm',
+            'created_at': now - timedelta(minutes=i)
+        } for i in range(args.rows)])
+        db.session.commit()
+
+    with app.test_request_context():
+        rows = serializers.reservations.prepare(Reservation.query).all()
+
+        def old():
+            return stock.dumps({'items': [row.to_dict() for row in rows]}, separators=(',', ':')) + '\n'
+
+        def dumped():
+            return stock.dumps({'items': serializers.reservations.dump(rows)}, separators=(',', ':')) + '\n'
+
+        def encoded():
+            return fast.dumps({'items': [row.to_dict() for row in rows]}, separators=(',', ':')) + '\n'
+
+        def new():
+            return fast.dumps({'items': serializers.reservations.dump(rows)}, separators=(',', ':')) + '\n'
+
+        def streamed():
+            response = stream_json({'items': serializers.reservations.iter_dump(rows)})
+            return ''.join(response.response)
+
+        def drained():
+            # What a server does with the stream: send each chunk and drop it
+            response = stream_json({'items': serializers.reservations.iter_dump(rows)})
+            return sum(len(chunk) for chunk in response.response)
+
+        expected, old_ms = timed(old, args.repeat)
+        dumped_body, dumped_ms = timed(dumped, args.repeat)
+        encoded_body, encoded_ms = timed(encoded, args.repeat)
+        body, new_ms = timed(new, args.repeat)
+        streamed_body, stream_ms = timed(streamed, args.repeat)
+        old_pretty = stock.dumps({'items': [row.to_dict() for row in rows[:50]]}, indent=2)
+        new_pretty = fast.dumps({'items': serializers.reservations.dump(rows[:50])}, indent=2)
+
+        print(f"rows: {len(rows)}")
+        print(f"{'variant':<34} {'ms':>9} {'peak KiB':>10}")
+        print(f"{'to_dict + stdlib json':<34} {old_ms:>9.1f} {peak_kib(old):>10.0f}")
+        print(f"{'serializer + stdlib json':<34} {dumped_ms:>9.1f} {peak_kib(dumped):>10.0f}")
+        print(f"{'to_dict + fast provider':<34} {encoded_ms:>9.1f} {peak_kib(encoded):>10.0f}")
+        print(f"{'serializer + fast provider':<34} {new_ms:>9.1f} {peak_kib(new):>10.0f}")
+        print(f"{'serializer + stream_json':<34} {stream_ms:>9.1f} {peak_kib(drained):>10.0f}")
+
+        identical = expected == dumped_body == encoded_body == body == streamed_body and new_pretty == old_pretty
+        print(f"byte-identical to stock jsonify: {identical}")
+        sys.exit(0 if identical else 1)
+
+if __name__ == '__main__':
+    main()
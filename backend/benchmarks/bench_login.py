@@ -0,0 +1,149 @@
+"""Search latency under a concurrent login burst.
+
+Runs pharmacy searches serially from the main thread while --logins threads
+sign in as generated patients as fast as they can, in three phases:
+
+  idle     no login load (the reference)
+  inline   bcrypt in the request threads (PASSWORD_HASH_WORKERS=0)
+  pool     bcrypt in the bounded, lower-priority process pool
+
+and reports search p50/p95/p99, logins per second and logins turned away
+with 503 because the hashing queue was full. Exits non-zero if the pool
+phase's search p50 or p99 is more than --threshold percent (and
+--min-delta-ms) above idle. Hashing uses the configured BCRYPT_LOG_ROUNDS.
+The login threads share the interpreter with the searches, so their own
+request handling still shows up in the search latencies.
+
+Usage: python benchmarks/bench_login.py [--logins 8] [--searches 300] [--workers 1]
+                                        [--max-queue 4] [--threshold 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings('ignore')
+
+SEARCH_URL = '/api/patient/pharmacies/search?medication=amoxicillin&lat=-1.2864&lng=36.8172&max_distance=10'
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def login_load(app, emails, stop, counts):
+    # One client per thread, cycling through the accounts; turned away
+    # clients wait out Retry-After like a well-behaved frontend would
+    client = app.test_client()
+    index = 0
+    while not stop.is_set():
+        response = client.post('/api/auth/login', json={'email': emails[index % len(emails)], 'password': 'password'})
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+        index += 1
+        if response.status_code == 503:
+            stop.wait(float(response.headers.get('Retry-After', 1)))
+
+def run_phase(app, headers, emails, logins, searches):
+    client = app.test_client()
+    for _ in range(5):
+        client.get(SEARCH_URL, headers=headers)
+
+    stop = threading.Event()
+    counts = [{} for _ in range(logins)]
+    threads = [threading.Thread(target=login_load, args=(app, emails, stop, counts[i])) for i in range(logins)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5 if logins else 0)  # let the burst build up
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(searches):
+        request_start = time.perf_counter()
+        response = client.get(SEARCH_URL, headers=headers)
+        response.get_data()
+        if response.status_code != 200:
+            raise RuntimeError(f'search returned {response.status_code}')
+        latencies.append((time.perf_counter() - request_start) * 1000)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    totals = {}
+    for thread_counts in counts:
+        for status, count in thread_counts.items():
+            totals[status] = totals.get(status, 0) + count
+    unexpected = {status: count for status, count in totals.items() if status not in (200, 503)}
+    if unexpected:
+        raise RuntimeError(f'unexpected login responses: {unexpected}')
+
+    return {
+        'p50_ms': percentile(latencies, 50), 'p95_ms': percentile(latencies, 95), 'p99_ms': percentile(latencies, 99),
+        'logins_per_s': totals.get(200, 0) / elapsed, 'rejected': totals.get(503, 0),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=8, help='concurrent login threads')
+    parser.add_argument('--searches', type=int, default=300, help='search requests per phase')
+    parser.add_argument('--workers', type=int, default=1, help='PASSWORD_HASH_WORKERS for the pool phase')
+    parser.add_argument('--max-queue', type=int, default=4, help='PASSWORD_HASH_MAX_QUEUE for the pool phase')
+    parser.add_argument('--threshold', type=float, default=50, help='allowed search p50/p99 growth in percent')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'login.db')
+
+    from app import create_app
+    from data.generator import generate_dataset
+    from database import db, init_db
+    from models import User
+    from utils.helpers import create_user_token
+    from utils.passwords import init_password_hasher
+
+    app = create_app()
+    app.config['DEBUG'] = False
+    init_db(app)
+    with app.app_context():
+        generate_dataset(pharmacies=100, medications=200, patients=200, reservations=0, months=1)
+        emails = [email for (email,) in db.session.query(User.email).filter_by(role='patient').limit(100)]
+        patient = User.query.filter_by(role='patient').first()
+        headers = {'Authorization': 'Bearer ' + create_user_token(patient)}
+
+    phases = [
+        ('idle', 0, {'PASSWORD_HASH_WORKERS': 0}),
+        ('inline', args.logins, {'PASSWORD_HASH_WORKERS': 0}),
+        ('pool', args.logins, {'PASSWORD_HASH_WORKERS': args.workers, 'PASSWORD_HASH_MAX_QUEUE': args.max_queue}),
+    ]
+    print(f"bcrypt rounds {app.config['BCRYPT_LOG_ROUNDS']}, {args.logins} login threads, {os.cpu_count()} CPU(s)\n")
+    print(f"{'phase':<8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'logins/s':>9} {'rejected':>9}")
+    results = {}
+    for name, logins, settings in phases:
+        app.config.update(settings)
+        hasher = init_password_hasher(app)
+        if hasher.workers:
+            # Start the pool before measuring, as a running server would have
+            with app.test_request_context():
+                hasher.hash('warmup')
+        result = results[name] = run_phase(app, headers, emails, logins, args.searches)
+        hasher.shutdown()
+        print(f"{name:<8} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+              f"{result['logins_per_s']:>9.1f} {result['rejected']:>9}")
+
+    print()
+    regressed = False
+    for metric in ('p50_ms', 'p99_ms'):
+        idle, pool = results['idle'][metric], results['pool'][metric]
+        verdict = 'ok'
+        if pool - idle > args.min_delta_ms and pool > idle * (1 + args.threshold / 100):
+            regressed = True
+            verdict = f'REGRESSED +{(pool / idle - 1) * 100:.0f}% (limit {args.threshold:g}%)'
+        print(f'search {metric[:3]} with the pool under login load: {pool:.2f} ms vs {idle:.2f} ms idle  {verdict}')
+    if regressed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Cold start: `import app` plus create_app(), each run in a fresh interpreter.
+
+This is what every gunicorn worker and every test client pays. create_app()
+must not touch the database, so each run points at a database file that does
+not exist yet and fails if the file was created. For comparison, the script
+also times the one-off `flask db upgrade` + `flask seed` work on that empty
+database, which create_app() used to do on every boot.
+
+Exits non-zero if the median import + create_app time is over --budget-ms,
+so CI can hold the line.
+
+Usage: python benchmarks/bench_startup.py [--runs 10] [--budget-ms 750]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, os, sys, time
+sys.path.insert(0, {backend!r})
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+timings = {{'import': imported - start, 'create_app': created - imported,
+            'touched_db': os.path.exists({database!r})}}
+if {setup!r}:
+    from data.seed_data import seed_data
+    app.init_db(application)
+    with application.app_context():
+        seed_data()
+    timings['setup'] = time.perf_counter() - created
+print(json.dumps(timings))
+'''
+
+def probe(database, setup=False):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + database, PYTHONWARNINGS='ignore')
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(backend=BACKEND, database=database, setup=setup)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=750)
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp()
+    runs = [probe(os.path.join(db_dir, f'startup-{i}.db')) for i in range(args.runs)]
+    setup = probe(os.path.join(db_dir, 'setup.db'), setup=True)
+
+    print(f"{'phase':<28} {'median ms':>10} {'max ms':>9}")
+    for phase in ('import', 'create_app'):
+        values = [run[phase] * 1000 for run in runs]
+        print(f'{phase:<28} {statistics.median(values):>10.1f} {max(values):>9.1f}')
+    totals = [(run['import'] + run['create_app']) * 1000 for run in runs]
+    median = statistics.median(totals)
+    print(f"{'import + create_app':<28} {median:>10.1f} {max(totals):>9.1f}")
+    print(f"{'db upgrade + seed (once)':<28} {setup['setup'] * 1000:>10.1f}")
+
+    touched = sum(1 for run in runs if run['touched_db'])
+    print(f'budget: {args.budget_ms:.0f} ms, database touched by create_app: {touched}/{len(runs)} runs')
+
+    ok = median <= args.budget_ms and not touched
+    print('ok' if ok else 'FAILED')
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
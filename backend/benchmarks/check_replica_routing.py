@@ -0,0 +1,103 @@
+"""Verify read/write splitting against two SQLite files.
+
+Builds a primary database, copies it to a replica, then checks that:
+  - designated read-only endpoints query the replica,
+  - writes always go to the primary,
+  - the writer's next reads stay on the primary for READ_YOUR_WRITES_WINDOW,
+  - after the window the replica serves them again (and may be stale).
+
+Exits non-zero on any failure.
+
+Usage: python benchmarks/check_replica_routing.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings('ignore')
+
+_db_dir = tempfile.mkdtemp()
+PRIMARY = os.path.join(_db_dir, 'primary.db')
+REPLICA = os.path.join(_db_dir, 'replica.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + PRIMARY
+os.environ['REPLICA_DATABASE_URL'] = 'sqlite:///' + REPLICA
+# Read-your-writes stamps need a cache every worker shares
+os.environ['CACHE_BACKEND'] = 'sqlite'
+os.environ['CACHE_PATH'] = os.path.join(_db_dir, 'cache.db')
+
+from sqlalchemy import event
+from app import create_app
+from data.seed_data import seed_data
+from database import db, init_db
+from models import Inventory, User
+from utils.helpers import create_user_token
+
+def copy_primary():
+    source, target = sqlite3.connect(PRIMARY), sqlite3.connect(REPLICA)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+
+def main():
+    app = create_app()
+    init_db(app)
+    with app.app_context():
+        seed_data()
+    client = app.test_client()
+    copy_primary()
+
+    statements = {}
+    with app.app_context():
+        for key, engine in db.engines.items():
+            name = key or 'primary'
+            event.listen(engine, 'before_cursor_execute',
+                         lambda *args, name=name: statements.__setitem__(name, statements.get(name, 0) + 1))
+
+        patient = {'Authorization': 'Bearer ' + create_user_token(User.query.filter_by(role='patient').first())}
+        admin = {'Authorization': 'Bearer ' + create_user_token(User.query.filter_by(role='admin').first())}
+        inventory = Inventory.query.filter(Inventory.stock_quantity > 0).first()
+        target = {'pharmacy_id': inventory.pharmacy_id, 'medication_id': inventory.medication_id}
+
+    # Warm the auth state cache: token checks then read no rows, so only the
+    # routing decides which engine each request touches
+    client.get('/api/patient/reservations', headers=patient)
+    client.get('/api/admin/users', headers=admin)
+
+    def call(method, url, headers, **kwargs):
+        statements.clear()
+        response = client.open(url, method=method, headers=headers, **kwargs)
+        return response, dict(statements)
+
+    checks = []
+    def expect(label, response, used, engine, extra=True):
+        ok = response.status_code < 400 and set(used) == {engine} and extra
+        checks.append(ok)
+        print(f"{'ok' if ok else 'FAIL':<5} {label:<48} {used}")
+
+    for url in ('/api/patient/pharmacies/search?medication=panadol', '/api/patient/medications/search?q=pan',
+                '/api/patient/reservations'):
+        response, used = call('GET', url, patient)
+        expect(f'GET {url}', response, used, 'replica')
+    response, used = call('GET', '/api/admin/users', admin)
+    expect('GET /api/admin/users', response, used, 'replica')
+
+    response, used = call('POST', '/api/patient/reservations', patient, json=target)
+    expect('POST /api/patient/reservations', response, used, 'primary')
+
+    response, used = call('GET', '/api/patient/reservations', patient)
+    expect('GET /api/patient/reservations (inside window)', response, used, 'primary',
+           response.get_json()['total'] == 1)
+
+    app.config['READ_YOUR_WRITES_WINDOW'] = 0
+    response, used = call('GET', '/api/patient/reservations', patient)
+    expect('GET /api/patient/reservations (window over)', response, used, 'replica',
+           response.get_json()['total'] == 0)
+
+    sys.exit(0 if all(checks) else 1)
+
+if __name__ == '__main__':
+    main()
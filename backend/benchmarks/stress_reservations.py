@@ -0,0 +1,125 @@
+"""Concurrent reservation stress test against a WAL-mode SQLite file.
+
+Fires --requests reservations for a single SKU holding --stock units from a
+thread or process pool and reports throughput, latency percentiles and the
+oversell count (reservations granted beyond the initial stock), which must
+be zero.
+
+Usage: python benchmarks/stress_reservations.py [--requests 2000] [--stock 500]
+                                                [--workers 16] [--processes]
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings('ignore')
+
+_db_dir = tempfile.mkdtemp()
+DB_PATH = os.path.join(_db_dir, 'stress.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+
+_app = None
+_client = None
+_headers = None
+_target = None
+
+def _init_worker(headers, target, forked):
+    # Workers reuse the app and database prepared in main()
+    global _client, _headers, _target
+    if forked:
+        from database import db
+        with _app.app_context():
+            db.engine.dispose(close=False)
+    _client = _app.test_client()
+    _headers = headers
+    _target = target
+
+def _reserve(_):
+    start = time.perf_counter()
+    response = _client.post('/api/patient/reservations', headers=_headers, json=_target)
+    return response.status_code, time.perf_counter() - start
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--stock', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--processes', action='store_true', help='use a process pool instead of threads')
+    args = parser.parse_args()
+
+    from app import create_app
+    from data.seed_data import seed_data
+    from database import db, init_db
+    from models import Inventory, User
+    from utils.helpers import create_user_token
+
+    global _app
+    app = _app = create_app()
+    init_db(app)
+    with app.app_context():
+        seed_data()
+    with app.app_context():
+        inventory = Inventory.query.order_by(Inventory.id).first()
+        Inventory.query.filter_by(
+            pharmacy_id=inventory.pharmacy_id, medication_id=inventory.medication_id
+        ).filter(Inventory.id != inventory.id).delete()
+        inventory.stock_quantity = args.stock
+        db.session.commit()
+
+        target = {'pharmacy_id': inventory.pharmacy_id, 'medication_id': inventory.medication_id, 'quantity': 1}
+        inventory_id = inventory.id
+        patient = User.query.filter_by(role='patient').first()
+        headers = {'Authorization': 'Bearer ' + create_user_token(patient)}
+
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.close()
+
+    if args.processes:
+        pool_class = partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('fork'))
+    else:
+        pool_class = ThreadPoolExecutor
+    start = time.perf_counter()
+    with pool_class(max_workers=args.workers, initializer=_init_worker, initargs=(headers, target, args.processes)) as pool:
+        results = list(pool.map(_reserve, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency * 1000 for _, latency in results]
+    granted = sum(1 for status, _ in results if status == 201)
+    rejected = sum(1 for status, _ in results if status == 409)
+    errors = len(results) - granted - rejected
+
+    conn = sqlite3.connect(DB_PATH)
+    final_stock = conn.execute('SELECT stock_quantity FROM inventory WHERE id = ?', (inventory_id,)).fetchone()[0]
+    reserved = conn.execute(
+        'SELECT COALESCE(SUM(quantity), 0) FROM reservations WHERE pharmacy_id = ? AND medication_id = ?',
+        (target['pharmacy_id'], target['medication_id'])
+    ).fetchone()[0]
+    conn.close()
+
+    oversell = max(0, reserved - args.stock)
+    print(f"pool:          {'processes' if args.processes else 'threads'} x {args.workers}")
+    print(f"requests:      {len(results)} in {elapsed:.2f}s ({len(results) / elapsed:.0f} req/s)")
+    print(f"granted:       {granted}  rejected (out of stock): {rejected}  errors: {errors}")
+    print(f"latency ms:    p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  "
+          f"p99 {percentile(latencies, 99):.1f}")
+    print(f"final stock:   {final_stock} (initial {args.stock}, reserved {reserved})")
+    print(f"oversell:      {oversell}")
+
+    if oversell or final_stock < 0 or final_stock + reserved != args.stock:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -8,17 +8,128 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'pharmalink.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Engine profile. SQLite connections get these pragmas on connect: WAL
+    # lets readers run alongside the writer and busy_timeout makes writers
+    # wait for the lock instead of failing with "database is locked"
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,  # ms
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000  # negative is KiB, so 64 MB
+    }
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = 30  # seconds
+    # Server databases only (DATABASE_URL=postgresql://..., driver in requirements-postgres.txt)
+    DB_POOL_RECYCLE = 1800  # seconds
+    DB_POOL_PRE_PING = True
+    DB_STATEMENT_TIMEOUT = 30000  # ms, PostgreSQL
+    
+    # Optional read replica for search and listing endpoints. For local
+    # testing point it at a copy of the SQLite file (flask db sync-replica).
+    # Needs CACHE_BACKEND=sqlite: the read-your-writes stamps are kept in
+    # the cache and every worker must see them. With several hosts, keep
+    # each user's requests on one host.
+    SQLALCHEMY_BINDS = {'replica': os.environ['REPLICA_DATABASE_URL']} if os.environ.get('REPLICA_DATABASE_URL') else {}
+    READ_YOUR_WRITES_WINDOW = 5  # seconds a user's reads stay on the primary after a write
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-2023'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+    # Seconds a cached token_version is trusted before it is read again; the
+    # longest a revocation by another worker can go unseen with a
+    # per-process cache backend
+    AUTH_STATE_TTL = 30
+    
+    # Spatial index for pharmacy search (cell size in degrees, max age in seconds)
+    GEO_INDEX_CELL_SIZE = 0.1
+    GEO_INDEX_MAX_AGE = 60
+    
+    # Read-through cache for medication/pharmacy rows: memory, sqlite (shared
+    # between workers on one host) or null
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'memory'
+    CACHE_MAX_SIZE = 10000
+    CACHE_TTL = 300  # seconds
+    CACHE_PATH = os.environ.get('CACHE_PATH') or os.path.join(basedir, 'instance', 'cache.db')
+    
+    # Upper bound for per_page on every paginated endpoint
+    MAX_PER_PAGE = 100
+    # List pages are serialized and sent this many rows at a time
+    STREAM_BATCH_SIZE = 25
+    
+    # Responses of at least COMPRESS_MIN_SIZE bytes are gzip/brotli encoded
+    # when the client accepts it; streamed bodies always are
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVEL = 6
+    
+    # Per-endpoint latency, SQL and response size metrics at /api/metrics
+    # (Prometheus text format). Scrapes send METRICS_TOKEN as
+    # "Authorization: Bearer <token>"; without a token the endpoint is only
+    # served in debug and testing. SERVER_TIMING also returns each request's
+    # DB and JSON timings to the caller in a Server-Timing header.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true')
+    
+    # Fail loudly when serialization triggers a query (missing eager load)
+    RAISE_ON_LAZY_LOAD = False
+    
+    # Development/canary query checks: log statements repeated more than
+    # N_PLUS_ONE_THRESHOLD times in one request (likely an N+1, with the
+    # stack of the first occurrence) and statements slower than SLOW_QUERY_MS
+    QUERY_WATCH_ENABLED = os.environ.get('QUERY_WATCH_ENABLED', '').lower() in ('1', 'true')
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+    N_PLUS_ONE_RAISE = False
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))
+    
+    # Reservations still in these statuses after the TTL (from created_at)
+    # are expired and their stock returned to inventory
+    RESERVATION_HOLD_TTLS = {
+        'pending': timedelta(hours=24),
+        'confirmed': timedelta(hours=72)
+    }
+    HOLD_SWEEP_BATCH_SIZE = 500
+    HOLD_SWEEP_INTERVAL = 300  # seconds
+    # Run the sweeper in a background thread; otherwise schedule `flask sweep-holds`
+    HOLD_SWEEPER_ENABLED = os.environ.get('HOLD_SWEEPER_ENABLED', '').lower() in ('1', 'true')
+    
+    # Bulk inventory import: rows per transaction and errors listed in the report
+    INVENTORY_IMPORT_CHUNK_SIZE = 1000
+    INVENTORY_IMPORT_MAX_ERRORS = 1000
+    INVENTORY_BATCH_MAX_ITEMS = 1000
+    
+    # Password hashing. bcrypt runs in a pool of PASSWORD_HASH_WORKERS
+    # processes per web worker (0 hashes in the request thread); once
+    # PASSWORD_HASH_MAX_QUEUE more calls are waiting, or a call takes longer
+    # than PASSWORD_HASH_TIMEOUT, logins get a 503.
+    # Hashes with a different cost are rehashed on the next login.
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 32))
+    PASSWORD_HASH_TIMEOUT = 10  # seconds
+    PASSWORD_HASH_NICE = 10  # niceness of the pool processes
     
 class DevelopmentConfig(Config):
     DEBUG = True
+    SERVER_TIMING = True
 
 class ProductionConfig(Config):
     DEBUG = False
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'sqlite'
+
+class TestingConfig(Config):
+    TESTING = True
+    RAISE_ON_LAZY_LOAD = True
+    QUERY_WATCH_ENABLED = True
+    N_PLUS_ONE_RAISE = True
+    BCRYPT_LOG_ROUNDS = 4
+    PASSWORD_HASH_WORKERS = 0
 
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
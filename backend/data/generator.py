@@ -0,0 +1,342 @@
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, text
+from models import User, Pharmacy, Medication, Inventory, Reservation, Subscription, Advertisement, db
+from utils.rollups import rebuild_daily_stats
+
+# Synthetic data for load and performance testing. Everything is drawn from
+# one random.Random(seed) and timestamps are relative to `end`, so the same
+# arguments against an empty database produce the same rows. Rows are added
+# to whatever is already there, with ids assigned here so foreign keys can be
+# filled in without reading inserted rows back.
+
+# (town, latitude, longitude, relative weight, spread in degrees)
+TOWNS = [
+    ('Nairobi', -1.2864, 36.8172, 40, 0.08),
+    ('Mombasa', -4.0435, 39.6682, 12, 0.05),
+    ('Kisumu', -0.0917, 34.7680, 7, 0.04),
+    ('Nakuru', -0.3031, 36.0800, 7, 0.04),
+    ('Eldoret', 0.5143, 35.2698, 6, 0.04),
+    ('Thika', -1.0333, 37.0693, 4, 0.03),
+    ('Machakos', -1.5177, 37.2634, 3, 0.03),
+    ('Nyeri', -0.4201, 36.9476, 3, 0.03),
+    ('Meru', 0.0463, 37.6559, 3, 0.03),
+    ('Kisii', -0.6817, 34.7680, 3, 0.03),
+    ('Kakamega', 0.2827, 34.7519, 2, 0.03),
+    ('Kitale', 1.0157, 35.0062, 2, 0.03),
+    ('Malindi', -3.2192, 40.1169, 2, 0.03),
+    ('Garissa', -0.4532, 39.6461, 1, 0.02),
+    ('Naivasha', -0.7167, 36.4333, 1, 0.02),
+    ('Nanyuki', 0.0167, 37.0667, 1, 0.02),
+    ('Embu', -0.5389, 37.4596, 1, 0.02),
+    ('Kericho', -0.3677, 35.2831, 1, 0.02),
+    ('Bungoma', 0.5635, 34.5606, 1, 0.02),
+    ('Lamu', -2.2717, 40.9020, 1, 0.02),
+]
+
+STREETS = ['Moi Avenue', 'Kenyatta Avenue', 'Market Road', 'Hospital Road', 'Station Road', 'Uhuru Highway',
+           'Ngong Road', 'Main Street', 'Biashara Street', 'Jogoo Road', 'Oginga Odinga Street', 'Haile Selassie Avenue']
+
+PHARMACY_NAMES = ['Goodlife', 'Afya', 'Mediheal', 'Haltons', 'Portal', 'Uzima', 'Tiba', 'Nuru', 'Neema', 'Baraka',
+                  'Mwangaza', 'Jamii', 'Imani', 'Faraja', 'Amani', 'Huduma']
+
+# (generic name, category, description)
+GENERICS = [
+    ('Paracetamol', 'Pain Relief', 'Pain reliever and fever reducer'),
+    ('Ibuprofen', 'Pain Relief', 'Non-steroidal anti-inflammatory'),
+    ('Diclofenac', 'Pain Relief', 'Non-steroidal anti-inflammatory'),
+    ('Amoxicillin', 'Antibiotic', 'Penicillin antibiotic'),
+    ('Amoxicillin/Clavulanate', 'Antibiotic', 'Broad-spectrum antibiotic'),
+    ('Azithromycin', 'Antibiotic', 'Macrolide antibiotic'),
+    ('Ciprofloxacin', 'Antibiotic', 'Fluoroquinolone antibiotic'),
+    ('Doxycycline', 'Antibiotic', 'Tetracycline antibiotic'),
+    ('Metronidazole', 'Antibiotic', 'Antibacterial and antiprotozoal'),
+    ('Artemether/Lumefantrine', 'Antimalarial', 'Artemisinin combination therapy'),
+    ('Metformin Hydrochloride', 'Diabetes', 'Oral diabetes medicine'),
+    ('Glibenclamide', 'Diabetes', 'Sulfonylurea'),
+    ('Amlodipine Besylate', 'Blood Pressure', 'Calcium channel blocker'),
+    ('Losartan Potassium', 'Blood Pressure', 'Angiotensin II receptor blocker'),
+    ('Hydrochlorothiazide', 'Blood Pressure', 'Thiazide diuretic'),
+    ('Enalapril', 'Blood Pressure', 'ACE inhibitor'),
+    ('Atorvastatin Calcium', 'Cholesterol', 'Statin medication'),
+    ('Omeprazole', 'Acid Reflux', 'Proton pump inhibitor'),
+    ('Esomeprazole', 'Acid Reflux', 'Proton pump inhibitor'),
+    ('Salbutamol', 'Asthma', 'Bronchodilator'),
+    ('Beclomethasone', 'Asthma', 'Inhaled corticosteroid'),
+    ('Cetirizine Hydrochloride', 'Allergy', 'Antihistamine'),
+    ('Loratadine', 'Allergy', 'Antihistamine'),
+    ('Prednisolone', 'Anti-inflammatory', 'Corticosteroid'),
+    ('Fluconazole', 'Antifungal', 'Azole antifungal'),
+    ('Clotrimazole', 'Antifungal', 'Topical antifungal'),
+    ('Albendazole', 'Dewormer', 'Anthelmintic'),
+    ('Oral Rehydration Salts', 'Gastrointestinal', 'Electrolyte replacement'),
+    ('Loperamide', 'Gastrointestinal', 'Antidiarrheal'),
+    ('Ferrous Sulfate', 'Supplements', 'Iron supplement'),
+    ('Folic Acid', 'Supplements', 'Vitamin B9 supplement'),
+    ('Zinc Sulfate', 'Supplements', 'Zinc supplement'),
+]
+
+STRENGTHS = ['100mg', '250mg', '500mg', '5mg', '10mg', '20mg', '40mg', '1g']
+FORMS = ['Tablets', 'Capsules', 'Syrup', 'Suspension', 'Injection', 'Cream']
+
+FIRST_NAMES = ['John', 'Mary', 'Peter', 'Grace', 'James', 'Faith', 'David', 'Mercy', 'Joseph', 'Ann', 'Samuel',
+               'Esther', 'Daniel', 'Joy', 'Brian', 'Lucy', 'Kevin', 'Naomi', 'Dennis', 'Ruth', 'Collins', 'Wanjiru']
+LAST_NAMES = ['Otieno', 'Kamau', 'Wanjiku', 'Mwangi', 'Ochieng', 'Njoroge', 'Kiprono', 'Achieng', 'Mutua', 'Wambui',
+              'Kariuki', 'Omondi', 'Chebet', 'Muthoni', 'Kiptoo', 'Atieno', 'Njeri', 'Barasa', 'Wekesa', 'Nyambura']
+
+# Status mix by reservation age: holds younger than their TTL (utils.holds)
+# can still be open, older ones have been completed, cancelled or expired.
+# Open holds keep their units off the shelf, as booking through the API does.
+OPEN_STATUSES = ('pending', 'confirmed')
+STATUS_MIX = [
+    (timedelta(hours=24), [('pending', 45), ('confirmed', 30), ('completed', 15), ('cancelled', 10)]),
+    (timedelta(hours=72), [('confirmed', 20), ('completed', 55), ('cancelled', 15), ('expired', 10)]),
+    (None, [('completed', 75), ('cancelled', 15), ('expired', 10)]),
+]
+
+PLANS = {'monthly': (2500.0, 30), 'annual': (25000.0, 365)}
+
+def person_name(index):
+    return f'{FIRST_NAMES[index % len(FIRST_NAMES)]} {LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]}'
+
+def phone_number(rng):
+    return f'+2547{rng.randrange(10 ** 8):08d}'
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+def _load(model, rows, batch_size, progress=None):
+    # Bulk insert a row iterator in batches, one commit per batch
+    table = model.__table__
+    count = 0
+    start = time.perf_counter()
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(table.insert(), batch)
+            db.session.commit()
+            count += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        count += len(batch)
+
+    if progress:
+        progress(table.name, count, time.perf_counter() - start)
+    return count
+
+def _weighted(rng, choices):
+    values = [value for value, _ in choices]
+    weights = [weight for _, weight in choices]
+    return lambda: rng.choices(values, weights)[0]
+
+def _medication_rows(first_id, count, created_at):
+    for i in range(count):
+        generic, category, description = GENERICS[i % len(GENERICS)]
+        variant = i // len(GENERICS)
+        strength = STRENGTHS[variant % len(STRENGTHS)]
+        form = FORMS[(variant // len(STRENGTHS)) % len(FORMS)]
+        # Brand-style name; past the strength/form combinations add a series number
+        brand = generic.split('/')[0].split(' ')[0]
+        series = variant // (len(STRENGTHS) * len(FORMS))
+        name = f'{brand} {strength} {form}' + (f' {series + 1}' if series else '')
+        yield {
+            'id': first_id + i, 'name': name, 'category': category, 'description': description,
+            'generic_name': generic, 'created_at': created_at, 'updated_at': created_at
+        }
+
+def _user_rows(rng, first_id, password_hash, patients, pharmacists, admins, start, end):
+    span = (end - start).total_seconds()
+    roles = [('admin', admins), ('pharmacist', pharmacists), ('patient', patients)]
+    index = 0
+    for role, count in roles:
+        for i in range(count):
+            user_id = first_id + index
+            yield {
+                'id': user_id, 'email': f'{role}{user_id}@load.pharmalink.test', 'password_hash': password_hash,
+                'role': role, 'name': person_name(user_id), 'phone': phone_number(rng),
+                'created_at': start + timedelta(seconds=span * index / max(1, patients + pharmacists + admins)),
+                'token_version': 0
+            }
+            index += 1
+
+def _pharmacy_rows(rng, first_id, count, owner_ids, active, created_at):
+    towns = [town for town, _, _, _, _ in TOWNS]
+    town_weights = [weight for _, _, _, weight, _ in TOWNS]
+    places = {town: (lat, lng, spread) for town, lat, lng, _, spread in TOWNS}
+    for i in range(count):
+        town = rng.choices(towns, town_weights)[0]
+        lat, lng, spread = places[town]
+        if rng.random() < 0.75:
+            active.add(first_id + i)
+        yield {
+            'id': first_id + i,
+            'name': f'{rng.choice(PHARMACY_NAMES)} Pharmacy {town} {i + 1}',
+            'address': f'{rng.choice(STREETS)}, {town}',
+            'latitude': round(rng.gauss(lat, spread), 6),
+            'longitude': round(rng.gauss(lng, spread), 6),
+            'phone': phone_number(rng),
+            'owner_id': owner_ids[i % len(owner_ids)],
+            'subscription_status': 'active' if first_id + i in active else 'inactive',
+            'created_at': created_at, 'updated_at': created_at
+        }
+
+def _inventory_rows(rng, first_id, pharmacy_ids, medication_ids, density, prices, stocked, updated_at):
+    per_pharmacy = max(1, min(len(medication_ids), int(round(density * len(medication_ids)))))
+    next_id = first_id
+    for pharmacy_id in pharmacy_ids:
+        for medication_id in sorted(rng.sample(medication_ids, per_pharmacy)):
+            # Prices vary around a per-medication base; about one item in ten is out of stock
+            price = round(prices[medication_id] * rng.uniform(0.85, 1.2), -1)
+            stock = 0 if rng.random() < 0.1 else rng.randint(1, 200)
+            stocked.append((next_id, pharmacy_id, medication_id, price, stock))
+            yield {
+                'id': next_id, 'pharmacy_id': pharmacy_id, 'medication_id': medication_id,
+                'stock_quantity': stock, 'price': price, 'updated_at': updated_at
+            }
+            next_id += 1
+
+def _reservation_rows(rng, first_id, count, stocked, held, patient_ids, start, end):
+    # held collects {inventory id: units} for the open holds, which the
+    # caller takes off the inventory rows already written
+    span = (end - start).total_seconds()
+    statuses = [(age, _weighted(rng, mix)) for age, mix in STATUS_MIX]
+    notes = [None, None, None, 'Pick up after 5pm', 'Will call before coming', 'Need receipt for insurance']
+    for i in range(count):
+        # Evenly spread over the window in created_at order, with jitter
+        created_at = start + timedelta(seconds=min(span, span * (i + rng.random()) / count))
+        age = end - created_at
+        status = next(pick for limit, pick in statuses if limit is None or age < limit)()
+        inventory_id, pharmacy_id, medication_id, price, stock = stocked[rng.randrange(len(stocked))]
+        quantity = rng.choices((1, 2, 3, 4, 5), (60, 20, 10, 5, 5))[0]
+        if status in OPEN_STATUSES:
+            # A hold the shelf can't cover was turned away; the patient cancelled
+            if stock - held.get(inventory_id, 0) < quantity:
+                status = 'cancelled'
+            else:
+                held[inventory_id] = held.get(inventory_id, 0) + quantity
+        user_id = patient_ids[rng.randrange(len(patient_ids))]
+        updated_at = created_at if status == 'pending' else min(end, created_at + timedelta(minutes=rng.randint(5, 2880)))
+        yield {
+            'id': first_id + i, 'user_id': user_id, 'pharmacy_id': pharmacy_id, 'medication_id': medication_id,
+            'quantity': quantity, 'unit_price': price,
+            'status': status, 'customer_name': person_name(user_id), 'customer_phone': phone_number(rng),
+            'notes': rng.choice(notes), 'created_at': created_at, 'updated_at': updated_at
+        }
+
+def _subscription_rows(rng, first_id, pharmacy_ids, active, start, end):
+    next_id = first_id
+    for pharmacy_id in pharmacy_ids:
+        plan_type = 'annual' if rng.random() < 0.2 else 'monthly'
+        amount, days = PLANS[plan_type]
+        # Active pharmacies subscribed at some point in the window and renewed
+        # since; inactive ones stopped renewing before the end
+        period_start = start + timedelta(days=rng.randrange(max(1, min(days, (end - start).days))))
+        stop = end if pharmacy_id in active else period_start + (end - period_start) * rng.random()
+        while period_start < stop:
+            period_end = period_start + timedelta(days=days)
+            yield {
+                'id': next_id, 'pharmacy_id': pharmacy_id, 'plan_type': plan_type, 'amount': amount,
+                'start_date': period_start, 'end_date': period_end,
+                'status': 'active' if period_end > end and pharmacy_id in active else 'expired', 'created_at': period_start
+            }
+            next_id += 1
+            period_start = period_end
+
+def _advertisement_rows(rng, first_id, count, start, end):
+    span = (end - start).total_seconds()
+    for i in range(count):
+        generic, category, _ = GENERICS[rng.randrange(len(GENERICS))]
+        impressions = rng.randint(1000, 200000)
+        yield {
+            'id': first_id + i, 'title': f'{category} week: save on {generic}',
+            'content': f'Offers on {category.lower()} products at participating pharmacies.',
+            'image_url': f'https://example.com/ads/{first_id + i}.jpg',
+            'advertiser_name': f'{rng.choice(PHARMACY_NAMES)} Healthcare', 'budget': float(rng.randrange(5000, 500000, 500)),
+            'clicks': int(impressions * rng.uniform(0.005, 0.04)), 'impressions': impressions,
+            'active': rng.random() < 0.6, 'created_at': start + timedelta(seconds=span * rng.random())
+        }
+
+def _sync_sequences(models):
+    # Explicit ids leave PostgreSQL sequences behind the data
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in models:
+        table = model.__tablename__
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+        ))
+    db.session.commit()
+
+def generate_dataset(pharmacies=200, medications=500, density=0.2, patients=5000, reservations=50000,
+                     months=6, advertisements=50, seed=42, end=None, batch_size=20000, progress=None):
+    # Adds a synthetic dataset and returns the number of rows added per table.
+    # density is the fraction of the catalogue each pharmacy stocks (1.0 for
+    # dense, 0.02 for sparse). progress(table, rows, seconds) is called as
+    # each table finishes.
+    rng = random.Random(seed)
+    end = end or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=30 * months)
+    added = {}
+
+    # One bcrypt hash for every generated account (password: "password")
+    user = User()
+    user.set_password('password')
+
+    pharmacists = max(1, pharmacies // 3)
+    first_user = _next_id(User)
+    added['users'] = _load(User, _user_rows(
+        rng, first_user, user.password_hash, patients, pharmacists, 2, start, end
+    ), batch_size, progress)
+    owner_ids = list(range(first_user + 2, first_user + 2 + pharmacists))
+    patient_ids = range(first_user + 2 + pharmacists, first_user + added['users'])
+
+    first_medication = _next_id(Medication)
+    added['medications'] = _load(Medication, _medication_rows(first_medication, medications, start), batch_size, progress)
+    medication_ids = list(range(first_medication, first_medication + medications))
+    prices = {medication_id: rng.randrange(50, 5000, 10) for medication_id in medication_ids}
+
+    first_pharmacy = _next_id(Pharmacy)
+    active = set()
+    added['pharmacies'] = _load(Pharmacy, _pharmacy_rows(
+        rng, first_pharmacy, pharmacies, owner_ids, active, start
+    ), batch_size, progress)
+    pharmacy_ids = list(range(first_pharmacy, first_pharmacy + pharmacies))
+
+    stocked = []
+    added['inventory'] = _load(Inventory, _inventory_rows(
+        rng, _next_id(Inventory), pharmacy_ids, medication_ids, density, prices, stocked, end
+    ), batch_size, progress)
+
+    added['reservations'] = 0
+    held = {}
+    if reservations and stocked and patient_ids:
+        added['reservations'] = _load(Reservation, _reservation_rows(
+            rng, _next_id(Reservation), reservations, stocked, held, patient_ids, start, end
+        ), batch_size, progress)
+    if held:
+        inventory = Inventory.__table__
+        db.session.execute(inventory.update().where(inventory.c.id == db.bindparam('inventory_id')).values(
+            stock_quantity=inventory.c.stock_quantity - db.bindparam('units'), updated_at=end
+        ), [{'inventory_id': inventory_id, 'units': units} for inventory_id, units in held.items()])
+        db.session.commit()
+
+    added['subscriptions'] = _load(Subscription, _subscription_rows(
+        rng, _next_id(Subscription), pharmacy_ids, active, start, end
+    ), batch_size, progress)
+    added['advertisements'] = _load(Advertisement, _advertisement_rows(
+        rng, _next_id(Advertisement), advertisements, start, end
+    ), batch_size, progress)
+
+    _sync_sequences([User, Medication, Pharmacy, Inventory, Reservation, Subscription, Advertisement])
+    # Bulk inserts skip the ORM events that maintain the analytics rollup;
+    # rebuild it a month at a time to bound memory
+    day = start.date()
+    while day <= end.date():
+        last = min(end.date(), day + timedelta(days=29))
+        rebuild_daily_stats(start=day, end=last)
+        day = last + timedelta(days=1)
+    return added
@@ -1,119 +1,144 @@
 from models import User, Pharmacy, Medication, Inventory, db
+from utils.rollups import bump
 from datetime import datetime
 
+MEDICATIONS = [
+    {'name': "Panadol", 'category': "Pain Relief", 'description': "Pain reliever and fever reducer", 'generic_name': "Paracetamol"},
+    {'name': "Augmentin", 'category': "Antibiotic", 'description': "Broad-spectrum antibiotic", 'generic_name': "Amoxicillin/Clavulanate"},
+    {'name': "Metformin", 'category': "Diabetes", 'description': "Oral diabetes medicine", 'generic_name': "Metformin Hydrochloride"},
+    {'name': "Amlodipine", 'category': "Blood Pressure", 'description': "Calcium channel blocker", 'generic_name': "Amlodipine Besylate"},
+    {'name': "Omeprazole", 'category': "Acid Reflux", 'description': "Proton pump inhibitor", 'generic_name': "Omeprazole"},
+    {'name': "Amoxicillin", 'category': "Antibiotic", 'description': "Penicillin antibiotic", 'generic_name': "Amoxicillin"},
+    {'name': "Ventolin", 'category': "Asthma", 'description': "Bronchodilator", 'generic_name': "Salbutamol"},
+    {'name': "Losartan", 'category': "Blood Pressure", 'description': "Angiotensin II receptor blocker", 'generic_name': "Losartan Potassium"},
+    {'name': "Atorvastatin", 'category': "Cholesterol", 'description': "Statin medication", 'generic_name': "Atorvastatin Calcium"},
+    {'name': "Cetirizine", 'category': "Allergy", 'description': "Antihistamine", 'generic_name': "Cetirizine Hydrochloride"}
+]
+
+USERS = [
+    {
+        'email': 'patient@example.com',
+        'password': 'password',
+        'role': 'patient',
+        'name': 'John Patient',
+        'phone': '+254712345678'
+    },
+    {
+        'email': 'pharmacist@example.com',
+        'password': 'password',
+        'role': 'pharmacist',
+        'name': 'Sarah Pharmacist',
+        'phone': '+254723456789'
+    },
+    {
+        'email': 'admin@example.com',
+        'password': 'password',
+        'role': 'admin',
+        'name': 'Admin User',
+        'phone': '+254734567890'
+    }
+]
+
+PHARMACIES = [
+    {
+        'name': "Goodlife Pharmacy Westlands",
+        'address': "ABC Place, Waiyaki Way, Nairobi",
+        'latitude': -1.265590,
+        'longitude': 36.807350,
+        'phone': "+254711123456",
+        'subscription_status': "active"
+    },
+    {
+        'name': "Pharmaceutical Access Ltd",
+        'address': "Kimathi Street, CBD, Nairobi",
+        'latitude': -1.285270,
+        'longitude': 36.821350,
+        'phone': "+254722789012",
+        'subscription_status': "active"
+    },
+    {
+        'name': "Mediheal Pharmacy",
+        'address': "Mombasa Road, Nairobi",
+        'latitude': -1.319240,
+        'longitude': 36.854870,
+        'phone': "+254733456789",
+        'subscription_status': "inactive"
+    }
+]
+
+def _insert(model, rows):
+    # One executemany per table; column defaults (created_at, ...) still apply
+    if rows:
+        db.session.execute(model.__table__.insert(), rows)
+    return len(rows)
+
 def seed_data():
+    # Idempotent: each table is checked with one query and only the missing
+    # rows are inserted, in bulk. Returns the number of rows added per table.
+    added = {}
+
     # Create default medications
-    medications = [
-        Medication(name="Panadol", category="Pain Relief", description="Pain reliever and fever reducer", generic_name="Paracetamol"),
-        Medication(name="Augmentin", category="Antibiotic", description="Broad-spectrum antibiotic", generic_name="Amoxicillin/Clavulanate"),
-        Medication(name="Metformin", category="Diabetes", description="Oral diabetes medicine", generic_name="Metformin Hydrochloride"),
-        Medication(name="Amlodipine", category="Blood Pressure", description="Calcium channel blocker", generic_name="Amlodipine Besylate"),
-        Medication(name="Omeprazole", category="Acid Reflux", description="Proton pump inhibitor", generic_name="Omeprazole"),
-        Medication(name="Amoxicillin", category="Antibiotic", description="Penicillin antibiotic", generic_name="Amoxicillin"),
-        Medication(name="Ventolin", category="Asthma", description="Bronchodilator", generic_name="Salbutamol"),
-        Medication(name="Losartan", category="Blood Pressure", description="Angiotensin II receptor blocker", generic_name="Losartan Potassium"),
-        Medication(name="Atorvastatin", category="Cholesterol", description="Statin medication", generic_name="Atorvastatin Calcium"),
-        Medication(name="Cetirizine", category="Allergy", description="Antihistamine", generic_name="Cetirizine Hydrochloride")
-    ]
-    
-    for med in medications:
-        if not Medication.query.filter_by(name=med.name).first():
-            db.session.add(med)
-    
-    # Create default users
-    users = [
-        {
-            'email': 'patient@example.com',
-            'password': 'password',
-            'role': 'patient',
-            'name': 'John Patient',
-            'phone': '+254712345678'
-        },
-        {
-            'email': 'pharmacist@example.com',
-            'password': 'password',
-            'role': 'pharmacist',
-            'name': 'Sarah Pharmacist',
-            'phone': '+254723456789'
-        },
-        {
-            'email': 'admin@example.com',
-            'password': 'password',
-            'role': 'admin',
-            'name': 'Admin User',
-            'phone': '+254734567890'
-        }
-    ]
-    
-    for user_data in users:
-        if not User.query.filter_by(email=user_data['email']).first():
-            user = User(
-                email=user_data['email'],
-                role=user_data['role'],
-                name=user_data['name'],
-                phone=user_data['phone']
-            )
+    existing = {name for (name,) in db.session.query(Medication.name).filter(
+        Medication.name.in_([med['name'] for med in MEDICATIONS])
+    )}
+    added['medications'] = _insert(Medication, [med for med in MEDICATIONS if med['name'] not in existing])
+
+    # Create default users, hashing each distinct password once
+    existing = {email for (email,) in db.session.query(User.email).filter(
+        User.email.in_([user['email'] for user in USERS])
+    )}
+    hashes = {}
+    users = []
+    now = datetime.utcnow()
+    for user_data in USERS:
+        if user_data['email'] in existing:
+            continue
+        if user_data['password'] not in hashes:
+            user = User()
             user.set_password(user_data['password'])
-            db.session.add(user)
-    
-    db.session.commit()
-    
+            hashes[user_data['password']] = user.password_hash
+        users.append({
+            'email': user_data['email'],
+            'password_hash': hashes[user_data['password']],
+            'role': user_data['role'],
+            'name': user_data['name'],
+            'phone': user_data['phone'],
+            'created_at': now
+        })
+    added['users'] = _insert(User, users)
+    # Bulk inserts skip the ORM events that keep the analytics rollup current
+    bump(db.session.connection(), now.date(), 'registrations', delta=len(users))
+
     # Create pharmacies
-    pharmacist_user = User.query.filter_by(role='pharmacist').first()
-    
-    if pharmacist_user:
-        pharmacies = [
-            Pharmacy(
-                name="Goodlife Pharmacy Westlands",
-                address="ABC Place, Waiyaki Way, Nairobi",
-                latitude=-1.265590,
-                longitude=36.807350,
-                phone="+254711123456",
-                owner_id=pharmacist_user.id,
-                subscription_status="active"
-            ),
-            Pharmacy(
-                name="Pharmaceutical Access Ltd",
-                address="Kimathi Street, CBD, Nairobi",
-                latitude=-1.285270,
-                longitude=36.821350,
-                phone="+254722789012",
-                owner_id=pharmacist_user.id,
-                subscription_status="active"
-            ),
-            Pharmacy(
-                name="Mediheal Pharmacy",
-                address="Mombasa Road, Nairobi",
-                latitude=-1.319240,
-                longitude=36.854870,
-                phone="+254733456789",
-                owner_id=pharmacist_user.id,
-                subscription_status="inactive"
-            )
-        ]
-        
-        for pharmacy in pharmacies:
-            if not Pharmacy.query.filter_by(name=pharmacy.name).first():
-                db.session.add(pharmacy)
-        
-        db.session.commit()
-        
+    pharmacist_id = db.session.query(User.id).filter_by(role='pharmacist').order_by(User.id).limit(1).scalar()
+
+    if pharmacist_id:
+        existing = {name for (name,) in db.session.query(Pharmacy.name).filter(
+            Pharmacy.name.in_([pharmacy['name'] for pharmacy in PHARMACIES])
+        )}
+        added['pharmacies'] = _insert(Pharmacy, [
+            dict(pharmacy, owner_id=pharmacist_id, created_at=now) for pharmacy in PHARMACIES if pharmacy['name'] not in existing
+        ])
+        bump(db.session.connection(), now.date(), 'pharmacies', delta=added['pharmacies'])
+
         # Create inventory items
-        pharmacies = Pharmacy.query.all()
-        medications = Medication.query.all()
-        
-        for pharmacy in pharmacies:
-            for medication in medications:
+        pharmacies = db.session.query(Pharmacy.id, Pharmacy.subscription_status).all()
+        medication_ids = [medication_id for (medication_id,) in db.session.query(Medication.id)]
+        existing = set(db.session.query(Inventory.pharmacy_id, Inventory.medication_id).all())
+
+        inventory = []
+        for pharmacy_id, subscription_status in pharmacies:
+            for medication_id in medication_ids:
                 # Only add inventory for some medications to each pharmacy
-                if (pharmacy.id + medication.id) % 3 == 0:
-                    inventory = Inventory(
-                        pharmacy_id=pharmacy.id,
-                        medication_id=medication.id,
-                        stock_quantity=50 if pharmacy.subscription_status == 'active' else 20,
-                        price=500 + (medication.id * 50)
-                    )
-                    db.session.add(inventory)
-        
-        db.session.commit()
-    
-    print("Seed data created successfully!")
\ No newline at end of file
+                if (pharmacy_id + medication_id) % 3 == 0 and (pharmacy_id, medication_id) not in existing:
+                    inventory.append({
+                        'pharmacy_id': pharmacy_id,
+                        'medication_id': medication_id,
+                        'stock_quantity': 50 if subscription_status == 'active' else 20,
+                        'price': 500 + (medication_id * 50)
+                    })
+        added['inventory items'] = _insert(Inventory, inventory)
+
+    db.session.commit()
+
+    return added
@@ -1,7 +1,118 @@
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
 
-db = SQLAlchemy()
+REPLICA_BIND = 'replica'
+
+class RoutingSession(Session):
+    # Sends reads to the replica bind during requests marked with
+    # utils.replica.read_replica; flushes, DML, SELECT ... FOR UPDATE and
+    # anything after the session's first write stay on the primary
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        
+    def _use_replica(self, clause):
+        if clause is None or isinstance(clause, UpdateBase) or getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        if self._flushing or self.info.get('wrote'):
+            return False
+        return has_request_context() and g.get('use_replica', False)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_flush(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_dml(orm_execute_state):
+    state = orm_execute_state
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info['wrote'] = True
+
+def normalize_database_uri(uri):
+    # Hosted PostgreSQL often hands out postgres:// URLs, which SQLAlchemy rejects
+    if isinstance(uri, str) and uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+def engine_options(app, uri=None):
+    # Pool and driver options for the configured database (or a bind's uri),
+    # on top of any explicit SQLALCHEMY_ENGINE_OPTIONS
+    url = make_url(uri or app.config['SQLALCHEMY_DATABASE_URI'])
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    backend = url.get_backend_name()
+    
+    # In-memory SQLite runs on a single StaticPool connection
+    if backend == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+        
+    options.setdefault('pool_size', app.config['DB_POOL_SIZE'])
+    options.setdefault('max_overflow', app.config['DB_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', app.config['DB_POOL_TIMEOUT'])
+    
+    if backend == 'sqlite':
+        # Local files never go stale, so recycling and pre-ping only cost queries
+        return options
+        
+    options.setdefault('pool_recycle', app.config['DB_POOL_RECYCLE'])
+    options.setdefault('pool_pre_ping', app.config['DB_POOL_PRE_PING'])
+    
+    if backend == 'postgresql':
+        connect_args = options.setdefault('connect_args', {})
+        connect_args.setdefault('application_name', 'pharmalink')
+        if app.config.get('DB_STATEMENT_TIMEOUT'):
+            connect_args.setdefault('options', f"-c statement_timeout={app.config['DB_STATEMENT_TIMEOUT']}")
+            
+    return options
+
+def apply_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+def init_engine(app):
+    app.config['SQLALCHEMY_DATABASE_URI'] = normalize_database_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    
+    # Flask-SQLAlchemy applies SQLALCHEMY_ENGINE_OPTIONS to the primary only,
+    # so binds given as a URL (the replica) carry their own profile
+    binds = {}
+    for key, bind in (app.config.get('SQLALCHEMY_BINDS') or {}).items():
+        if isinstance(bind, str):
+            uri = normalize_database_uri(bind)
+            bind = {'url': uri, **engine_options(app, uri)}
+        binds[key] = bind
+    app.config['SQLALCHEMY_BINDS'] = binds
+        
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app)
+    db.init_app(app)
+    
+    with app.app_context():
+        pragmas = app.config.get('SQLITE_PRAGMAS')
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite' and pragmas:
+                apply_sqlite_pragmas(engine, pragmas)
 
 def init_db(app):
+    from migrations import upgrade
+    from utils.search import init_medication_search
+    from utils.rollups import backfill_daily_stats
+    
+    # Schema setup behind `flask db upgrade`; returns the migrations applied
     with app.app_context():
-        db.create_all()
\ No newline at end of file
+        # The primary only: a replica gets its schema from replication
+        db.create_all(bind_key=None)
+        applied = upgrade(db.engine)
+        app.extensions['medication_fts'] = init_medication_search(db.engine)
+        backfill_daily_stats()
+    return applied
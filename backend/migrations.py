@@ -0,0 +1,138 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from database import db
+
+# Ordered schema changes for databases created by an earlier release.
+# Fresh databases get the full schema from create_all(), so every step must
+# be safe to run against tables that already have the change.
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(function):
+        MIGRATIONS.append((version, description, function))
+        return function
+    return register
+
+def _schema_table(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)'
+    ))
+
+def current_version(conn):
+    _schema_table(conn)
+    return conn.execute(text('SELECT MAX(version) FROM schema_migrations')).scalar() or 0
+
+def pending_migrations(conn):
+    version = current_version(conn)
+    return [entry for entry in sorted(MIGRATIONS, key=lambda entry: entry[0]) if entry[0] > version]
+
+def upgrade(engine):
+    # Apply pending migrations, each in its own transaction; returns the
+    # versions applied
+    applied = []
+    with engine.begin() as conn:
+        pending = pending_migrations(conn)
+
+    for version, description, function in pending:
+        with engine.begin() as conn:
+            function(conn)
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)'),
+                {'v': version, 'd': description, 't': datetime.utcnow()}
+            )
+        applied.append((version, description))
+    return applied
+
+def _add_column(conn, table, column, ddl):
+    # Versioned steps spell out their DDL; skipped where create_all() (or an
+    # earlier run) already made the column
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        return
+    if column in {existing['name'] for existing in inspector.get_columns(table)}:
+        return
+    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+@migration(1, 'Add columns introduced after the initial schema')
+def add_missing_columns(conn):
+    # The columns models.py gained over the initial release, as of version 1
+    timestamp = db.DateTime().compile(dialect=conn.dialect)
+    _add_column(conn, 'users', 'token_version', 'INTEGER NOT NULL DEFAULT 0')
+    _add_column(conn, 'reservations', 'unit_price', 'FLOAT')
+    _add_column(conn, 'subscriptions', 'created_at', timestamp)
+
+@migration(2, 'Deduplicate inventory and add indexes for hot query paths')
+def add_query_indexes(conn):
+    # Older seeders inserted the same (pharmacy, medication) pair more than
+    # once. Fold duplicates into the lowest id, the row reservations already
+    # draw from, before the unique index goes on.
+    duplicates = conn.execute(text(
+        'SELECT pharmacy_id, medication_id, MIN(id), SUM(stock_quantity) FROM inventory '
+        'GROUP BY pharmacy_id, medication_id HAVING COUNT(*) > 1'
+    )).all()
+    for pharmacy_id, medication_id, keep_id, stock_quantity in duplicates:
+        conn.execute(
+            text('UPDATE inventory SET stock_quantity = :stock WHERE id = :id'),
+            {'stock': stock_quantity, 'id': keep_id}
+        )
+        conn.execute(
+            text('DELETE FROM inventory WHERE pharmacy_id = :p AND medication_id = :m AND id != :id'),
+            {'p': pharmacy_id, 'm': medication_id, 'id': keep_id}
+        )
+
+    for ddl in (
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_inventory_pharmacy_medication ON inventory (pharmacy_id, medication_id)',
+        'CREATE INDEX IF NOT EXISTS ix_inventory_medication_stock ON inventory (medication_id, stock_quantity)',
+        'CREATE INDEX IF NOT EXISTS ix_reservations_pharmacy_status_created_at ON reservations (pharmacy_id, status, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_reservations_user_created_at ON reservations (user_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_pharmacies_owner_id ON pharmacies (owner_id)',
+        'CREATE INDEX IF NOT EXISTS ix_users_role_created_at ON users (role, created_at)',
+    ):
+        conn.execute(text(ddl))
+
+@migration(3, 'Track reservation changes for response validators')
+def add_reservation_updated_at(conn):
+    _add_column(conn, 'reservations', 'updated_at', db.DateTime().compile(dialect=conn.dialect))
+    conn.execute(text('UPDATE reservations SET updated_at = created_at WHERE updated_at IS NULL'))
+
+@migration(4, 'Track pharmacy and medication changes for response validators')
+def add_catalog_updated_at(conn):
+    timestamp = db.DateTime().compile(dialect=conn.dialect)
+    for table in ('pharmacies', 'medications'):
+        _add_column(conn, table, 'updated_at', timestamp)
+        conn.execute(text(f'UPDATE {table} SET updated_at = created_at WHERE updated_at IS NULL'))
+
+@migration(5, 'Keep admin dashboard totals in the rollup and index recent activity')
+def add_dashboard_totals(conn):
+    inspector = inspect(conn)
+    for table, ddl in (
+        ('reservations', 'CREATE INDEX IF NOT EXISTS ix_reservations_created_at ON reservations (created_at)'),
+        ('users', 'CREATE INDEX IF NOT EXISTS ix_users_created_at ON users (created_at)'),
+        ('daily_stats', 'CREATE INDEX IF NOT EXISTS ix_daily_stats_metric_key_day ON daily_stats (metric, key, day)'),
+    ):
+        if inspector.has_table(table):
+            conn.execute(text(ddl))
+
+    # An empty rollup is filled in full by the backfill after upgrade; an
+    # existing one only lacks the pharmacy and subscription totals
+    if not inspector.has_table('daily_stats') or conn.execute(text('SELECT 1 FROM daily_stats LIMIT 1')).first() is None:
+        return
+
+    subscription_day = 'date(COALESCE(created_at, start_date))'
+    sources = [
+        ('pharmacies', 'SELECT date(created_at), NULL, COUNT(*) FROM pharmacies '
+                       'WHERE created_at IS NOT NULL GROUP BY date(created_at)'),
+        ('subscriptions', f'SELECT {subscription_day}, status, COUNT(*) FROM subscriptions '
+                          f'WHERE COALESCE(created_at, start_date) IS NOT NULL GROUP BY {subscription_day}, status'),
+        ('subscription_amount', f'SELECT {subscription_day}, status, COALESCE(SUM(amount), 0) FROM subscriptions '
+                                f'WHERE COALESCE(created_at, start_date) IS NOT NULL GROUP BY {subscription_day}, status'),
+    ]
+    for metric, query in sources:
+        conn.execute(text('DELETE FROM daily_stats WHERE metric = :m'), {'m': metric})
+        rows = [
+            {'d': day, 'm': metric, 'k': '' if metric == 'pharmacies' else str(key), 'v': value}
+            for day, key, value in conn.execute(text(query)).all()
+        ]
+        if rows:
+            conn.execute(text('INSERT INTO daily_stats (day, metric, key, value) VALUES (:d, :m, :k, :v)'), rows)
@@ -1,10 +1,54 @@
-from flask_bcrypt import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
+from contextvars import ContextVar
 from datetime import datetime, timedelta
+from sqlalchemy.types import TypeDecorator
 from database import db
+from utils.cache import cached_row, register_invalidation
+from utils.fastjson import exact_float
+from utils.passwords import password_hasher
+
+# Set by utils.serializers while dumping rows in strict (RAISE_ON_LAZY_LOAD) mode
+strict_serialization = ContextVar('strict_serialization', default=None)
+
+class LazyLoadError(RuntimeError):
+    pass
+
+class Float(TypeDecorator):
+    # db.Float read back through fastjson.exact_float(), so responses spell
+    # NaN, Infinity and exponent values like the stdlib encoder does
+    impl = db.Float
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        return exact_float(value)
+
+def related_dict(instance, relation, model):
+    # Serialize a many-to-one relation without a lazy load: use it if it is
+    # already loaded, otherwise go through the read-through row cache
+    if relation not in db.inspect(instance).unloaded:
+        related = getattr(instance, relation)
+        return related.to_dict() if related else None
+        
+    serializer = strict_serialization.get()
+    if serializer is not None:
+        raise LazyLoadError(f'{serializer!r} does not load {type(instance).__name__}.{relation}')
+
+    related_id = getattr(instance, relation + '_id')
+    if related_id is None:
+        return None
+
+    def load():
+        related = db.session.get(model, related_id)
+        return related.to_dict() if related else None
+
+    return cached_row(model, related_id, load)
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_role_created_at', 'role', 'created_at'),
+        db.Index('ix_users_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -13,15 +57,19 @@ class User(db.Model):
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bumped to revoke issued tokens
     
     # Relationships
     reservations = db.relationship('Reservation', backref='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher().hash(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher().verify(self.password_hash, password)
+        
+    def password_needs_rehash(self):
+        return password_hasher().needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -35,16 +83,20 @@ class User(db.Model):
 
 class Pharmacy(db.Model):
     __tablename__ = 'pharmacies'
+    __table_args__ = (
+        db.Index('ix_pharmacies_owner_id', 'owner_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     address = db.Column(db.Text, nullable=False)
-    latitude = db.Column(db.Float)
-    longitude = db.Column(db.Float)
+    latitude = db.Column(Float)
+    longitude = db.Column(Float)
     phone = db.Column(db.String(20))
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     subscription_status = db.Column(db.String(20), default='inactive')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # response validators
     
     # Relationships
     inventory = db.relationship('Inventory', backref='pharmacy', lazy=True)
@@ -72,6 +124,7 @@ class Medication(db.Model):
     description = db.Column(db.Text)
     generic_name = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # response validators
     
     # Relationships
     inventory = db.relationship('Inventory', backref='medication', lazy=True)
@@ -87,12 +140,16 @@ class Medication(db.Model):
 
 class Inventory(db.Model):
     __tablename__ = 'inventory'
+    __table_args__ = (
+        db.Index('ix_inventory_pharmacy_medication', 'pharmacy_id', 'medication_id', unique=True),
+        db.Index('ix_inventory_medication_stock', 'medication_id', 'stock_quantity'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     pharmacy_id = db.Column(db.Integer, db.ForeignKey('pharmacies.id'), nullable=False)
     medication_id = db.Column(db.Integer, db.ForeignKey('medications.id'), nullable=False)
     stock_quantity = db.Column(db.Integer, default=0)
-    price = db.Column(db.Float, default=0.0)
+    price = db.Column(Float, default=0.0)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self):
@@ -103,22 +160,32 @@ class Inventory(db.Model):
             'stock_quantity': self.stock_quantity,
             'price': self.price,
             'updated_at': self.updated_at.isoformat(),
-            'medication': self.medication.to_dict() if self.medication else None
+            'medication': related_dict(self, 'medication', Medication)
         }
 
+# Every status a reservation can be in; pending and confirmed hold stock
+RESERVATION_STATUSES = ('pending', 'confirmed', 'completed', 'cancelled', 'expired')
+
 class Reservation(db.Model):
     __tablename__ = 'reservations'
+    __table_args__ = (
+        db.Index('ix_reservations_pharmacy_status_created_at', 'pharmacy_id', 'status', 'created_at'),
+        db.Index('ix_reservations_user_created_at', 'user_id', 'created_at'),
+        db.Index('ix_reservations_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     pharmacy_id = db.Column(db.Integer, db.ForeignKey('pharmacies.id'), nullable=False)
     medication_id = db.Column(db.Integer, db.ForeignKey('medications.id'), nullable=False)
     quantity = db.Column(db.Integer, default=1)
-    status = db.Column(db.String(20), default='pending')  # pending, confirmed, completed, cancelled
+    unit_price = db.Column(Float)  # inventory price captured at booking time
+    status = db.Column(db.String(20), default='pending')  # one of RESERVATION_STATUSES
     customer_name = db.Column(db.String(100))
     customer_phone = db.Column(db.String(20))
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # response validators
     
     # Relationships
     medication = db.relationship('Medication', backref='reservations')
@@ -130,13 +197,14 @@ class Reservation(db.Model):
             'pharmacy_id': self.pharmacy_id,
             'medication_id': self.medication_id,
             'quantity': self.quantity,
+            'unit_price': self.unit_price,
             'status': self.status,
             'customer_name': self.customer_name,
             'customer_phone': self.customer_phone,
             'notes': self.notes,
             'created_at': self.created_at.isoformat(),
-            'medication': self.medication.to_dict() if self.medication else None,
-            'pharmacy': self.pharmacy.to_dict() if self.pharmacy else None
+            'medication': related_dict(self, 'medication', Medication),
+            'pharmacy': related_dict(self, 'pharmacy', Pharmacy)
         }
 
 class Subscription(db.Model):
@@ -145,10 +213,11 @@ class Subscription(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     pharmacy_id = db.Column(db.Integer, db.ForeignKey('pharmacies.id'), nullable=False)
     plan_type = db.Column(db.String(20))  # monthly, annual
-    amount = db.Column(db.Float, default=0.0)
+    amount = db.Column(Float, default=0.0)
     start_date = db.Column(db.DateTime)
     end_date = db.Column(db.DateTime)
     status = db.Column(db.String(20), default='active')  # active, expired, cancelled
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
         return {
@@ -169,7 +238,7 @@ class Advertisement(db.Model):
     content = db.Column(db.Text)
     image_url = db.Column(db.String(500))
     advertiser_name = db.Column(db.String(200))
-    budget = db.Column(db.Float, default=0.0)
+    budget = db.Column(Float, default=0.0)
     clicks = db.Column(db.Integer, default=0)
     impressions = db.Column(db.Integer, default=0)
     active = db.Column(db.Boolean, default=True)
@@ -187,4 +256,31 @@ class Advertisement(db.Model):
             'impressions': self.impressions,
             'active': self.active,
             'created_at': self.created_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+class DailyStat(db.Model):
+    __tablename__ = 'daily_stats'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'metric', 'key'),
+        db.Index('ix_daily_stats_metric_key_day', 'metric', 'key', 'day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    # registrations, pharmacies, reservations, medication_reservations, revenue,
+    # subscriptions, subscription_amount
+    metric = db.Column(db.String(50), nullable=False)
+    key = db.Column(db.String(50), nullable=False, default='')  # reservation/subscription status or medication id
+    value = db.Column(Float, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'metric': self.metric,
+            'key': self.key,
+            'value': self.value
+        }
+
+# Cached rows (catalog, pharmacies) are keyed by id; drop them when they change.
+# Cached auth state is dropped by utils.helpers when a user changes.
+register_invalidation(Medication, Pharmacy)
@@ -1,7 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import User, Pharmacy, Medication, Reservation, Subscription, Advertisement, db
-from utils.helpers import role_required, paginate
+from utils.helpers import role_required, paginate, InvalidCursor
+from utils.replica import read_replica
+from utils import serializers
+from utils.cache import get_cache
+from utils.fastjson import stream_json
+from utils.holds import run_sweep, SweepStats
+from utils.querywatch import allow_repeated_queries
+from utils.rollups import BUCKETS, stats_series, running_totals, popular_medication_ids
 from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__)
@@ -11,17 +18,11 @@ admin_bp = Blueprint('admin', __name__)
 @role_required(['admin'])
 def get_admin_dashboard():
     try:
-        # Get statistics
-        total_pharmacies = Pharmacy.query.count()
-        premium_subscriptions = Subscription.query.filter_by(status='active').count()
-        total_users = User.query.count()
+        # Get statistics from the rollup, so cost grows with days, not rows
+        totals = running_totals()
         
-        # Calculate revenue
-        active_subscriptions = Subscription.query.filter_by(status='active').all()
-        total_revenue = sum(sub.amount for sub in active_subscriptions)
-        
-        # Get recent activity
-        recent_reservations = Reservation.query.order_by(
+        # Get recent activity (ix_reservations_created_at, ix_users_created_at)
+        recent_reservations = serializers.reservations.prepare(Reservation.query).order_by(
             Reservation.created_at.desc()
         ).limit(5).all()
         
@@ -31,12 +32,12 @@ def get_admin_dashboard():
         
         return jsonify({
             'stats': {
-                'total_pharmacies': total_pharmacies,
-                'premium_subscriptions': premium_subscriptions,
-                'total_revenue': total_revenue,
-                'total_users': total_users
+                'total_pharmacies': totals['pharmacies'],
+                'premium_subscriptions': totals['active_subscriptions'],
+                'total_revenue': totals['active_revenue'],
+                'total_users': totals['users']
             },
-            'recent_reservations': [res.to_dict() for res in recent_reservations],
+            'recent_reservations': serializers.reservations.dump(recent_reservations),
             'recent_users': [user.to_dict() for user in recent_users]
         }), 200
         
@@ -46,6 +47,7 @@ def get_admin_dashboard():
 @admin_bp.route('/users', methods=['GET'])
 @jwt_required()
 @role_required(['admin'])
+@read_replica
 def get_users():
     try:
         page = request.args.get('page', 1, type=int)
@@ -67,9 +69,15 @@ def get_users():
             
         query = query.order_by(User.created_at.desc())
         
-        result = paginate(query, page, per_page)
+        result = paginate(query, page, per_page, keyset=(User.created_at, User.id),
+                          after=request.args.get('after'),
+                          include_total=request.args.get('include_total') in ('1', 'true'),
+                          serializer=serializers.users, stream=True)
+        
+        return stream_json(result), 200
         
-        return jsonify(result), 200
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -86,8 +94,10 @@ def update_user(user_id):
             
         data = request.get_json()
         
-        if 'role' in data:
+        if 'role' in data and data['role'] != user.role:
             user.role = data['role']
+            # Invalidate tokens that still carry the old role
+            user.token_version = (user.token_version or 0) + 1
         if 'name' in data:
             user.name = data['name']
         if 'phone' in data:
@@ -107,6 +117,7 @@ def update_user(user_id):
 @admin_bp.route('/pharmacies', methods=['GET'])
 @jwt_required()
 @role_required(['admin'])
+@read_replica
 def get_pharmacies():
     try:
         page = request.args.get('page', 1, type=int)
@@ -125,9 +136,9 @@ def get_pharmacies():
             
         query = query.order_by(Pharmacy.created_at.desc())
         
-        result = paginate(query, page, per_page)
+        result = paginate(query, page, per_page, serializer=serializers.pharmacies, stream=True)
         
-        return jsonify(result), 200
+        return stream_json(result), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -135,6 +146,7 @@ def get_pharmacies():
 @admin_bp.route('/subscriptions', methods=['GET'])
 @jwt_required()
 @role_required(['admin'])
+@read_replica
 def get_subscriptions():
     try:
         page = request.args.get('page', 1, type=int)
@@ -149,9 +161,9 @@ def get_subscriptions():
             
         query = query.order_by(Subscription.created_at.desc())
         
-        result = paginate(query, page, per_page)
+        result = paginate(query, page, per_page, serializer=serializers.subscriptions, stream=True)
         
-        return jsonify(result), 200
+        return stream_json(result), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -159,6 +171,7 @@ def get_subscriptions():
 @admin_bp.route('/advertisements', methods=['GET'])
 @jwt_required()
 @role_required(['admin'])
+@read_replica
 def get_advertisements():
     try:
         page = request.args.get('page', 1, type=int)
@@ -173,9 +186,9 @@ def get_advertisements():
             
         query = query.order_by(Advertisement.created_at.desc())
         
-        result = paginate(query, page, per_page)
+        result = paginate(query, page, per_page, serializer=serializers.advertisements, stream=True)
         
-        return jsonify(result), 200
+        return stream_json(result), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -211,50 +224,98 @@ def create_advertisement():
 @admin_bp.route('/analytics', methods=['GET'])
 @jwt_required()
 @role_required(['admin'])
+@read_replica
 def get_analytics():
     try:
-        # Get date range (last 30 days)
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=30)
-        
-        # Get user registrations
-        user_registrations = User.query.filter(
-            User.created_at.between(start_date, end_date)
-        ).count()
-        
-        # Get reservations
-        reservations = Reservation.query.filter(
-            Reservation.created_at.between(start_date, end_date)
-        ).count()
+        # Get date range (last 30 days by default)
+        try:
+            end_date = parse_date(request.args.get('end_date')) or datetime.utcnow().date()
+            start_date = parse_date(request.args.get('start_date')) or end_date - timedelta(days=30)
+        except ValueError:
+            return jsonify({'message': 'Dates must be in YYYY-MM-DD format'}), 400
+            
+        bucket = request.args.get('bucket', 'day')
         
-        # Get revenue
-        revenue = Subscription.query.filter(
-            Subscription.created_at.between(start_date, end_date)
-        ).with_entities(db.func.sum(Subscription.amount)).scalar() or 0
+        if bucket not in BUCKETS:
+            return jsonify({'message': f"Bucket must be one of: {', '.join(BUCKETS)}"}), 400
+            
+        if start_date > end_date:
+            return jsonify({'message': 'start_date must not be after end_date'}), 400
+            
+        # Everything below reads the daily rollup, so cost grows with days, not rows
+        totals, series = stats_series(start_date, end_date, bucket)
         
         # Get popular medications
-        popular_medications = db.session.query(
-            Medication.name,
-            db.func.count(Reservation.id).label('reservation_count')
-        ).join(Reservation).filter(
-            Reservation.created_at.between(start_date, end_date)
-        ).group_by(Medication.id).order_by(
-            db.func.count(Reservation.id).desc()
-        ).limit(5).all()
+        popular = popular_medication_ids(start_date, end_date, limit=5)
+        names = dict(Medication.query.with_entities(Medication.id, Medication.name).filter(
+            Medication.id.in_([medication_id for medication_id, _ in popular])
+        ).all())
         
         return jsonify({
             'period': {
                 'start_date': start_date.isoformat(),
-                'end_date': end_date.isoformat()
+                'end_date': end_date.isoformat(),
+                'bucket': bucket
             },
-            'user_registrations': user_registrations,
-            'reservations': reservations,
-            'revenue': revenue,
+            'user_registrations': totals['registrations'],
+            'reservations': totals['reservations'],
+            'reservations_by_status': totals['reservations_by_status'],
+            'revenue': totals['revenue'],
             'popular_medications': [
-                {'name': name, 'reservation_count': count}
-                for name, count in popular_medications
-            ]
+                {'name': names.get(medication_id), 'reservation_count': count}
+                for medication_id, count in popular
+            ],
+            'series': series
         }), 200
         
     except Exception as e:
-        return jsonify({'message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'message': str(e)}), 500
+
+def parse_date(value):
+    if not value:
+        return None
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+@admin_bp.route('/cache', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_cache_stats():
+    try:
+        cache = get_cache()
+        
+        if cache is None:
+            return jsonify({'message': 'Cache is not configured'}), 404
+            
+        return jsonify({'cache': cache.info()}), 200
+        
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@admin_bp.route('/holds', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_hold_sweeper_stats():
+    try:
+        stats = current_app.extensions.get('hold_sweeper') or SweepStats()
+        
+        return jsonify({'sweeper': stats.to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@admin_bp.route('/holds/sweep', methods=['POST'])
+@jwt_required()
+@role_required(['admin'])
+@allow_repeated_queries
+def sweep_holds():
+    try:
+        released, units, duration = run_sweep(current_app._get_current_object())
+        
+        return jsonify({
+            'released': released,
+            'units_returned': units,
+            'duration_ms': round(duration * 1000, 2)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
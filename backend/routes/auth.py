@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import User, db
-from utils.helpers import role_required
+from utils.helpers import role_required, create_user_token
+from utils.passwords import HasherBusy
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -27,7 +28,7 @@ def register():
         db.session.commit()
         
         # Create access token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_user_token(user)
         
         return jsonify({
             'message': 'User created successfully',
@@ -35,6 +36,8 @@ def register():
             'user': user.to_dict()
         }), 201
         
+    except HasherBusy as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
@@ -53,8 +56,13 @@ def login():
         if not user or not user.check_password(password):
             return jsonify({'message': 'Invalid credentials'}), 401
             
+        # Upgrade hashes made with a different BCRYPT_LOG_ROUNDS
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
+            
         # Create access token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_user_token(user)
         
         return jsonify({
             'message': 'Login successful',
@@ -62,6 +70,8 @@ def login():
             'user': user.to_dict()
         }), 200
         
+    except HasherBusy as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
@@ -105,5 +115,7 @@ def update_profile():
             'user': user.to_dict()
         }), 200
         
+    except HasherBusy as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'message': str(e)}), 500
\ No newline at end of file
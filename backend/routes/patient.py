@@ -1,93 +1,208 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import User, Pharmacy, Medication, Inventory, Reservation, db
-from utils.helpers import role_required, paginate
-import math
+from utils.helpers import role_required, paginate, InvalidCursor
+from utils.replica import read_replica
+from utils.geo import get_pharmacy_index, bounding_box
+from utils.search import search_medication_ids, medication_filter
+from utils import serializers
+from utils.fastjson import stream_json
+from utils.http import query_version, not_modified
+from utils.rollups import reservation_status_changed
+from sqlalchemy import update
 
 patient_bp = Blueprint('patient', __name__)
 
+# Upper bound on how many matching products a pharmacy search spans
+MAX_MATCHED_MEDICATIONS = 20
+
+# Pharmacies in range passed to SQL as an IN list; past this (dense areas,
+# large radii) a bounding box on the pharmacy coordinates is used instead,
+# keeping well under SQLite's bound-parameter limit
+MAX_PHARMACY_IDS = 500
+
 @patient_bp.route('/pharmacies/search', methods=['GET'])
 @jwt_required()
 @role_required(['patient'])
+@read_replica
 def search_pharmacies():
     try:
         medication_name = request.args.get('medication')
         location = request.args.get('location')
-        latitude = request.args.get('lat')
-        longitude = request.args.get('lng')
+        latitude = request.args.get('lat', type=float)
+        longitude = request.args.get('lng', type=float)
         max_distance = request.args.get('max_distance', 10, type=float)  # in km
+        limit = request.args.get('limit', type=int)  # nearest N pharmacies
         
         if not medication_name:
             return jsonify({'message': 'Medication name is required'}), 400
             
-        # Find medication
-        medication = Medication.query.filter(
-            Medication.name.ilike(f'%{medication_name}%')
-        ).first()
+        # One joined query over every matching medication; stock filter,
+        # price ordering and LIMIT all run in SQL
+        query = db.session.query(
+            Pharmacy.id, Pharmacy.name, Pharmacy.address, Pharmacy.latitude,
+            Pharmacy.longitude, Pharmacy.phone, Pharmacy.subscription_status,
+            Pharmacy.created_at, Inventory.price, Inventory.stock_quantity,
+            Medication.id.label('medication_id'), Medication.name.label('medication_name'),
+            Medication.category, Medication.description, Medication.generic_name
+        ).select_from(Inventory).join(
+            Pharmacy, Pharmacy.id == Inventory.pharmacy_id
+        ).join(
+            Medication, Medication.id == Inventory.medication_id
+        ).filter(Inventory.stock_quantity > 0)
         
-        if not medication:
-            return jsonify({'message': 'Medication not found'}), 404
-            
-        # Find pharmacies with the medication in stock
-        query = Inventory.query.filter_by(medication_id=medication.id)
-        query = query.filter(Inventory.stock_quantity > 0)
+        # Ranked full-text match on name/generic name/category, LIKE otherwise
+        medication_ids = search_medication_ids(medication_name, limit=MAX_MATCHED_MEDICATIONS)
+        if medication_ids is not None:
+            query = query.filter(Medication.id.in_(medication_ids))
+        else:
+            query = query.filter(medication_filter(medication_name))
         
-        inventories = query.all()
+        # Restrict to pharmacies inside max_distance using the spatial index
+        distances = None
+        if latitude is not None and longitude is not None:
+            distances = dict(get_pharmacy_index().within(latitude, longitude, max_distance))
+            if len(distances) <= MAX_PHARMACY_IDS:
+                query = query.filter(Inventory.pharmacy_id.in_(list(distances)))
+            else:
+                # Rows in the box corners are dropped against distances below
+                min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, max_distance)
+                query = query.filter(Pharmacy.latitude.between(min_lat, max_lat))
+                if min_lng >= -180 and max_lng <= 180:
+                    query = query.filter(Pharmacy.longitude.between(min_lng, max_lng))
+            
+        # Stock and price changes bump Inventory.updated_at, pharmacy and
+        # medication edits their own, so the matched rows' latest change plus
+        # their count versions the result
+        cached = not_modified(medication_ids, query_version(
+            query, (Inventory.updated_at, Pharmacy.updated_at, Medication.updated_at), Inventory.id
+        ))
+        if cached is not None:
+            return cached
+            
+        # Without a location the price order is final, so LIMIT in SQL too:
+        # the cheapest `limit` pharmacies of each matched product
+        if limit and distances is None:
+            price_rank = db.func.row_number().over(
+                partition_by=Inventory.medication_id, order_by=(Inventory.price.asc(), Pharmacy.id.asc())
+            ).label('price_rank')
+            ranked = query.add_columns(price_rank).subquery()
+            query = db.session.query(ranked).filter(ranked.c.price_rank <= limit).order_by(
+                ranked.c.price.asc(), ranked.c.id.asc()
+            )
+        else:
+            query = query.order_by(Inventory.price.asc(), Pharmacy.id.asc())
+            
+        rows = query.all()
+        if distances is not None:
+            rows = [row for row in rows if row.id in distances]
         
-        if not inventories:
+        if not rows:
+            if medication_ids is not None:
+                medication_exists = bool(medication_ids)
+            else:
+                medication_exists = db.session.query(
+                    Medication.query.filter(medication_filter(medication_name)).exists()
+                ).scalar()
+            
+            if not medication_exists:
+                return jsonify({'message': 'Medication not found'}), 404
+                
             return jsonify({'message': 'No pharmacies found with this medication in stock'}), 404
             
-        # Get pharmacy details
-        results = []
-        for inventory in inventories:
-            pharmacy = Pharmacy.query.get(inventory.pharmacy_id)
+        # One group per matched product, each in the original response shape
+        groups = {}
+        for row in rows:
+            group = groups.get(row.medication_id)
+            if group is None:
+                group = groups[row.medication_id] = {
+                    'medication': {
+                        'id': row.medication_id,
+                        'name': row.medication_name,
+                        'category': row.category,
+                        'description': row.description,
+                        'generic_name': row.generic_name
+                    },
+                    'pharmacies': []
+                }
+            group['pharmacies'].append({
+                'id': row.id,
+                'name': row.name,
+                'address': row.address,
+                'latitude': row.latitude,
+                'longitude': row.longitude,
+                'phone': row.phone,
+                'subscription_status': row.subscription_status,
+                'created_at': row.created_at.isoformat(),
+                'price': row.price,
+                'stock': row.stock_quantity,
+                'distance': distances.get(row.id) if distances is not None else None
+            })
             
-            if pharmacy:
-                pharmacy_data = pharmacy.to_dict()
-                pharmacy_data['price'] = inventory.price
-                pharmacy_data['stock'] = inventory.stock_quantity
-                pharmacy_data['distance'] = None
-                
-                # Calculate distance if coordinates provided
-                if latitude and longitude and pharmacy.latitude and pharmacy.longitude:
-                    distance = calculate_distance(
-                        float(latitude), float(longitude),
-                        pharmacy.latitude, pharmacy.longitude
-                    )
-                    pharmacy_data['distance'] = distance
+        # Sort by distance if available (rows are already in price order otherwise)
+        if distances is not None:
+            for group in groups.values():
+                group['pharmacies'].sort(key=lambda x: x['distance'])
                 
-                results.append(pharmacy_data)
-        
-        # Sort by distance if available
-        if latitude and longitude:
-            results.sort(key=lambda x: x['distance'] if x['distance'] is not None else float('inf'))
+                # Nearest N mode: the closest stocked pharmacies within
+                # max_distance, which the spatial index alone can't tell
+                if limit:
+                    del group['pharmacies'][limit:]
+                    
+        # The best-ranked product answers as before; other matches follow
+        # under their own key (LIKE matches rank by id, like the old .first())
+        if medication_ids is not None:
+            rank = {medication_id: position for position, medication_id in enumerate(medication_ids)}
+            ordered = sorted(groups, key=rank.get)
         else:
-            # Sort by price if no location provided
-            results.sort(key=lambda x: x['price'])
+            ordered = sorted(groups)
+        best = groups[ordered[0]]
         
         return jsonify({
-            'medication': medication.to_dict(),
-            'pharmacies': results
+            'medication': best['medication'],
+            'pharmacies': best['pharmacies'],
+            'other_medications': [groups[medication_id] for medication_id in ordered[1:]]
         }), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
-def calculate_distance(lat1, lng1, lat2, lng2):
-    # Haversine formula to calculate distance between two points
-    R = 6371  # Earth's radius in km
-    
-    dlat = math.radians(lat2 - lat1)
-    dlng = math.radians(lng2 - lng1)
-    
-    a = (math.sin(dlat/2) * math.sin(dlat/2) +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dlng/2) * math.sin(dlng/2))
-    
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    distance = R * c
+def _inventory_row(pharmacy_id, medication_id, min_stock=None):
+    row = db.session.query(Inventory.id).filter(
+        Inventory.pharmacy_id == pharmacy_id,
+        Inventory.medication_id == medication_id
+    )
+    if min_stock is not None:
+        row = row.filter(Inventory.stock_quantity >= min_stock)
+    return row.order_by(Inventory.id).limit(1).scalar_subquery()
+
+def take_stock(pharmacy_id, medication_id, quantity):
+    # Atomically decrement stock if at least `quantity` is left; returns the
+    # unit price, or None when there isn't enough stock
+    statement = update(Inventory).where(
+        Inventory.id == _inventory_row(pharmacy_id, medication_id, quantity),
+        Inventory.stock_quantity >= quantity
+    ).values(
+        stock_quantity=Inventory.stock_quantity - quantity
+    ).execution_options(synchronize_session=False)
     
-    return round(distance, 2)
+    if db.engine.dialect.update_returning:
+        return db.session.execute(statement.returning(Inventory.price)).scalar()
+        
+    if not db.session.execute(statement).rowcount:
+        return None
+    return db.session.query(Inventory.price).filter(
+        Inventory.id == _inventory_row(pharmacy_id, medication_id)
+    ).scalar()
+
+def return_stock(pharmacy_id, medication_id, quantity):
+    db.session.execute(
+        update(Inventory).where(
+            Inventory.id == _inventory_row(pharmacy_id, medication_id)
+        ).values(
+            stock_quantity=Inventory.stock_quantity + quantity
+        ).execution_options(synchronize_session=False)
+    )
 
 @patient_bp.route('/reservations', methods=['POST'])
 @jwt_required()
@@ -104,14 +219,16 @@ def create_reservation():
         if not pharmacy_id or not medication_id:
             return jsonify({'message': 'Pharmacy and medication are required'}), 400
             
-        # Check if medication is available
-        inventory = Inventory.query.filter_by(
-            pharmacy_id=pharmacy_id,
-            medication_id=medication_id
-        ).first()
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            return jsonify({'message': 'Quantity must be a positive whole number'}), 400
+            
+        # Take the stock in one conditional UPDATE so concurrent bookings can
+        # never oversell: it only matches while enough stock is left
+        price = take_stock(pharmacy_id, medication_id, quantity)
         
-        if not inventory or inventory.stock_quantity < quantity:
-            return jsonify({'message': 'Not enough stock available'}), 400
+        if price is None:
+            db.session.rollback()
+            return jsonify({'message': 'Not enough stock available'}), 409
             
         # Create reservation
         reservation = Reservation(
@@ -119,15 +236,13 @@ def create_reservation():
             pharmacy_id=pharmacy_id,
             medication_id=medication_id,
             quantity=quantity,
+            unit_price=price,
             customer_name=data.get('customer_name'),
             customer_phone=data.get('customer_phone'),
             notes=data.get('notes'),
             status='pending'
         )
         
-        # Update inventory
-        inventory.stock_quantity -= quantity
-        
         db.session.add(reservation)
         db.session.commit()
         
@@ -143,6 +258,7 @@ def create_reservation():
 @patient_bp.route('/reservations', methods=['GET'])
 @jwt_required()
 @role_required(['patient'])
+@read_replica
 def get_reservations():
     try:
         user_id = get_jwt_identity()
@@ -152,9 +268,15 @@ def get_reservations():
         reservations = Reservation.query.filter_by(user_id=user_id)
         reservations = reservations.order_by(Reservation.created_at.desc())
         
-        result = paginate(reservations, page, per_page)
+        result = paginate(reservations, page, per_page, keyset=(Reservation.created_at, Reservation.id),
+                          after=request.args.get('after'),
+                          include_total=request.args.get('include_total') in ('1', 'true'),
+                          serializer=serializers.reservations, stream=True)
         
-        return jsonify(result), 200
+        return stream_json(result), 200
+        
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -162,10 +284,11 @@ def get_reservations():
 @patient_bp.route('/reservations/<int:reservation_id>', methods=['GET'])
 @jwt_required()
 @role_required(['patient'])
+@read_replica
 def get_reservation(reservation_id):
     try:
         user_id = get_jwt_identity()
-        reservation = Reservation.query.filter_by(
+        reservation = serializers.reservations.prepare(Reservation.query).filter_by(
             id=reservation_id,
             user_id=user_id
         ).first()
@@ -173,7 +296,7 @@ def get_reservation(reservation_id):
         if not reservation:
             return jsonify({'message': 'Reservation not found'}), 404
             
-        return jsonify({'reservation': reservation.to_dict()}), 200
+        return jsonify({'reservation': serializers.reservations.dump_one(reservation)}), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -195,17 +318,23 @@ def cancel_reservation(reservation_id):
         if reservation.status not in ['pending', 'confirmed']:
             return jsonify({'message': 'Cannot cancel this reservation'}), 400
             
-        # Restore inventory
-        inventory = Inventory.query.filter_by(
-            pharmacy_id=reservation.pharmacy_id,
-            medication_id=reservation.medication_id
-        ).first()
+        # Compare-and-set on the status we just read, so two concurrent
+        # cancels (or a cancel racing a pickup) can't both restore stock
+        old_status = reservation.status
+        cancelled = db.session.execute(
+            update(Reservation).where(
+                Reservation.id == reservation.id,
+                Reservation.status == old_status
+            ).values(status='cancelled').execution_options(synchronize_session=False)
+        ).rowcount
         
-        if inventory:
-            inventory.stock_quantity += reservation.quantity
+        if not cancelled:
+            db.session.rollback()
+            return jsonify({'message': 'Cannot cancel this reservation'}), 409
             
-        # Update reservation status
-        reservation.status = 'cancelled'
+        # Restore inventory
+        return_stock(reservation.pharmacy_id, reservation.medication_id, reservation.quantity)
+        reservation_status_changed(db.session.connection(), reservation.created_at, old_status, 'cancelled')
         
         db.session.commit()
         
@@ -221,6 +350,7 @@ def cancel_reservation(reservation_id):
 @patient_bp.route('/medications/search', methods=['GET'])
 @jwt_required()
 @role_required(['patient'])
+@read_replica
 def search_medications():
     try:
         query = request.args.get('q', '')
@@ -228,9 +358,17 @@ def search_medications():
         if not query or len(query) < 2:
             return jsonify({'medications': []}), 200
             
-        medications = Medication.query.filter(
-            Medication.name.ilike(f'%{query}%')
-        ).limit(10).all()
+        medication_ids = search_medication_ids(query, limit=10)
+        
+        if medication_ids is None:
+            medications = Medication.query.filter(
+                medication_filter(query)
+            ).limit(10).all()
+        else:
+            # Keep the relevance order from the FTS index
+            found = Medication.query.filter(Medication.id.in_(medication_ids)).all()
+            by_id = {med.id: med for med in found}
+            medications = [by_id[med_id] for med_id in medication_ids if med_id in by_id]
         
         return jsonify({
             'medications': [med.to_dict() for med in medications]
@@ -1,61 +1,164 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import User, Pharmacy, Medication, Inventory, Reservation, db
-from utils.helpers import role_required, paginate
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
+from models import User, Pharmacy, Medication, Inventory, Reservation, RESERVATION_STATUSES, db
+from utils.helpers import role_required, paginate, InvalidCursor, current_auth
+from utils import serializers
+from utils.fastjson import stream_json
+from utils.http import table_version, query_version, not_modified
+from utils.cache import cached_row
+from utils.imports import InvalidImport, detect_format, read_rows, import_inventory
+from utils.querywatch import allow_repeated_queries
+from utils.rollups import reservation_status_changed
+from routes.patient import return_stock
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
 
 pharmacist_bp = Blueprint('pharmacist', __name__)
 
+# Status changes a pharmacist can make, by current status. Completed,
+# cancelled and expired reservations are final: their stock has already
+# been handed over or returned
+RESERVATION_TRANSITIONS = {
+    'pending': ('confirmed', 'completed', 'cancelled'),
+    'confirmed': ('completed', 'cancelled')
+}
+
+def month_bounds(moment):
+    start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+def parse_batch_operation(item):
+    # Validates one batch update entry; returns (operation, error message)
+    if not isinstance(item, dict):
+        return None, 'Each operation must be an object'
+        
+    if ('inventory_id' in item) == ('medication_id' in item):
+        return None, 'Provide exactly one of inventory_id or medication_id'
+    if 'stock_quantity' in item and 'stock_delta' in item:
+        return None, 'Provide stock_quantity or stock_delta, not both'
+    if not any(key in item for key in ('stock_quantity', 'stock_delta', 'price')):
+        return None, 'Nothing to update'
+        
+    for key in ('inventory_id', 'medication_id', 'stock_quantity', 'stock_delta'):
+        if key in item and (not isinstance(item[key], int) or isinstance(item[key], bool)):
+            return None, f'{key} must be an integer'
+    if 'price' in item and (not isinstance(item['price'], (int, float)) or isinstance(item['price'], bool)):
+        return None, 'price must be a number'
+    if item.get('stock_quantity', 0) < 0 or item.get('price', 0) < 0:
+        return None, 'stock_quantity and price cannot be negative'
+        
+    return item, None
+
+def _pharmacy_dict(pharmacy_id):
+    pharmacy = db.session.get(Pharmacy, pharmacy_id)
+    return pharmacy.to_dict() if pharmacy else None
+
+def _recent_reservations(pharmacy_id, limit=5):
+    # (id, updated_at, medication updated_at) of the newest reservations.
+    # Takes the newest `limit` of each status from
+    # ix_reservations_pharmacy_status_created_at and keeps the newest of
+    # those, so only a few index entries per status are read however long
+    # the pharmacy's history is
+    newest = [
+        db.select(Reservation.id, Reservation.created_at).filter(
+            Reservation.pharmacy_id == pharmacy_id,
+            Reservation.status == status
+        ).order_by(Reservation.created_at.desc(), Reservation.id.desc()).limit(limit).subquery()
+        for status in RESERVATION_STATUSES
+    ]
+    candidates = db.union_all(*(db.select(subquery) for subquery in newest)).subquery()
+    
+    return db.session.query(Reservation.id, Reservation.updated_at, Medication.updated_at).join(
+        candidates, candidates.c.id == Reservation.id
+    ).outerjoin(Reservation.medication).order_by(
+        candidates.c.created_at.desc(), candidates.c.id.desc()
+    ).limit(limit).all()
+
 @pharmacist_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
 @role_required(['pharmacist'])
 def get_dashboard():
     try:
-        user_id = get_jwt_identity()
-        
-        # Get pharmacist's pharmacy
-        pharmacy = Pharmacy.query.filter_by(owner_id=user_id).first()
+        # Get pharmacist's pharmacy from the token claims
+        pharmacy_id = current_auth().pharmacy_id
         
-        if not pharmacy:
+        # The token may outlive the pharmacy it names
+        pharmacy = cached_row(Pharmacy, pharmacy_id, lambda: _pharmacy_dict(pharmacy_id)) if pharmacy_id else None
+        if pharmacy is None:
             return jsonify({'message': 'Pharmacy not found'}), 404
             
-        # Get statistics
-        pending_reservations = Reservation.query.filter_by(
-            pharmacy_id=pharmacy.id,
-            status='pending'
-        ).count()
-        
-        total_medications = Inventory.query.filter_by(
-            pharmacy_id=pharmacy.id
-        ).count()
-        
-        low_stock_items = Inventory.query.filter(
-            Inventory.pharmacy_id == pharmacy.id,
-            Inventory.stock_quantity < 10
-        ).count()
-        
-        # Calculate revenue (simplified)
-        completed_reservations = Reservation.query.filter_by(
-            pharmacy_id=pharmacy.id,
-            status='completed'
-        ).all()
-        
-        monthly_revenue = sum(
-            res.quantity * Inventory.query.filter_by(
-                pharmacy_id=pharmacy.id,
-                medication_id=res.medication_id
-            ).first().price
-            for res in completed_reservations
-            if res.created_at.month == db.func.extract('month', db.func.now())
+        # Current calendar month as real date bounds
+        month_start, month_end = month_bounds(datetime.utcnow())
+        
+        # Reservations created before unit_price existed fall back to today's price
+        legacy_price = db.session.query(Inventory.price).filter(
+            Inventory.pharmacy_id == Reservation.pharmacy_id,
+            Inventory.medication_id == Reservation.medication_id
+        ).limit(1).scalar_subquery()
+        
+        # Get statistics: pending count and this month's revenue in one
+        # conditional aggregate. Each OR branch filters on a prefix of
+        # ix_reservations_pharmacy_status_created_at, so only the pending
+        # rows and this month's completed rows are read
+        is_pending = Reservation.status == 'pending'
+        reservation_stats = db.session.query(
+            db.func.coalesce(db.func.sum(db.case((is_pending, 1), else_=0)), 0).label('pending'),
+            db.func.coalesce(db.func.sum(db.case(
+                (is_pending, 0),
+                else_=Reservation.quantity * db.func.coalesce(Reservation.unit_price, legacy_price, 0)
+            )), 0).label('revenue')
+        ).filter(db.or_(
+            db.and_(Reservation.pharmacy_id == pharmacy_id, is_pending),
+            db.and_(
+                Reservation.pharmacy_id == pharmacy_id,
+                Reservation.status == 'completed',
+                Reservation.created_at >= month_start,
+                Reservation.created_at < month_end
+            )
+        )).one()
+        
+        pending_reservations = reservation_stats.pending
+        monthly_revenue = reservation_stats.revenue
+        recent = _recent_reservations(pharmacy_id)
+        
+        # Validate on what the body shows: the stats themselves, the recent
+        # rows (with their medications), the pharmacy row and the inventory.
+        # The counts can drop without a newer timestamp, so the ETag alone
+        # decides and the history behind them is never scanned
+        cached = not_modified(
+            pharmacy_id, month_start, pending_reservations, monthly_revenue,
+            tuple(tuple(row) for row in recent),
+            table_version(Pharmacy.updated_at, Pharmacy.id, Pharmacy.id == pharmacy_id),
+            query_version(Inventory.query.join(Inventory.medication), (Inventory.updated_at, Medication.updated_at),
+                          Inventory.id, Inventory.pharmacy_id == pharmacy_id),
+            last_modified=False
         )
+        if cached is not None:
+            return cached
+            
+        inventory_stats = db.session.query(
+            db.func.count(Inventory.id).label('total'),
+            db.func.coalesce(db.func.sum(db.case(
+                (Inventory.stock_quantity < 10, 1), else_=0
+            )), 0).label('low_stock')
+        ).filter(Inventory.pharmacy_id == pharmacy_id).one()
+        
+        total_medications = inventory_stats.total
+        low_stock_items = inventory_stats.low_stock
         
         # Get recent reservations
-        recent_reservations = Reservation.query.filter_by(
-            pharmacy_id=pharmacy.id
-        ).order_by(Reservation.created_at.desc()).limit(5).all()
+        recent_ids = [row.id for row in recent]
+        recent_reservations = sorted(
+            serializers.reservations.prepare(Reservation.query).filter(Reservation.id.in_(recent_ids)).all(),
+            key=lambda reservation: recent_ids.index(reservation.id)
+        ) if recent_ids else []
         
         # Get low stock items
-        low_stock = Inventory.query.filter(
-            Inventory.pharmacy_id == pharmacy.id,
+        low_stock = serializers.inventory_items.prepare(Inventory.query).filter(
+            Inventory.pharmacy_id == pharmacy_id,
             Inventory.stock_quantity < 10
         ).order_by(Inventory.stock_quantity.asc()).limit(5).all()
         
@@ -66,9 +169,9 @@ def get_dashboard():
                 'low_stock_items': low_stock_items,
                 'monthly_revenue': round(monthly_revenue, 2)
             },
-            'recent_reservations': [res.to_dict() for res in recent_reservations],
-            'low_stock_items': [inv.to_dict() for inv in low_stock],
-            'pharmacy': pharmacy.to_dict()
+            'recent_reservations': serializers.reservations.dump(recent_reservations),
+            'low_stock_items': serializers.inventory_items.dump(low_stock),
+            'pharmacy': pharmacy
         }), 200
         
     except Exception as e:
@@ -79,30 +182,38 @@ def get_dashboard():
 @role_required(['pharmacist'])
 def get_inventory():
     try:
-        user_id = get_jwt_identity()
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         search = request.args.get('search', '')
         
-        # Get pharmacist's pharmacy
-        pharmacy = Pharmacy.query.filter_by(owner_id=user_id).first()
+        # Get pharmacist's pharmacy from the token claims
+        pharmacy_id = current_auth().pharmacy_id
         
-        if not pharmacy:
+        if not pharmacy_id:
             return jsonify({'message': 'Pharmacy not found'}), 404
             
+        cached = not_modified(pharmacy_id, query_version(
+            Inventory.query.join(Inventory.medication), (Inventory.updated_at, Medication.updated_at),
+            Inventory.id, Inventory.pharmacy_id == pharmacy_id
+        ))
+        if cached is not None:
+            return cached
+            
         # Build query
-        query = Inventory.query.filter_by(pharmacy_id=pharmacy.id)
+        query = Inventory.query.filter_by(pharmacy_id=pharmacy_id)
+        serializer = serializers.inventory_items
         
         if search:
-            query = query.join(Medication).filter(
+            query = query.join(Inventory.medication).filter(
                 Medication.name.ilike(f'%{search}%')
             )
+            serializer = serializer.with_joined('medication')
             
         query = query.order_by(Inventory.updated_at.desc())
         
-        result = paginate(query, page, per_page)
+        result = paginate(query, page, per_page, serializer=serializer, stream=True)
         
-        return jsonify(result), 200
+        return stream_json(result), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -112,13 +223,12 @@ def get_inventory():
 @role_required(['pharmacist'])
 def add_inventory_item():
     try:
-        user_id = get_jwt_identity()
         data = request.get_json()
         
-        # Get pharmacist's pharmacy
-        pharmacy = Pharmacy.query.filter_by(owner_id=user_id).first()
+        # Get pharmacist's pharmacy from the token claims
+        pharmacy_id = current_auth().pharmacy_id
         
-        if not pharmacy:
+        if not pharmacy_id:
             return jsonify({'message': 'Pharmacy not found'}), 404
             
         medication_id = data.get('medication_id')
@@ -134,30 +244,210 @@ def add_inventory_item():
         if not medication:
             return jsonify({'message': 'Medication not found'}), 404
             
-        # Check if inventory item already exists
-        existing = Inventory.query.filter_by(
-            pharmacy_id=pharmacy.id,
-            medication_id=medication_id
-        ).first()
+        # Check if inventory item already exists; if a concurrent import or
+        # request inserts it first, the unique index rejects our insert and
+        # the second attempt updates the row instead
+        for attempt in range(2):
+            existing = Inventory.query.filter_by(
+                pharmacy_id=pharmacy_id,
+                medication_id=medication_id
+            ).first()
+            
+            if existing:
+                # Update existing item
+                existing.stock_quantity += stock_quantity
+                existing.price = price
+            else:
+                # Create new inventory item
+                inventory = Inventory(
+                    pharmacy_id=pharmacy_id,
+                    medication_id=medication_id,
+                    stock_quantity=stock_quantity,
+                    price=price
+                )
+                db.session.add(inventory)
+                
+            try:
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+                    
+        return jsonify({
+            'message': 'Inventory updated successfully'
+        }), 200
         
-        if existing:
-            # Update existing item
-            existing.stock_quantity += stock_quantity
-            existing.price = price
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 500
+
+@pharmacist_bp.route('/inventory/import', methods=['POST'])
+@jwt_required()
+@role_required(['pharmacist'])
+@allow_repeated_queries
+def import_inventory_items():
+    try:
+        # Get pharmacist's pharmacy from the token claims
+        pharmacy_id = current_auth().pharmacy_id
+        
+        if not pharmacy_id:
+            return jsonify({'message': 'Pharmacy not found'}), 404
+            
+        # Either a multipart upload (spooled to disk by werkzeug) or the raw
+        # request body, read line by line in both cases
+        upload = request.files.get('file')
+        if upload is not None:
+            stream, filename, content_type = upload.stream, upload.filename, upload.mimetype
         else:
-            # Create new inventory item
-            inventory = Inventory(
-                pharmacy_id=pharmacy.id,
-                medication_id=medication_id,
-                stock_quantity=stock_quantity,
-                price=price
-            )
-            db.session.add(inventory)
+            stream, filename, content_type = request.stream, None, request.mimetype
+            
+        fmt = detect_format(filename, content_type, request.args.get('format'))
+        report = import_inventory(
+            pharmacy_id,
+            read_rows(stream, fmt),
+            mode=request.args.get('mode', 'set'),
+            chunk_size=current_app.config['INVENTORY_IMPORT_CHUNK_SIZE'],
+            max_errors=current_app.config['INVENTORY_IMPORT_MAX_ERRORS']
+        )
+        
+        # Chunks before the failed one are committed; say how far it got
+        if report.aborted:
+            return jsonify({
+                'message': f"Inventory import stopped at row {report.aborted['row']}",
+                'report': report.to_dict()
+            }), 500
             
+        return jsonify({
+            'message': 'Inventory import finished',
+            'report': report.to_dict()
+        }), 200
+        
+    except InvalidImport as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 500
+
+@pharmacist_bp.route('/inventory/batch', methods=['PUT'])
+@jwt_required()
+@role_required(['pharmacist'])
+def batch_update_inventory():
+    try:
+        data = request.get_json(silent=True)
+        
+        # Get pharmacist's pharmacy from the token claims
+        pharmacy_id = current_auth().pharmacy_id
+        
+        if not pharmacy_id:
+            return jsonify({'message': 'Pharmacy not found'}), 404
+            
+        if not isinstance(data, dict):
+            return jsonify({'message': 'Body must be a JSON object with an items list'}), 400
+            
+        items = data.get('items')
+        max_items = current_app.config['INVENTORY_BATCH_MAX_ITEMS']
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'message': 'items must be a non-empty list'}), 400
+        if len(items) > max_items:
+            return jsonify({'message': f'At most {max_items} items per batch'}), 400
+            
+        operations = []
+        errors = []
+        for index, item in enumerate(items):
+            operation, error = parse_batch_operation(item)
+            if error:
+                errors.append({'index': index, 'message': error})
+            else:
+                operations.append((index, operation))
+                
+        # Ownership: one query per reference kind, scoped to this pharmacy
+        inventory_ids = {op['inventory_id'] for _, op in operations if 'inventory_id' in op}
+        medication_ids = {op['medication_id'] for _, op in operations if 'medication_id' in op}
+        
+        owned = set()
+        if inventory_ids:
+            owned = {id for (id,) in db.session.query(Inventory.id).filter(
+                Inventory.pharmacy_id == pharmacy_id,
+                Inventory.id.in_(inventory_ids)
+            )}
+            
+        by_medication = {}
+        if medication_ids:
+            by_medication = dict(db.session.query(Inventory.medication_id, func.min(Inventory.id)).filter(
+                Inventory.pharmacy_id == pharmacy_id,
+                Inventory.medication_id.in_(medication_ids)
+            ).group_by(Inventory.medication_id).all())
+            
+        targets = {}
+        for index, op in operations:
+            if 'inventory_id' in op:
+                target = op['inventory_id'] if op['inventory_id'] in owned else None
+            else:
+                target = by_medication.get(op['medication_id'])
+                
+            if target is None:
+                errors.append({'index': index, 'message': 'Inventory item not found'})
+            elif target in targets:
+                errors.append({'index': index, 'message': 'Inventory item appears more than once'})
+            else:
+                targets[target] = op
+                
+        if errors:
+            return jsonify({
+                'message': 'No changes applied',
+                'errors': sorted(errors, key=lambda error: error['index'])
+            }), 400
+            
+        # Group operations by the columns they touch so each group is one
+        # executemany UPDATE
+        groups = {}
+        for target, op in targets.items():
+            stock = 'set' if 'stock_quantity' in op else 'delta' if 'stock_delta' in op else None
+            groups.setdefault((stock, 'price' in op), []).append({
+                'target_id': target,
+                'new_stock': op.get('stock_quantity', op.get('stock_delta')),
+                'new_price': op.get('price')
+            })
+            
+        table = Inventory.__table__
+        now = datetime.utcnow()
+        for (stock, has_price), params in groups.items():
+            statement = table.update().where(table.c.id == db.bindparam('target_id'))
+            values = {'updated_at': now}
+            
+            if stock == 'set':
+                values['stock_quantity'] = db.bindparam('new_stock')
+            elif stock == 'delta':
+                values['stock_quantity'] = table.c.stock_quantity + db.bindparam('new_stock')
+                # Deltas may not take stock below zero
+                statement = statement.where(table.c.stock_quantity + db.bindparam('new_stock') >= 0)
+            if has_price:
+                values['price'] = db.bindparam('new_price')
+                
+            updated = db.session.execute(statement.values(values), params).rowcount
+            if updated != len(params):
+                db.session.rollback()
+                return jsonify({'message': 'Insufficient stock for a stock_delta, no changes applied'}), 409
+                
         db.session.commit()
         
+        rows = db.session.query(
+            Inventory.id, Inventory.medication_id, Inventory.stock_quantity,
+            Inventory.price, Inventory.updated_at
+        ).filter(Inventory.id.in_(targets)).order_by(Inventory.id).all()
+        
         return jsonify({
-            'message': 'Inventory updated successfully'
+            'message': 'Inventory updated successfully',
+            'items': [{
+                'id': row.id,
+                'medication_id': row.medication_id,
+                'stock_quantity': row.stock_quantity,
+                'price': row.price,
+                'updated_at': row.updated_at.isoformat()
+            } for row in rows]
         }), 200
         
     except Exception as e:
@@ -169,19 +459,18 @@ def add_inventory_item():
 @role_required(['pharmacist'])
 def update_inventory_item(inventory_id):
     try:
-        user_id = get_jwt_identity()
         data = request.get_json()
         
-        # Get pharmacist's pharmacy
-        pharmacy = Pharmacy.query.filter_by(owner_id=user_id).first()
+        # Get pharmacist's pharmacy from the token claims
+        pharmacy_id = current_auth().pharmacy_id
         
-        if not pharmacy:
+        if not pharmacy_id:
             return jsonify({'message': 'Pharmacy not found'}), 404
             
         # Get inventory item
         inventory = Inventory.query.filter_by(
             id=inventory_id,
-            pharmacy_id=pharmacy.id
+            pharmacy_id=pharmacy_id
         ).first()
         
         if not inventory:
@@ -209,28 +498,33 @@ def update_inventory_item(inventory_id):
 @role_required(['pharmacist'])
 def get_pharmacy_reservations():
     try:
-        user_id = get_jwt_identity()
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         status = request.args.get('status')
         
-        # Get pharmacist's pharmacy
-        pharmacy = Pharmacy.query.filter_by(owner_id=user_id).first()
+        # Get pharmacist's pharmacy from the token claims
+        pharmacy_id = current_auth().pharmacy_id
         
-        if not pharmacy:
+        if not pharmacy_id:
             return jsonify({'message': 'Pharmacy not found'}), 404
             
         # Build query
-        query = Reservation.query.filter_by(pharmacy_id=pharmacy.id)
+        query = Reservation.query.filter_by(pharmacy_id=pharmacy_id)
         
         if status:
             query = query.filter_by(status=status)
             
         query = query.order_by(Reservation.created_at.desc())
         
-        result = paginate(query, page, per_page)
+        result = paginate(query, page, per_page, keyset=(Reservation.created_at, Reservation.id),
+                          after=request.args.get('after'),
+                          include_total=request.args.get('include_total') in ('1', 'true'),
+                          serializer=serializers.reservations, stream=True)
         
-        return jsonify(result), 200
+        return stream_json(result), 200
+        
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
@@ -240,30 +534,51 @@ def get_pharmacy_reservations():
 @role_required(['pharmacist'])
 def update_reservation_status(reservation_id):
     try:
-        user_id = get_jwt_identity()
         data = request.get_json()
         status = data.get('status')
         
         if not status:
             return jsonify({'message': 'Status is required'}), 400
             
-        # Get pharmacist's pharmacy
-        pharmacy = Pharmacy.query.filter_by(owner_id=user_id).first()
+        if status not in RESERVATION_STATUSES:
+            return jsonify({'message': f"Status must be one of: {', '.join(RESERVATION_STATUSES)}"}), 400
+            
+        # Get pharmacist's pharmacy from the token claims
+        pharmacy_id = current_auth().pharmacy_id
         
-        if not pharmacy:
+        if not pharmacy_id:
             return jsonify({'message': 'Pharmacy not found'}), 404
             
         # Get reservation
         reservation = Reservation.query.filter_by(
             id=reservation_id,
-            pharmacy_id=pharmacy.id
+            pharmacy_id=pharmacy_id
         ).first()
         
         if not reservation:
             return jsonify({'message': 'Reservation not found'}), 404
             
-        # Update status
-        reservation.status = status
+        old_status = reservation.status
+        if status not in RESERVATION_TRANSITIONS.get(old_status, ()):
+            return jsonify({'message': f'Cannot change a {old_status} reservation to {status}'}), 409
+            
+        # Compare-and-set on the status we just read, so a change racing a
+        # patient cancel or the hold sweeper can't return the stock twice
+        updated = db.session.execute(
+            update(Reservation).where(
+                Reservation.id == reservation.id,
+                Reservation.status == old_status
+            ).values(status=status).execution_options(synchronize_session=False)
+        ).rowcount
+        
+        if not updated:
+            db.session.rollback()
+            return jsonify({'message': 'Reservation status changed meanwhile, reload and retry'}), 409
+            
+        # A cancelled hold gives its stock back
+        if status == 'cancelled':
+            return_stock(reservation.pharmacy_id, reservation.medication_id, reservation.quantity)
+        reservation_status_changed(db.session.connection(), reservation.created_at, old_status, status)
         
         db.session.commit()
         
@@ -274,4 +589,4 @@ def update_reservation_status(reservation_id):
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({'message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'message': str(e)}), 500
@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# A throwaway database for the whole run, set before config.py is imported
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ.pop('REPLICA_DATABASE_URL', None)
+
+from sqlalchemy import event
+from app import create_app
+from data.seed_data import seed_data
+from database import db, init_db
+from models import Pharmacy, User
+from utils.helpers import create_user_token
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app('testing')
+    init_db(app)
+    with app.app_context():
+        seed_data()
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(scope='session')
+def headers(app):
+    # Authorization headers for the first seeded user of each role
+    with app.app_context():
+        return {
+            role: {'Authorization': 'Bearer ' + create_user_token(User.query.filter_by(role=role).order_by(User.id).first())}
+            for role in ('patient', 'pharmacist', 'admin')
+        }
+
+@pytest.fixture
+def make_pharmacist(app):
+    # A pharmacist with a pharmacy of their own: (user id, pharmacy id, headers)
+    def make(email):
+        with app.app_context():
+            user = User(email=email, role='pharmacist', name='Owner')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+            pharmacy = Pharmacy(name=f'{email} pharmacy', address='Nairobi', owner_id=user.id)
+            db.session.add(pharmacy)
+            db.session.commit()
+            token = create_user_token(db.session.get(User, user.id))
+            return user.id, pharmacy.id, {'Authorization': 'Bearer ' + token}
+    return make
+
+@pytest.fixture
+def statements(app):
+    # Every (statement, parameters) the app sends to the database meanwhile
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            recorded.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield recorded
+    event.remove(engine, 'before_cursor_execute', record)
@@ -0,0 +1,58 @@
+from flask_jwt_extended import create_access_token
+from sqlalchemy import update
+from database import db
+from models import Pharmacy, User
+
+def test_warm_requests_do_not_read_the_user(client, make_pharmacist, statements):
+    _, _, headers = make_pharmacist('warm@example.com')
+    assert client.get('/api/pharmacist/dashboard', headers=headers).status_code == 200
+
+    statements.clear()
+    assert client.get('/api/pharmacist/dashboard', headers=headers).status_code == 200
+    assert not [statement for statement, _ in statements if 'FROM users' in statement]
+
+def test_revocation_by_this_worker_is_seen_at_once(app, client, make_pharmacist):
+    user_id, _, headers = make_pharmacist('demoted@example.com')
+    assert client.get('/api/pharmacist/dashboard', headers=headers).status_code == 200
+
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        user.role, user.token_version = 'patient', user.token_version + 1
+        db.session.commit()
+
+    assert client.get('/api/pharmacist/dashboard', headers=headers).status_code == 401
+
+def test_revocation_is_seen_without_the_revoking_worker(app, client, make_pharmacist, monkeypatch):
+    user_id, _, headers = make_pharmacist('revoked@example.com')
+    assert client.get('/api/pharmacist/dashboard', headers=headers).status_code == 200
+
+    # As if another worker process changed the role: no local cache invalidation
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(update(User).where(User.id == user_id).values(token_version=User.token_version + 1))
+
+    # Seen once the cached state is AUTH_STATE_TTL old
+    monkeypatch.setitem(app.config, 'AUTH_STATE_TTL', 0)
+    assert client.get('/api/pharmacist/dashboard', headers=headers).status_code == 401
+
+def test_pharmacy_ownership_change_revokes_tokens(app, client, make_pharmacist):
+    old_owner, pharmacy_id, old_headers = make_pharmacist('seller@example.com')
+    new_owner, _, new_headers = make_pharmacist('buyer@example.com')
+
+    with app.app_context():
+        db.session.get(Pharmacy, pharmacy_id).owner_id = new_owner
+        db.session.commit()
+
+    assert client.get('/api/pharmacist/dashboard', headers=old_headers).status_code == 401
+    assert client.get('/api/pharmacist/dashboard', headers=new_headers).status_code == 401
+
+def test_dashboard_for_a_missing_pharmacy_is_404(app, client, make_pharmacist):
+    user_id, _, _ = make_pharmacist('ghost@example.com')
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        token = create_access_token(identity=user_id, additional_claims={
+            'role': 'pharmacist', 'pharmacy_ids': [999999], 'ver': user.token_version
+        })
+
+    response = client.get('/api/pharmacist/dashboard', headers={'Authorization': 'Bearer ' + token})
+    assert response.status_code == 404
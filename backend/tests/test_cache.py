@@ -0,0 +1,40 @@
+from utils.cache import SQLiteBackend
+
+def test_sqlite_hits_do_not_write(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'))
+    backend.set('medications:1', {'id': 1})
+    conn = backend._conn()
+    writes = conn.total_changes
+
+    for _ in range(50):
+        assert backend.get('medications:1') == {'id': 1}
+    assert conn.total_changes == writes
+
+def test_sqlite_stale_touches_are_batched(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'))
+    backend.TOUCH_BATCH = 3
+    for key in ('a', 'b', 'c'):
+        backend.set(key, key)
+    conn = backend._conn()
+    conn.execute('UPDATE cache_entries SET accessed_at = 0')
+    writes = conn.total_changes
+
+    backend.get('a')
+    backend.get('b')
+    assert conn.total_changes == writes
+    backend.get('c')
+    assert conn.total_changes == writes + 3
+    assert conn.execute('SELECT COUNT(*) FROM cache_entries WHERE accessed_at = 0').fetchone()[0] == 0
+
+def test_sqlite_eviction_sees_queued_touches(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'), max_size=2)
+    for key in ('old', 'newer'):
+        backend.set(key, key)
+    backend._conn().execute("UPDATE cache_entries SET accessed_at = 0 WHERE key = 'old'")
+    backend._conn().execute("UPDATE cache_entries SET accessed_at = 1 WHERE key = 'newer'")
+
+    backend.get('old')  # queued, not written yet
+    backend.set('newest', 'newest')
+    backend.evict()
+    keys = {row[0] for row in backend._conn().execute('SELECT key FROM cache_entries')}
+    assert keys == {'old', 'newest'}
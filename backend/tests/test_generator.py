@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app import create_app
+from config import config
+from data.generator import OPEN_STATUSES, generate_dataset
+from database import db, init_db
+from models import Inventory, Reservation
+from utils.holds import sweep_expired_holds
+
+def test_open_holds_are_taken_off_generated_stock(tmp_path, monkeypatch):
+    # Its own database: the holds below would otherwise be swept by other tests
+    monkeypatch.setattr(config['testing'], 'SQLALCHEMY_DATABASE_URI', 'sqlite:///' + str(tmp_path / 'generated.db'))
+    app = create_app('testing')
+    init_db(app)
+
+    def total_stock():
+        return db.session.query(func.sum(Inventory.stock_quantity)).scalar()
+
+    shelved = {}
+    def progress(table, rows, seconds):
+        if table == 'inventory':
+            shelved['stock'] = total_stock()
+
+    with app.app_context():
+        generate_dataset(pharmacies=5, medications=20, density=0.5, patients=30, reservations=2000, months=1,
+                         advertisements=0, end=datetime.utcnow(), progress=progress)
+        held = db.session.query(func.sum(Reservation.quantity)).filter(Reservation.status.in_(OPEN_STATUSES)).scalar()
+        assert held
+        assert total_stock() == shelved['stock'] - held
+        assert db.session.query(func.min(Inventory.stock_quantity)).scalar() >= 0
+
+        # Expiring every hold puts back exactly what was taken
+        sweep_expired_holds({status: timedelta(0) for status in OPEN_STATUSES})
+        assert total_stock() == shelved['stock']
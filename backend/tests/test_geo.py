@@ -0,0 +1,45 @@
+import random
+import pytest
+from utils.geo import GridIndex, calculate_distance, distances_from, nearest_k
+
+# (lat, lng) origins: Nairobi, both sides of the antimeridian, near each pole
+ORIGINS = [(-1.2864, 36.8172), (0.5, 179.95), (-16.5, -179.9), (89.7, 10.0), (-89.8, -120.0)]
+
+def points_around(origin, count=400, spread=3.0, seed=7):
+    # Random points near origin, wrapped back into valid coordinates
+    rng = random.Random(seed)
+    lat0, lng0 = origin
+    points = []
+    for i in range(count):
+        lat = max(-90.0, min(90.0, lat0 + rng.uniform(-spread, spread)))
+        lng = (lng0 + rng.uniform(-spread, spread) + 180) % 360 - 180
+        points.append((i, lat, lng))
+    return points
+
+@pytest.mark.parametrize('origin', ORIGINS)
+def test_vectorized_distances_match_the_scalar_formula(origin):
+    points = points_around(origin)
+    lats = [lat for _, lat, _ in points]
+    lngs = [lng for _, _, lng in points]
+
+    assert distances_from(*origin, lats, lngs).tolist() == [calculate_distance(*origin, lat, lng) for lat, lng in zip(lats, lngs)]
+
+@pytest.mark.parametrize('origin', ORIGINS)
+@pytest.mark.parametrize('radius_km', [25, 100, 400])
+def test_grid_within_matches_a_full_scan(origin, radius_km):
+    points = points_around(origin)
+    expected = sorted(
+        ((calculate_distance(*origin, lat, lng), id) for id, lat, lng in points
+         if calculate_distance(*origin, lat, lng) <= radius_km)
+    )
+
+    found = GridIndex(cell_size=0.1).build(points).within(*origin, radius_km)
+    assert sorted((distance, id) for id, distance in found) == expected
+    assert [distance for _, distance in found] == [distance for distance, _ in expected]
+
+def test_nearest_k_is_the_sorted_prefix():
+    distances = distances_from(*ORIGINS[0], *zip(*[(lat, lng) for _, lat, lng in points_around(ORIGINS[0])]))
+    full = nearest_k(distances, None)
+
+    for k in (0, 1, 5, 50, len(distances) + 1):
+        assert distances[nearest_k(distances, k)].tolist() == distances[full][:k].tolist()
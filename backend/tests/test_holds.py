@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+from database import db
+from models import Inventory, Reservation, User
+from utils.holds import sweep_expired_holds
+
+def test_sweep_returns_stock_and_skips_undated_holds(app):
+    with app.app_context():
+        patient = User.query.filter_by(role='patient').order_by(User.id).first()
+        inventory = Inventory.query.order_by(Inventory.id).first()
+        stock = inventory.stock_quantity
+        old = datetime.utcnow() - timedelta(days=30)
+        holds = [
+            Reservation(user_id=patient.id, pharmacy_id=inventory.pharmacy_id, medication_id=inventory.medication_id,
+                        quantity=2, status='pending', created_at=old),
+            Reservation(user_id=patient.id, pharmacy_id=inventory.pharmacy_id, medication_id=inventory.medication_id,
+                        quantity=3, status='pending'),
+        ]
+        db.session.add_all(holds)
+        db.session.commit()
+        db.session.execute(db.update(Reservation).where(Reservation.id == holds[1].id).values(created_at=None))
+        db.session.commit()
+
+        released, units, _ = sweep_expired_holds({'pending': timedelta(hours=24)})
+
+        assert (released, units) == (1, 2)
+        assert db.session.get(Inventory, inventory.id).stock_quantity == stock + 2
+        assert [db.session.get(Reservation, hold.id).status for hold in holds] == ['expired', 'pending']
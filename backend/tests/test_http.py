@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from database import db
+from models import Inventory, Medication, Pharmacy, Reservation, User
+
+def revalidate(client, url, headers, response):
+    return client.get(url, headers={**headers, 'If-None-Match': response.headers['ETag']})
+
+def test_empty_pharmacies_do_not_share_tags(client, make_pharmacist):
+    _, _, first = make_pharmacist('empty-one@example.com')
+    _, _, second = make_pharmacist('empty-two@example.com')
+
+    response = client.get('/api/pharmacist/inventory', headers=first)
+    assert response.status_code == 200
+    assert revalidate(client, '/api/pharmacist/inventory', second, response).status_code == 200
+
+def test_dashboard_tag_covers_pharmacy_and_medications(app, client, make_pharmacist):
+    _, pharmacy_id, headers = make_pharmacist('tagged@example.com')
+    with app.app_context():
+        medication = Medication(name='Tagmycin 5mg Tablets', generic_name='Tagmycin', category='Test')
+        db.session.add(medication)
+        db.session.commit()
+        medication_id = medication.id
+    response = client.post('/api/pharmacist/inventory', headers=headers,
+                           json={'medication_id': medication_id, 'stock_quantity': 2, 'price': 50})
+    assert response.status_code in (200, 201)
+
+    response = client.get('/api/pharmacist/dashboard', headers=headers)
+    assert revalidate(client, '/api/pharmacist/dashboard', headers, response).status_code == 304
+
+    with app.app_context():
+        db.session.get(Pharmacy, pharmacy_id).phone = '+254711000000'
+        db.session.commit()
+    response = revalidate(client, '/api/pharmacist/dashboard', headers, response)
+    assert response.status_code == 200
+    assert response.json['pharmacy']['phone'] == '+254711000000'
+
+    with app.app_context():
+        db.session.get(Medication, medication_id).description = 'Changed'
+        db.session.commit()
+    response = revalidate(client, '/api/pharmacist/dashboard', headers, response)
+    assert response.status_code == 200
+    assert response.json['low_stock_items'][0]['medication']['description'] == 'Changed'
+
+def test_last_modified_waits_for_its_second_to_end(app, client, make_pharmacist):
+    _, pharmacy_id, headers = make_pharmacist('seconds@example.com')
+    with app.app_context():
+        medication = Medication(name='Secondol 10mg Tablets', generic_name='Secondol', category='Test')
+        db.session.add(medication)
+        db.session.commit()
+        medication_id = medication.id
+    client.post('/api/pharmacist/inventory', headers=headers,
+                json={'medication_id': medication_id, 'stock_quantity': 20, 'price': 10})
+    assert 'Last-Modified' not in client.get('/api/pharmacist/inventory', headers=headers).headers
+
+    with app.app_context():
+        earlier = datetime.utcnow() - timedelta(minutes=5)
+        db.session.execute(db.update(Inventory).where(Inventory.pharmacy_id == pharmacy_id).values(updated_at=earlier))
+        db.session.execute(db.update(Medication).where(Medication.id == medication_id).values(updated_at=earlier))
+        db.session.commit()
+    response = client.get('/api/pharmacist/inventory', headers=headers)
+    assert 'Last-Modified' in response.headers
+    response = client.get('/api/pharmacist/inventory', headers={
+        **headers, 'If-Modified-Since': response.headers['Last-Modified']
+    })
+    assert response.status_code == 304
+
+def make_reservations(app, pharmacy_id, statuses):
+    with app.app_context():
+        patient = User.query.filter_by(role='patient').order_by(User.id).first()
+        medication = Medication.query.order_by(Medication.id).first()
+        reservations = [
+            Reservation(user_id=patient.id, pharmacy_id=pharmacy_id, medication_id=medication.id,
+                        quantity=1, unit_price=100, status=status,
+                        created_at=datetime.utcnow() - timedelta(minutes=len(statuses) - i))
+            for i, status in enumerate(statuses)
+        ]
+        db.session.add_all(reservations)
+        db.session.commit()
+        return [reservation.id for reservation in reservations]
+
+def test_dashboard_revalidation_skips_the_body_queries(app, client, make_pharmacist, statements):
+    _, pharmacy_id, headers = make_pharmacist('revalidated@example.com')
+    make_reservations(app, pharmacy_id, ['completed', 'cancelled', 'expired'] * 10 + ['pending'] * 3)
+    response = client.get('/api/pharmacist/dashboard', headers=headers)
+    assert 'Last-Modified' not in response.headers
+
+    statements.clear()
+    assert revalidate(client, '/api/pharmacist/dashboard', headers, response).status_code == 304
+
+    # No reservation or inventory rows are loaded, and the validator only
+    # reads reservations through the status index (or by id from there)
+    assert not [statement for statement, _ in statements if 'stock_quantity <' in statement]
+    assert not [statement for statement, _ in statements if 'reservations.customer_name' in statement]
+    with app.app_context():
+        conn = db.session.connection()
+        for statement, parameters in list(statements):
+            for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+                if row[-1].split(' ')[1:2] == ['reservations']:
+                    assert ('ix_reservations_pharmacy_status_created_at (pharmacy_id=? AND status=?' in row[-1]
+                            or 'INTEGER PRIMARY KEY' in row[-1]), row[-1]
+
+def test_dashboard_tag_follows_its_stats_and_recent_rows(app, client, make_pharmacist):
+    _, pharmacy_id, headers = make_pharmacist('stats@example.com')
+    first, *_ = make_reservations(app, pharmacy_id, ['pending'] + ['completed'] * 6)
+    response = client.get('/api/pharmacist/dashboard', headers=headers)
+    assert response.json['stats']['pending_reservations'] == 1
+    assert first not in [reservation['id'] for reservation in response.json['recent_reservations']]
+
+    # The pending hold is older than the five rows shown, only the count moves
+    with app.app_context():
+        db.session.get(Reservation, first).status = 'cancelled'
+        db.session.commit()
+    response = revalidate(client, '/api/pharmacist/dashboard', headers, response)
+    assert response.status_code == 200
+    assert response.json['stats']['pending_reservations'] == 0
+    assert [reservation['status'] for reservation in response.json['recent_reservations']] == ['completed'] * 5
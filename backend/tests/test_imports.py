@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+from database import db
+from models import Inventory, Medication
+import utils.imports as imports
+
+def upload(client, headers, body, **params):
+    return client.post('/api/pharmacist/inventory/import', query_string=dict(params, format='ndjson'),
+                       data=body, headers=headers, content_type='application/x-ndjson')
+
+def stock(app, pharmacy_id):
+    with app.app_context():
+        return {medication_id: (quantity, price) for medication_id, quantity, price in db.session.query(
+            Inventory.medication_id, Inventory.stock_quantity, Inventory.price
+        ).filter_by(pharmacy_id=pharmacy_id)}
+
+@pytest.fixture
+def medication_ids(app):
+    with app.app_context():
+        return [id for (id,) in db.session.query(Medication.id).order_by(Medication.id).limit(3)]
+
+def test_new_sku_needs_a_price(app, client, make_pharmacist, medication_ids):
+    _, pharmacy_id, headers = make_pharmacist('noprice@example.com')
+    first, second, _ = medication_ids
+    body = f'{{"medication_id": {first}, "stock_quantity": 5}}\n{{"medication_id": {second}, "stock_quantity": 5, "price": 3}}\n'
+
+    report = upload(client, headers, body).json['report']
+    assert (report['inserted'], report['failed']) == (1, 1)
+    assert report['errors'] == [{'row': 1, 'message': 'price is required for medications not yet in inventory'}]
+    assert stock(app, pharmacy_id) == {second: (5, 3.0)}
+
+    # Once stocked, stock-only rows update it and keep the price
+    report = upload(client, headers, f'{{"medication_id": {second}, "stock_quantity": 2}}\n', mode='add').json['report']
+    assert (report['updated'], report['failed']) == (1, 0)
+    assert stock(app, pharmacy_id) == {second: (7, 3.0)}
+
+def test_rows_inserted_concurrently_are_updated(app, client, make_pharmacist, medication_ids, monkeypatch):
+    _, pharmacy_id, headers = make_pharmacist('race@example.com')
+    first = medication_ids[0]
+    upload(client, headers, f'{{"medication_id": {first}, "stock_quantity": 4, "price": 2}}\n')
+
+    # As if another import inserted the SKU after this one checked for it
+    monkeypatch.setattr(imports, '_stocked', lambda pharmacy_id, medication_ids: set())
+    response = upload(client, headers, f'{{"medication_id": {first}, "stock_quantity": 6, "price": 2.5}}\n', mode='add')
+    assert response.status_code == 200
+    assert stock(app, pharmacy_id) == {first: (10, 2.5)}
+
+def test_failed_chunk_returns_the_partial_report(app, client, make_pharmacist, medication_ids, monkeypatch):
+    _, pharmacy_id, headers = make_pharmacist('partial@example.com')
+    monkeypatch.setitem(app.config, 'INVENTORY_IMPORT_CHUNK_SIZE', 1)
+    write_chunk = imports._write_chunk
+
+    def failing(pharmacy_id, chunk, *args):
+        if chunk[0][0] == 2:
+            raise OperationalError('INSERT', {}, Exception('database is locked'))
+        write_chunk(pharmacy_id, chunk, *args)
+    monkeypatch.setattr(imports, '_write_chunk', failing)
+
+    body = ''.join(f'{{"medication_id": {id}, "stock_quantity": 1, "price": 1}}\n' for id in medication_ids)
+    response = upload(client, headers, body)
+    assert response.status_code == 500
+    report = response.json['report']
+    assert report['inserted'] == 1
+    assert report['aborted'] == {'row': 2, 'message': 'database is locked'}
+    assert stock(app, pharmacy_id) == {medication_ids[0]: (1, 1.0)}
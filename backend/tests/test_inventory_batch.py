@@ -0,0 +1,86 @@
+import pytest
+from itertools import count
+from database import db
+from models import Inventory, Medication
+
+_shelves = count()
+
+@pytest.fixture
+def shelves(app, make_pharmacist):
+    # Two pharmacies with two stocked medications each: (headers, own
+    # inventory ids, medication ids, the other pharmacy's inventory ids)
+    def stock(email):
+        _, pharmacy_id, headers = make_pharmacist(email)
+        with app.app_context():
+            medications = [Medication(name=f'{email} batchol {i}', category='Test') for i in range(2)]
+            db.session.add_all(medications)
+            db.session.commit()
+            rows = [Inventory(pharmacy_id=pharmacy_id, medication_id=medication.id, stock_quantity=10, price=100)
+                    for medication in medications]
+            db.session.add_all(rows)
+            db.session.commit()
+            return headers, [row.id for row in rows], [medication.id for medication in medications]
+
+    n = next(_shelves)
+    headers, own, medication_ids = stock(f'batch-own-{n}@example.com')
+    _, other, _ = stock(f'batch-other-{n}@example.com')
+    return headers, own, medication_ids, other
+
+def batch(client, headers, body):
+    return client.put('/api/pharmacist/inventory/batch', headers=headers, json=body)
+
+def levels(app, ids):
+    with app.app_context():
+        rows = Inventory.query.filter(Inventory.id.in_(ids)).order_by(Inventory.id).all()
+        return [(row.stock_quantity, row.price) for row in rows]
+
+def test_batch_applies_every_operation(app, client, shelves):
+    headers, own, medication_ids, _ = shelves
+    response = batch(client, headers, {'items': [
+        {'inventory_id': own[0], 'stock_quantity': 4, 'price': 120},
+        {'medication_id': medication_ids[1], 'stock_delta': -3},
+    ]})
+
+    assert response.status_code == 200
+    assert [(item['id'], item['stock_quantity'], item['price']) for item in response.json['items']] == [
+        (own[0], 4, 120), (own[1], 7, 100)
+    ]
+    assert all(item['updated_at'] for item in response.json['items'])
+
+@pytest.mark.parametrize('body', ['[{"inventory_id": 1, "stock_quantity": 1}]', '"items"', '{not json', ''])
+def test_non_object_bodies_are_400(client, shelves, body):
+    response = client.put('/api/pharmacist/inventory/batch', headers=shelves[0], data=body,
+                          content_type='application/json')
+    assert response.status_code == 400
+
+def test_other_pharmacies_rows_are_not_found(app, client, shelves):
+    headers, own, _, other = shelves
+    response = batch(client, headers, {'items': [
+        {'inventory_id': own[0], 'stock_quantity': 1},
+        {'inventory_id': other[0], 'stock_quantity': 1},
+    ]})
+
+    assert response.status_code == 400
+    assert response.json['errors'] == [{'index': 1, 'message': 'Inventory item not found'}]
+    assert levels(app, own + other) == [(10, 100)] * 4
+
+def test_negative_stock_is_rejected(app, client, shelves):
+    headers, own, _, _ = shelves
+    response = batch(client, headers, {'items': [
+        {'inventory_id': own[0], 'stock_quantity': 5},
+        {'inventory_id': own[1], 'stock_quantity': -1},
+    ]})
+
+    assert response.status_code == 400
+    assert response.json['errors'][0]['index'] == 1
+    assert levels(app, own) == [(10, 100)] * 2
+
+def test_overdrawn_delta_applies_nothing(app, client, shelves):
+    headers, own, _, _ = shelves
+    response = batch(client, headers, {'items': [
+        {'inventory_id': own[0], 'stock_quantity': 2, 'price': 90},
+        {'inventory_id': own[1], 'stock_delta': -11},
+    ]})
+
+    assert response.status_code == 409
+    assert levels(app, own) == [(10, 100)] * 2
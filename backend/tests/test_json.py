@@ -0,0 +1,123 @@
+import gzip
+import json
+from datetime import datetime
+import pytest
+from flask import jsonify
+from flask.json.provider import DefaultJSONProvider
+from database import db
+from models import Advertisement, Float, Inventory, Medication, Pharmacy, Reservation, Subscription, User
+from utils import fastjson, serializers
+from utils.serializers import Serializer
+from utils.fastjson import exact_float
+from utils.helpers import paginate
+
+@pytest.mark.parametrize('value', [
+    {'b': [1, 2.5, None, True], 'a': 'text', 'c': {'z': -1, 'y': 2 ** 40}},
+    [0.1, 1e15, 12345.678, -0.0],
+    ['café', {'é': 1}],
+])
+@pytest.mark.parametrize('kwargs', [{'separators': (',', ':')}, {'indent': 2}])
+def test_provider_matches_stdlib(app, value, kwargs):
+    assert app.json.dumps(value, **kwargs) == DefaultJSONProvider(app).dumps(value, **kwargs)
+
+@pytest.mark.parametrize('kwargs', [{'separators': (',', ':')}, {'indent': 2}])
+def test_provider_spells_floats_like_stdlib(app, kwargs):
+    for floats in ([1e16, 1e-7], [-1e22, 5e-324, 1.5e-5], [float('nan'), float('inf'), float('-inf')]):
+        value = {'floats': [exact_float(f) for f in floats] + [0.5, 1e15], 'text': 'code 1e5'}
+        assert app.json.dumps(value, **kwargs) == DefaultJSONProvider(app).dumps(value, **kwargs)
+
+def test_float_columns_keep_stdlib_bytes(app, client, make_pharmacist):
+    _, pharmacy_id, pharmacist = make_pharmacist('floats@example.com')
+    prices = [1e16, 1e-7, 2.5e-5, float('inf'), float('-inf'), 12.5]
+    with app.app_context():
+        medications = [Medication(name=f'Floatol {i}', category='Test') for i in range(len(prices))]
+        db.session.add_all(medications)
+        db.session.flush()
+        db.session.add_all([
+            Inventory(pharmacy_id=pharmacy_id, medication_id=medication.id, stock_quantity=1, price=price)
+            for medication, price in zip(medications, prices)
+        ])
+        db.session.commit()
+
+    response = client.get('/api/pharmacist/inventory', headers=pharmacist, query_string={'per_page': 20})
+    assert response.status_code == 200
+    body = response.get_data()
+    with app.test_request_context():
+        query = Inventory.query.filter_by(pharmacy_id=pharmacy_id).order_by(Inventory.updated_at.desc())
+        expected = DefaultJSONProvider(app).response(paginate(query, 1, 20)).get_data()
+    assert body == expected
+    assert b'Infinity' in body and b'1e+16' in body and b'1e-07' in body
+
+    # SQLite stores NaN as NULL, so NaN is checked on what the column type returns
+    nan = Float().process_result_value(float('nan'), None)
+    assert app.json.dumps({'price': nan}, separators=(',', ':')) == '{"price":NaN}'
+
+def test_exact_float_marks_what_orjson_spells_differently():
+    for value in (1e16, -1e-7, 9.99e-5, float('nan'), float('inf'), 5e-324):
+        assert type(exact_float(value)) is fastjson.StdlibFloat
+    for value in (None, 0.0, -0.0, 1e-4, 12.5, 9999999999999998.0):
+        assert type(exact_float(value)) is type(value)
+
+def test_provider_falls_back_to_stdlib_without_orjson(app, monkeypatch):
+    monkeypatch.setattr(fastjson, 'orjson', None)
+    value = {'b': [1, 2.5, float('nan')], 'a': 'café'}
+    for kwargs in ({'separators': (',', ':')}, {'indent': 2}):
+        assert app.json.dumps(value, **kwargs) == DefaultJSONProvider(app).dumps(value, **kwargs)
+
+@pytest.fixture(scope='module')
+def unseeded_rows(app):
+    # Reservations, subscriptions and adverts aren't seeded
+    with app.app_context():
+        pharmacy = Pharmacy.query.order_by(Pharmacy.id).first()
+        item = Inventory.query.filter_by(pharmacy_id=pharmacy.id).first()
+        patient = User.query.filter_by(role='patient').first()
+        db.session.add_all([
+            Reservation(user_id=patient.id, pharmacy_id=pharmacy.id, medication_id=item.medication_id,
+                        quantity=2, unit_price=item.price, customer_name='Jane'),
+            Subscription(pharmacy_id=pharmacy.id, plan_type='monthly', amount=2500.0,
+                         start_date=datetime(2024, 1, 1), end_date=datetime(2024, 2, 1)),
+            Subscription(pharmacy_id=pharmacy.id, plan_type='annual', amount=25000.0),
+            Advertisement(title='Flu season', content='Get vaccinated', budget=1e-7, advertiser_name='Clinic')
+        ])
+        db.session.commit()
+
+@pytest.mark.parametrize('serializer', [
+    serializers.users, serializers.pharmacies, Serializer(Medication), serializers.inventory_items,
+    serializers.reservations, serializers.subscriptions, serializers.advertisements
+], ids=lambda serializer: serializer.model.__name__)
+def test_serializer_dump_matches_to_dict(app, unseeded_rows, serializer):
+    assert set(serializers.FIELDS) == {User, Pharmacy, Medication, Inventory, Reservation, Subscription, Advertisement}
+    model = serializer.model
+    with app.test_request_context():
+        query = model.query.filter(model.created_at.isnot(None)) if hasattr(model, 'created_at') else model.query
+        rows = serializer.prepare(query).limit(20).all()
+        assert rows
+        for row in rows:
+            # Same fields in the same order, with relations loaded or not
+            assert list(serializer.dump_one(row).items()) == list(row.to_dict().items())
+        db.session.expunge_all()
+        row = query.first()
+        assert list(serializer.dump_row(row).items()) == list(row.to_dict().items())
+
+def test_list_pages_are_streamed_as_jsonify_bytes(app, client, headers, monkeypatch):
+    monkeypatch.setitem(app.config, 'STREAM_BATCH_SIZE', 2)
+    response = client.get('/api/admin/pharmacies', headers=headers['admin'], query_string={'per_page': 60})
+    assert response.status_code == 200
+    assert response.is_streamed
+    body = response.get_data()
+    with app.test_request_context():
+        result = paginate(Pharmacy.query.order_by(Pharmacy.created_at.desc()), 1, 60, serializer=serializers.pharmacies)
+        assert body == jsonify(result).get_data()
+
+def test_list_pages_stream_compressed(client, headers):
+    response = client.get('/api/admin/pharmacies', headers={**headers['admin'], 'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.get_data()))['items']
+
+def test_stream_errors_before_headers_become_500(client, headers, monkeypatch):
+    def broken(row):
+        raise RuntimeError('broken row')
+    monkeypatch.setattr(serializers.pharmacies, 'dump_row', broken)
+    response = client.get('/api/admin/pharmacies', headers=headers['admin'])
+    assert response.status_code == 500
+    assert response.json == {'message': 'broken row'}
@@ -0,0 +1,19 @@
+def test_metrics_need_a_token_outside_debug_and_testing(app, client, monkeypatch):
+    assert client.get('/api/metrics').status_code == 200
+
+    monkeypatch.setitem(app.config, 'TESTING', False)
+    assert client.get('/api/metrics').status_code == 404
+
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'scrape-secret')
+    assert client.get('/api/metrics').status_code == 401
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/api/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    assert b'# TYPE' in response.data
+
+def test_server_timing_only_when_configured(app, client, headers, monkeypatch):
+    assert 'Server-Timing' not in client.get('/api/patient/reservations', headers=headers['patient']).headers
+
+    monkeypatch.setitem(app.config, 'SERVER_TIMING', True)
+    response = client.get('/api/patient/reservations', headers=headers['patient'])
+    assert 'queries' in response.headers['Server-Timing']
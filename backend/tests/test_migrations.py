@@ -0,0 +1,87 @@
+from sqlalchemy import create_engine, inspect, text
+from migrations import MIGRATIONS, current_version, upgrade
+
+# The tables as the first release created them
+INITIAL_SCHEMA = [
+    'CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(128) NOT NULL, '
+    'role VARCHAR(20) NOT NULL, name VARCHAR(100) NOT NULL, phone VARCHAR(20), created_at DATETIME)',
+    'CREATE TABLE pharmacies (id INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, address TEXT NOT NULL, latitude FLOAT, '
+    'longitude FLOAT, phone VARCHAR(20), owner_id INTEGER, subscription_status VARCHAR(20), created_at DATETIME)',
+    'CREATE TABLE medications (id INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, category VARCHAR(100), '
+    'description TEXT, generic_name VARCHAR(200), created_at DATETIME)',
+    'CREATE TABLE inventory (id INTEGER PRIMARY KEY, pharmacy_id INTEGER NOT NULL, medication_id INTEGER NOT NULL, '
+    'stock_quantity INTEGER, price FLOAT, updated_at DATETIME)',
+    'CREATE TABLE reservations (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, pharmacy_id INTEGER NOT NULL, '
+    'medication_id INTEGER NOT NULL, quantity INTEGER, status VARCHAR(20), customer_name VARCHAR(100), '
+    'customer_phone VARCHAR(20), notes TEXT, created_at DATETIME)',
+    'CREATE TABLE subscriptions (id INTEGER PRIMARY KEY, pharmacy_id INTEGER NOT NULL, plan_type VARCHAR(20), amount FLOAT, '
+    'start_date DATETIME, end_date DATETIME, status VARCHAR(20))',
+]
+
+def initial_database(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'initial.db'))
+    with engine.begin() as conn:
+        for ddl in INITIAL_SCHEMA:
+            conn.execute(text(ddl))
+        conn.execute(text("INSERT INTO users (id, email, password_hash, role, name) VALUES (1, 'a@b.c', 'x', 'patient', 'A')"))
+        conn.execute(text(
+            "INSERT INTO pharmacies (id, name, address, owner_id, created_at) VALUES (1, 'P', 'Nairobi', 1, '2024-01-01 00:00:00')"
+        ))
+        conn.execute(text("INSERT INTO inventory (id, pharmacy_id, medication_id, stock_quantity) VALUES (1, 1, 1, 3), (2, 1, 1, 4)"))
+        conn.execute(text(
+            "INSERT INTO reservations (id, user_id, pharmacy_id, medication_id, status, created_at) "
+            "VALUES (1, 1, 1, 1, 'pending', '2024-01-02 03:04:05')"
+        ))
+    return engine
+
+def test_upgrade_from_initial_schema(tmp_path):
+    engine = initial_database(tmp_path)
+    applied = upgrade(engine)
+    assert [version for version, _ in applied] == sorted(version for version, _, _ in MIGRATIONS)
+
+    inspector = inspect(engine)
+    columns = {table: {column['name'] for column in inspector.get_columns(table)} for table in inspector.get_table_names()}
+    assert 'token_version' in columns['users']
+    assert {'unit_price', 'updated_at'} <= columns['reservations']
+    assert 'created_at' in columns['subscriptions']
+    assert 'updated_at' in columns['pharmacies'] and 'updated_at' in columns['medications']
+    assert 'ix_inventory_pharmacy_medication' in {index['name'] for index in inspector.get_indexes('inventory')}
+
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT token_version FROM users')).scalar() == 0
+        assert conn.execute(text('SELECT id, stock_quantity FROM inventory')).all() == [(1, 7)]
+        assert conn.execute(text('SELECT updated_at FROM reservations')).scalar() == '2024-01-02 03:04:05'
+        assert conn.execute(text('SELECT updated_at FROM pharmacies')).scalar() == '2024-01-01 00:00:00'
+        assert current_version(conn) == max(version for version, _, _ in MIGRATIONS)
+
+def test_upgrade_is_a_no_op_when_current(tmp_path):
+    engine = initial_database(tmp_path)
+    upgrade(engine)
+    assert upgrade(engine) == []
+
+def test_upgrade_adds_dashboard_totals_to_an_existing_rollup(tmp_path):
+    engine = initial_database(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE daily_stats (id INTEGER PRIMARY KEY, day DATE NOT NULL, metric VARCHAR(50) NOT NULL, '
+            'key VARCHAR(50) NOT NULL, value FLOAT NOT NULL, UNIQUE (day, metric, key))'
+        ))
+        conn.execute(text("INSERT INTO daily_stats (day, metric, key, value) VALUES ('2024-01-01', 'registrations', '', 1)"))
+        conn.execute(text(
+            "INSERT INTO subscriptions (pharmacy_id, amount, start_date, status) VALUES "
+            "(1, 100, '2024-01-05 00:00:00', 'active'), (1, 50, '2024-01-05 00:00:00', 'expired')"
+        ))
+    upgrade(engine)
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT day, metric, key, value FROM daily_stats WHERE metric != 'registrations' ORDER BY metric, key"
+        )).all()
+    assert rows == [
+        ('2024-01-01', 'pharmacies', '', 1),
+        ('2024-01-05', 'subscription_amount', 'active', 100),
+        ('2024-01-05', 'subscription_amount', 'expired', 50),
+        ('2024-01-05', 'subscriptions', 'active', 1),
+        ('2024-01-05', 'subscriptions', 'expired', 1),
+    ]
+    assert 'ix_reservations_created_at' in {index['name'] for index in inspect(engine).get_indexes('reservations')}
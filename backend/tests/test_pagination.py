@@ -0,0 +1,59 @@
+import pytest
+from datetime import datetime
+from database import db
+from models import User
+
+TIED_AT = datetime(2024, 5, 1, 12, 0, 0)
+
+@pytest.fixture(scope='module')
+def tied_users(app):
+    # Seven users sharing one created_at, so only the id orders them
+    with app.app_context():
+        users = [User(email=f'tied-{i}@example.com', role='patient', name=f'Tied {i}', password_hash='x',
+                      created_at=TIED_AT) for i in range(7)]
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.id for user in users]
+
+def users_page(client, headers, **args):
+    return client.get('/api/admin/users', headers=headers['admin'], query_string={'search': 'tied-', **args})
+
+def test_cursor_walks_tied_rows_without_gaps_or_repeats(client, headers, tied_users):
+    seen, after = [], ''
+    while after is not None:
+        response = users_page(client, headers, per_page=3, after=after)
+        assert response.status_code == 200
+        assert len(response.json['items']) <= 3
+        seen += [user['id'] for user in response.json['items']]
+        after = response.json['next_cursor']
+        assert response.json['has_more'] == (after is not None)
+
+    assert seen == sorted(tied_users, reverse=True)
+
+def test_cursor_mode_totals_are_opt_in(client, headers, tied_users):
+    response = users_page(client, headers, per_page=3, after='')
+    assert 'total' not in response.json
+    response = users_page(client, headers, per_page=3, after='', include_total='1')
+    assert response.json['total'] == len(tied_users)
+
+@pytest.mark.parametrize('after', ['not-a-cursor', 'W10', 'WyJ4Il0'])  # garbage, [], ["x"]
+def test_bad_cursor_is_400(client, headers, tied_users, after):
+    response = users_page(client, headers, after=after)
+    assert response.status_code == 400
+    assert response.json['message'] == 'Invalid pagination cursor'
+
+@pytest.mark.parametrize('after', [None, ''])
+def test_per_page_is_clamped(app, client, headers, tied_users, monkeypatch, after):
+    monkeypatch.setitem(app.config, 'MAX_PER_PAGE', 4)
+    args = {'per_page': 100000} if after is None else {'per_page': 100000, 'after': after}
+
+    response = users_page(client, headers, **args)
+    assert response.status_code == 200
+    assert response.json['per_page'] == 4
+    assert len(response.json['items']) == 4
+
+def test_page_mode_still_counts(client, headers, tied_users):
+    response = users_page(client, headers, page=2, per_page=5)
+    assert response.status_code == 200
+    assert (response.json['page'], response.json['total'], response.json['pages']) == (2, 7, 2)
+    assert len(response.json['items']) == 2
@@ -0,0 +1,18 @@
+from utils.passwords import PasswordHasher, _verify
+
+def test_pool_timeout_is_a_503(app, client, monkeypatch):
+    hasher = PasswordHasher(rounds=4, workers=1, max_queue=1, timeout=0.001)
+    monkeypatch.setitem(app.extensions, 'password_hasher', hasher)
+    try:
+        # Starting the worker alone takes longer than the timeout
+        response = client.post('/api/auth/login', json={'email': 'patient@example.com', 'password': 'password'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+    finally:
+        hasher.shutdown()
+
+def test_hashing_outside_a_request_stays_inline(app):
+    hasher = PasswordHasher(rounds=4, workers=1, max_queue=1)
+    with app.app_context():
+        assert _verify(hasher.hash('secret'), b'secret')
+    assert hasher.pool is None
@@ -0,0 +1,82 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from database import db
+from models import Inventory, User
+
+# (token, method, url, body, table, index the main query must use)
+CHECKS = [
+    ('patient', 'GET', '/api/patient/pharmacies/search?medication=panadol', None,
+     'inventory', 'ix_inventory_medication_stock'),
+    ('patient', 'GET', '/api/patient/reservations', None,
+     'reservations', 'ix_reservations_user_created_at'),
+    ('patient', 'POST', '/api/patient/reservations', 'reservation',
+     'inventory', 'ix_inventory_pharmacy_medication'),
+    ('pharmacist', 'GET', '/api/pharmacist/inventory', None,
+     'inventory', 'ix_inventory_pharmacy_medication'),
+    ('pharmacist', 'GET', '/api/pharmacist/reservations?status=pending', None,
+     'reservations', 'ix_reservations_pharmacy_status_created_at'),
+    ('pharmacist', 'GET', '/api/pharmacist/dashboard', None,
+     'reservations', 'ix_reservations_pharmacy_status_created_at'),
+    ('legacy_pharmacist', 'GET', '/api/pharmacist/inventory', None,
+     'pharmacies', 'ix_pharmacies_owner_id'),
+    ('admin', 'GET', '/api/admin/users?role=patient', None,
+     'users', 'ix_users_role_created_at'),
+    ('admin', 'GET', '/api/admin/dashboard', None,
+     'reservations', 'ix_reservations_created_at'),
+    ('admin', 'GET', '/api/admin/dashboard', None,
+     'users', 'ix_users_created_at'),
+    ('admin', 'GET', '/api/admin/dashboard', None,
+     'daily_stats', 'ix_daily_stats_metric_key_day'),
+]
+
+def table_plans(conn, statements, table):
+    # EXPLAIN QUERY PLAN lines that read `table`, over every statement
+    lines = []
+    for statement, parameters in statements:
+        if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+            continue
+        for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+            if row[-1].split(' ')[1:2] == [table]:
+                lines.append(row[-1])
+    return lines
+
+@pytest.fixture(scope='module')
+def request_args(app, headers):
+    with app.app_context():
+        # Tokens issued before role claims existed look the pharmacy up by owner
+        pharmacist = User.query.filter_by(role='pharmacist').order_by(User.id).first()
+        legacy = {'Authorization': 'Bearer ' + create_access_token(identity=pharmacist.id)}
+        inventory = Inventory.query.filter(Inventory.stock_quantity > 0).first()
+        bodies = {'reservation': {'pharmacy_id': inventory.pharmacy_id, 'medication_id': inventory.medication_id}}
+    return dict(headers, legacy_pharmacist=legacy), bodies
+
+@pytest.mark.parametrize('token, method, url, body, table, index', CHECKS)
+def test_main_query_uses_index(app, client, statements, request_args, token, method, url, body, table, index):
+    tokens, bodies = request_args
+    response = client.open(url, method=method, json=bodies.get(body), headers=tokens[token])
+    assert response.status_code < 400, response.get_data(as_text=True)
+
+    with app.app_context():
+        lines = table_plans(db.session.connection(), list(statements), table)
+
+    assert f'SCAN {table}' not in lines
+    assert any(index in line for line in lines), lines
+
+def test_dashboard_revenue_reads_only_this_month(app, client, headers, statements):
+    assert client.get('/api/pharmacist/dashboard', headers=headers['pharmacist']).status_code == 200
+
+    # Pending count and revenue come from one statement
+    stats = [(statement, parameters) for statement, parameters in statements if 'reservations.quantity *' in statement]
+    assert len(stats) == 1
+    with app.app_context():
+        lines = table_plans(db.session.connection(), stats, 'reservations')
+    assert any('pharmacy_id=? AND status=? AND created_at>? AND created_at<?' in line for line in lines), lines
+    assert all('ix_reservations_pharmacy_status_created_at (pharmacy_id=? AND status=?' in line for line in lines), lines
+
+def test_inventory_search_joins_medications_once(app, client, headers, statements):
+    response = client.get('/api/pharmacist/inventory?search=a', headers=headers['pharmacist'])
+    assert response.status_code == 200
+    assert all(item['medication'] is not None for item in response.json['items'])
+
+    pages = [statement for statement, _ in statements if 'LIMIT' in statement and 'FROM inventory' in statement]
+    assert pages and all(statement.count('JOIN medications') == 1 for statement in pages), pages
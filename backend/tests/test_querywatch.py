@@ -0,0 +1,26 @@
+import pytest
+from flask import jsonify
+from sqlalchemy import text
+from app import create_app
+from database import db
+from utils.querywatch import NPlusOneError
+
+def test_n_plus_one_fails_the_request_through_a_blanket_except(app):
+    # A second app on the same database, so the view can be added before
+    # it serves anything
+    app = create_app('testing')
+
+    # Shaped like the blueprints' views: any exception becomes a JSON 500
+    @app.route('/n-plus-one')
+    def n_plus_one():
+        try:
+            names = [
+                db.session.execute(text('SELECT name FROM medications WHERE id = :id'), {'id': i}).scalar()
+                for i in range(1, app.config['N_PLUS_ONE_THRESHOLD'] + 3)
+            ]
+            return jsonify(names), 200
+        except Exception as e:
+            return jsonify({'message': str(e)}), 500
+
+    with pytest.raises(NPlusOneError, match='n_plus_one: statement repeated'):
+        app.test_client().get('/n-plus-one')
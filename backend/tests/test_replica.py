@@ -0,0 +1,75 @@
+import sqlite3
+import pytest
+from sqlalchemy import event
+from app import create_app
+from config import TestingConfig, config
+from data.seed_data import seed_data
+from database import db, init_db
+from models import Inventory, User
+from utils.helpers import create_user_token
+
+@pytest.fixture
+def replica_app(tmp_path, monkeypatch):
+    # A primary and a replica SQLite file, with the replica a copy taken
+    # right after seeding
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+
+    class ReplicaConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{primary}'
+        SQLALCHEMY_BINDS = {'replica': f'sqlite:///{replica}'}
+        CACHE_BACKEND = 'sqlite'
+        CACHE_PATH = str(tmp_path / 'cache.db')
+
+    monkeypatch.setitem(config, 'replica', ReplicaConfig)
+    app = create_app('replica')
+    init_db(app)
+    with app.app_context():
+        seed_data()
+
+    source, target = sqlite3.connect(primary), sqlite3.connect(replica)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+    return app
+
+def test_reads_go_to_the_replica_until_the_user_writes(replica_app):
+    app, client = replica_app, replica_app.test_client()
+    used = set()
+    with app.app_context():
+        for key, engine in db.engines.items():
+            event.listen(engine, 'before_cursor_execute', lambda *args, name=key or 'primary': used.add(name))
+        patient = {'Authorization': 'Bearer ' + create_user_token(User.query.filter_by(role='patient').first())}
+        inventory = Inventory.query.filter(Inventory.stock_quantity > 0).first()
+        target = {'pharmacy_id': inventory.pharmacy_id, 'medication_id': inventory.medication_id}
+
+    def call(method, url, **kwargs):
+        used.clear()
+        response = client.open(url, method=method, headers=patient, **kwargs)
+        assert response.status_code < 400, response.get_json()
+        return response, set(used)
+
+    client.get('/api/patient/reservations', headers=patient)  # warm the auth state cache
+    assert call('GET', '/api/patient/medications/search?q=pan')[1] == {'replica'}
+    assert call('GET', '/api/patient/reservations')[1] == {'replica'}
+    assert call('POST', '/api/patient/reservations', json=target)[1] == {'primary'}
+
+    # The writer reads their own reservation from the primary...
+    response, engines = call('GET', '/api/patient/reservations')
+    assert engines == {'primary'} and response.json['total'] == 1
+
+    # ...until the window is over, then the (stale) replica again
+    app.config['READ_YOUR_WRITES_WINDOW'] = 0
+    response, engines = call('GET', '/api/patient/reservations')
+    assert engines == {'replica'} and response.json['total'] == 0
+
+@pytest.mark.parametrize('backend', ['memory', 'null'])
+def test_replica_needs_a_shared_cache(tmp_path, monkeypatch, backend):
+    class ReplicaConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_BINDS = {'replica': f"sqlite:///{tmp_path / 'replica.db'}"}
+        CACHE_BACKEND = backend
+
+    monkeypatch.setitem(config, 'replica', ReplicaConfig)
+    with pytest.raises(RuntimeError, match='CACHE_BACKEND=sqlite'):
+        create_app('replica')
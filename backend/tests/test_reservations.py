@@ -0,0 +1,119 @@
+import pytest
+from itertools import count
+from sqlalchemy import event
+from database import db
+from models import Inventory, Medication, Reservation
+
+_pharmacies = count()
+
+@pytest.fixture
+def stocked(app, make_pharmacist):
+    # A pharmacist's pharmacy stocking one fresh medication:
+    # (pharmacy id, medication id, pharmacist headers)
+    def make(stock=5):
+        _, pharmacy_id, headers = make_pharmacist(f'stocked-{next(_pharmacies)}@example.com')
+        with app.app_context():
+            medication = Medication(name=f'Stockol {pharmacy_id}', generic_name='Stockol', category='Test')
+            db.session.add(medication)
+            db.session.commit()
+            db.session.add(Inventory(pharmacy_id=pharmacy_id, medication_id=medication.id, stock_quantity=stock, price=100))
+            db.session.commit()
+            return pharmacy_id, medication.id, headers
+    return make
+
+def stock(app, pharmacy_id, medication_id):
+    with app.app_context():
+        return Inventory.query.filter_by(pharmacy_id=pharmacy_id, medication_id=medication_id).one().stock_quantity
+
+def reserve(client, headers, pharmacy_id, medication_id, quantity):
+    return client.post('/api/patient/reservations', headers=headers['patient'], json={
+        'pharmacy_id': pharmacy_id, 'medication_id': medication_id, 'quantity': quantity
+    })
+
+def set_status(client, pharmacist, reservation_id, status):
+    return client.put(f'/api/pharmacist/reservations/{reservation_id}', headers=pharmacist, json={'status': status})
+
+def cancel(client, headers, reservation_id):
+    return client.put(f'/api/patient/reservations/{reservation_id}/cancel', headers=headers['patient'])
+
+def test_reservations_never_overdraw_stock(app, client, headers, stocked):
+    pharmacy_id, medication_id, _ = stocked(stock=5)
+
+    assert reserve(client, headers, pharmacy_id, medication_id, 3).status_code == 201
+    response = reserve(client, headers, pharmacy_id, medication_id, 3)
+    assert response.status_code == 409
+    assert stock(app, pharmacy_id, medication_id) == 2
+
+    assert reserve(client, headers, pharmacy_id, medication_id, 2).status_code == 201
+    assert reserve(client, headers, pharmacy_id, medication_id, 1).status_code == 409
+    assert stock(app, pharmacy_id, medication_id) == 0
+
+def test_cancel_restores_stock_exactly_once(app, client, headers, stocked):
+    pharmacy_id, medication_id, pharmacist = stocked(stock=5)
+    first = reserve(client, headers, pharmacy_id, medication_id, 2).json['reservation']['id']
+    second = reserve(client, headers, pharmacy_id, medication_id, 1).json['reservation']['id']
+    assert stock(app, pharmacy_id, medication_id) == 2
+
+    response = cancel(client, headers, first)
+    assert response.status_code == 200
+    assert response.json['reservation']['status'] == 'cancelled'
+    assert stock(app, pharmacy_id, medication_id) == 4
+
+    assert cancel(client, headers, first).status_code == 400
+    assert stock(app, pharmacy_id, medication_id) == 4
+
+    # A completed pickup has taken its stock for good
+    assert set_status(client, pharmacist, second, 'completed').status_code == 200
+    assert cancel(client, headers, second).status_code == 400
+    assert stock(app, pharmacy_id, medication_id) == 4
+
+def test_cancel_losing_a_race_returns_no_stock(app, client, headers, stocked):
+    pharmacy_id, medication_id, _ = stocked(stock=5)
+    reservation_id = reserve(client, headers, pharmacy_id, medication_id, 2).json['reservation']['id']
+
+    # The pickup lands between the cancel's read and its conditional UPDATE
+    def pickup(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE reservations SET status'):
+            cursor.execute("UPDATE reservations SET status = 'completed' WHERE id = ?", (reservation_id,))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', pickup)
+    try:
+        assert cancel(client, headers, reservation_id).status_code == 409
+    finally:
+        event.remove(engine, 'before_cursor_execute', pickup)
+    assert stock(app, pharmacy_id, medication_id) == 3
+
+def test_pharmacist_cancel_returns_the_stock_once(app, client, headers, stocked):
+    pharmacy_id, medication_id, pharmacist = stocked()
+    reservation_id = reserve(client, headers, pharmacy_id, medication_id, 2).json['reservation']['id']
+    assert stock(app, pharmacy_id, medication_id) == 3
+
+    assert set_status(client, pharmacist, reservation_id, 'confirmed').status_code == 200
+    response = set_status(client, pharmacist, reservation_id, 'cancelled')
+    assert response.status_code == 200
+    assert response.json['reservation']['status'] == 'cancelled'
+    assert stock(app, pharmacy_id, medication_id) == 5
+
+    # Final statuses can't be reopened, or the returned stock would count twice
+    for status in ('pending', 'confirmed', 'cancelled'):
+        assert set_status(client, pharmacist, reservation_id, status).status_code == 409
+    assert stock(app, pharmacy_id, medication_id) == 5
+
+def test_expired_holds_stay_expired(app, client, headers, stocked):
+    pharmacy_id, medication_id, pharmacist = stocked()
+    reservation_id = reserve(client, headers, pharmacy_id, medication_id, 1).json['reservation']['id']
+    with app.app_context():
+        db.session.get(Reservation, reservation_id).status = 'expired'
+        db.session.commit()
+
+    assert set_status(client, pharmacist, reservation_id, 'confirmed').status_code == 409
+    assert set_status(client, pharmacist, reservation_id, 'completed').status_code == 409
+
+def test_unknown_status_is_rejected(client, headers, stocked):
+    pharmacy_id, medication_id, pharmacist = stocked()
+    reservation_id = reserve(client, headers, pharmacy_id, medication_id, 1).json['reservation']['id']
+
+    assert set_status(client, pharmacist, reservation_id, 'ready').status_code == 400
+    assert set_status(client, pharmacist, reservation_id, 'completed').status_code == 200
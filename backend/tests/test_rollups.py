@@ -0,0 +1,113 @@
+import pytest
+from datetime import date, datetime, timedelta
+from database import db
+from models import DailyStat, Medication, Pharmacy, Reservation, Subscription, User
+from utils.rollups import rebuild_daily_stats
+
+def test_admin_dashboard_totals_match_the_base_tables(app, client, headers):
+    with app.app_context():
+        pharmacy = Pharmacy.query.order_by(Pharmacy.id).first()
+        subscription = Subscription(pharmacy_id=pharmacy.id, plan_type='monthly', amount=2500, status='active')
+        db.session.add(subscription)
+        db.session.commit()
+        subscription.status = 'cancelled'
+        db.session.add(Subscription(pharmacy_id=pharmacy.id, plan_type='annual', amount=25000, status='active'))
+        db.session.commit()
+
+        active = Subscription.query.filter_by(status='active')
+        expected = {
+            'total_pharmacies': Pharmacy.query.count(),
+            'premium_subscriptions': active.count(),
+            'total_revenue': db.session.query(db.func.coalesce(db.func.sum(Subscription.amount), 0)).filter(
+                Subscription.status == 'active'
+            ).scalar(),
+            'total_users': User.query.count()
+        }
+
+    response = client.get('/api/admin/dashboard', headers=headers['admin'])
+    assert response.status_code == 200
+    assert response.json['stats'] == expected
+
+START, END = date(2023, 3, 1), date(2023, 3, 12)
+
+def rollup(start, end):
+    rows = DailyStat.query.filter(DailyStat.day.between(start, end)).all()
+    return {(row.day, row.metric, row.key): row.value for row in rows if row.value}
+
+def at(day, hour=10):
+    return datetime.combine(START + timedelta(days=day), datetime.min.time()) + timedelta(hours=hour)
+
+@pytest.fixture(scope='module')
+def history(app):
+    # Writes inside [START, END] through the ORM only, so the rollup is
+    # maintained by the events alone
+    with app.app_context():
+        owner = User(email='rollup-owner@example.com', role='pharmacist', name='Owner', password_hash='x', created_at=at(0))
+        leaving = User(email='rollup-leaving@example.com', role='patient', name='Leaving', password_hash='x', created_at=at(1))
+        db.session.add_all([owner, leaving])
+        db.session.commit()
+        pharmacy = Pharmacy(name='Rollup Pharmacy', address='Nairobi', owner_id=owner.id, created_at=at(0))
+        medication = Medication.query.order_by(Medication.id).first()
+        db.session.add(pharmacy)
+        db.session.commit()
+
+        reservations = [
+            Reservation(user_id=owner.id, pharmacy_id=pharmacy.id, medication_id=medication.id,
+                        quantity=1, status='pending', created_at=at(day))
+            for day in (2, 2, 5, 9, 11)
+        ]
+        subscriptions = [
+            Subscription(pharmacy_id=pharmacy.id, plan_type='monthly', amount=2500, status='active', created_at=at(3)),
+            Subscription(pharmacy_id=pharmacy.id, plan_type='annual', amount=25000, status='active', created_at=at(8)),
+            Subscription(pharmacy_id=pharmacy.id, plan_type='monthly', amount=2000, status='active', created_at=at(10)),
+        ]
+        db.session.add_all(reservations + subscriptions)
+        db.session.commit()
+
+        # Changes to committed (expired) instances
+        reservations[0].status = 'confirmed'
+        reservations[1].status = 'cancelled'
+        reservations[2].status = 'completed'
+        subscriptions[0].status = 'expired'
+        subscriptions[1].amount = 20000
+        db.session.delete(reservations[3])
+        db.session.delete(subscriptions[2])
+        db.session.delete(leaving)
+        db.session.commit()
+
+def test_maintained_rollup_matches_a_rebuild(app, history):
+    with app.app_context():
+        maintained = rollup(START, END)
+        assert {metric for _, metric, _ in maintained} == {
+            'registrations', 'pharmacies', 'reservations', 'medication_reservations',
+            'revenue', 'subscriptions', 'subscription_amount'
+        }
+
+        rebuild_daily_stats(start=START, end=END)
+        assert rollup(START, END) == maintained
+
+@pytest.mark.parametrize('bucket, periods', [
+    ('day', ['2023-03-01', '2023-03-03', '2023-03-04', '2023-03-06', '2023-03-09', '2023-03-12']),
+    ('week', ['2023-02-27', '2023-03-06']),
+    ('month', ['2023-03-01']),
+])
+def test_analytics_buckets(client, headers, history, bucket, periods):
+    response = client.get('/api/admin/analytics', headers=headers['admin'], query_string={
+        'start_date': START.isoformat(), 'end_date': END.isoformat(), 'bucket': bucket
+    })
+    assert response.status_code == 200
+    series = response.json['series']
+    assert [entry['period'] for entry in series] == periods
+    assert sum(entry['reservations'] for entry in series) == response.json['reservations'] == 4
+    assert response.json['reservations_by_status'] == {'pending': 1, 'confirmed': 1, 'cancelled': 1, 'completed': 1}
+    assert response.json['revenue'] == 22500
+    assert response.json['user_registrations'] == 1
+
+@pytest.mark.parametrize('args', [
+    {'bucket': 'year'},
+    {'start_date': '2023-03-10', 'end_date': '2023-03-01'},
+    {'start_date': '03/01/2023'},
+])
+def test_analytics_rejects_bad_ranges(client, headers, args):
+    response = client.get('/api/admin/analytics', headers=headers['admin'], query_string=args)
+    assert response.status_code == 400
@@ -0,0 +1,94 @@
+import pytest
+from database import db
+from models import Inventory, Medication
+from routes import patient
+from utils.search import search_medication_ids
+
+@pytest.fixture(scope='module')
+def vitamins(app):
+    with app.app_context():
+        db.session.add_all([
+            Medication(name='Vitamin C', category='Supplements', generic_name='Ascorbic Acid'),
+            Medication(name='Vitamin D2', category='Supplements', generic_name='Ergocalciferol'),
+        ])
+        db.session.commit()
+
+def search(client, headers, q):
+    response = client.get('/api/patient/medications/search', query_string={'q': q}, headers=headers['patient'])
+    assert response.status_code == 200
+    return [medication['name'] for medication in response.json['medications']]
+
+def test_short_tokens_narrow_the_match(client, headers, vitamins):
+    assert search(client, headers, 'vitamin c') == ['Vitamin C']
+    assert search(client, headers, 'vitamin d') == ['Vitamin D2']
+
+def test_short_tokens_match_word_starts_only(client, headers, vitamins):
+    # "c" is inside "Ergocalciferol", but no word of Vitamin D2 starts with it
+    assert 'Vitamin D2' not in search(client, headers, 'vitamin c')
+
+def test_typo_tolerance_keeps_short_tokens(client, headers, vitamins):
+    assert search(client, headers, 'vitamn c') == ['Vitamin C']
+
+# (lat, lng, km): the last one has a seeded pharmacy in the box corner, outside the radius
+@pytest.mark.parametrize('origin', [(-1.2864, 36.8172, 2), (-1.2864, 36.8172, 50), (-1.28527, 36.82135, 4)])
+def test_dense_areas_search_by_bounding_box(client, headers, monkeypatch, origin):
+    lat, lng, max_distance = origin
+
+    def pharmacies():
+        response = client.get('/api/patient/pharmacies/search', headers=headers['patient'], query_string={
+            'medication': 'a', 'lat': lat, 'lng': lng, 'max_distance': max_distance
+        })
+        return response.status_code, response.json
+
+    expected = pharmacies()
+    assert expected[0] == 200
+    assert all(pharmacy['distance'] <= max_distance for pharmacy in expected[1]['pharmacies'])
+    monkeypatch.setattr(patient, 'MAX_PHARMACY_IDS', 0)
+    assert pharmacies() == expected
+
+@pytest.fixture
+def two_products(app, make_pharmacist):
+    # Two products matching "zentrofen", each stocked at three pharmacies;
+    # the runner-up has the cheapest stock overall
+    pharmacy_ids = [make_pharmacist(f'zentrofen-{i}@example.com')[1] for i in range(3)]
+    with app.app_context():
+        products = [
+            Medication(name='Zentrofen 400mg', category='Painkillers', generic_name='Zentrofen'),
+            Medication(name='Zentrofen Junior Syrup', category='Painkillers', generic_name='Zentrofen'),
+        ]
+        db.session.add_all(products)
+        db.session.flush()
+        db.session.add_all([
+            Inventory(pharmacy_id=pharmacy_id, medication_id=product.id, stock_quantity=5, price=price + i)
+            for product, price in zip(products, (300, 50)) for i, pharmacy_id in enumerate(pharmacy_ids)
+        ])
+        db.session.commit()
+        return {product.id: product.name for product in products}
+
+def test_every_entry_stocks_the_top_level_medication(app, client, headers, two_products):
+    def search_pharmacies(**args):
+        response = client.get('/api/patient/pharmacies/search', headers=headers['patient'],
+                              query_string={'medication': 'zentrofen', **args})
+        assert response.status_code == 200
+        return response.json
+
+    result = search_pharmacies()
+    with app.app_context():
+        ranked = search_medication_ids('zentrofen', limit=patient.MAX_MATCHED_MEDICATIONS)
+        ranked = [medication_id for medication_id in ranked if medication_id in two_products] if ranked else sorted(two_products)
+        stocked = {(row.pharmacy_id, row.medication_id): row.price for row in Inventory.query.all()}
+
+    assert result['medication']['id'] == ranked[0]
+    assert [group['medication']['id'] for group in result['other_medications']] == ranked[1:]
+    for group in [result] + result['other_medications']:
+        medication_id = group['medication']['id']
+        assert len(group['pharmacies']) == 3
+        for pharmacy in group['pharmacies']:
+            assert 'medication_id' not in pharmacy
+            assert stocked[(pharmacy['id'], medication_id)] == pharmacy['price']
+        assert [pharmacy['price'] for pharmacy in group['pharmacies']] == sorted(stocked[(pharmacy['id'], medication_id)] for pharmacy in group['pharmacies'])
+
+    # limit applies to each product
+    limited = search_pharmacies(limit=2)
+    assert [len(group['pharmacies']) for group in [limited] + limited['other_medications']] == [2, 2]
+    assert limited['pharmacies'] == result['pharmacies'][:2]
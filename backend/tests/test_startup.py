@@ -0,0 +1,35 @@
+from sqlalchemy import event
+from app import create_app
+from config import config
+from database import db
+
+def test_create_app_touches_no_database(tmp_path, monkeypatch):
+    # The directory doesn't exist, so any connection attempt would fail
+    unreachable = tmp_path / 'missing' / 'app.db'
+    monkeypatch.setattr(config['testing'], 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{unreachable}')
+
+    app = create_app('testing')
+    with app.app_context():
+        connects = []
+        event.listen(db.engine, 'connect', lambda *args: connects.append(args))
+
+    assert app.test_client().get('/api/health').status_code == 200
+    assert connects == []
+    assert not unreachable.parent.exists()
+
+def test_create_app_neither_creates_tables_nor_seeds(tmp_path, monkeypatch):
+    path = tmp_path / 'app.db'
+    monkeypatch.setattr(config['testing'], 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{path}')
+
+    create_app('testing')
+    assert not path.exists()
+
+    # Schema and demo data are the CLI's job
+    app = create_app('testing')
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['db', 'upgrade']).exit_code == 0
+    with app.app_context():
+        assert db.session.execute(db.text('SELECT COUNT(*) FROM users')).scalar() == 0
+    assert runner.invoke(args=['seed']).exit_code == 0
+    with app.app_context():
+        assert db.session.execute(db.text('SELECT COUNT(*) FROM users')).scalar() > 0
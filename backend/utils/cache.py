@@ -0,0 +1,329 @@
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock, local
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from utils.fastjson import parse_float
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def to_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
+
+class MemoryBackend:
+    # Per-process LRU dict with TTL expiry
+    shared = False
+
+    def __init__(self, max_size=10000, ttl=300, stats=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = stats or CacheStats()
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.entries[key]
+                self.stats.expirations += 1
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+class SQLiteBackend:
+    # File-backed LRU shared by every worker process on the host.
+    # Values must be JSON serializable.
+    EVICT_EVERY = 100
+    # Eviction order only needs to be roughly right, so a hit doesn't write:
+    # entries not touched for TOUCH_INTERVAL seconds are queued and their
+    # accessed_at goes out in one transaction per TOUCH_BATCH keys (or
+    # once the oldest queued touch is TOUCH_INTERVAL old)
+    TOUCH_INTERVAL = 30  # seconds
+    TOUCH_BATCH = 100
+    shared = True
+
+    def __init__(self, path, max_size=10000, ttl=300, stats=None):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = stats or CacheStats()
+        self.local = local()
+        self.writes = 0
+        self.touches = {}
+        self.touch_lock = Lock()
+        self.touched_at = time.time()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entries ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed ON cache_entries (accessed_at)')
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT value, expires_at, accessed_at FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at, accessed_at = row
+        if expires_at is not None and expires_at < now:
+            conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+            self.stats.expirations += 1
+            return None
+
+        if now - accessed_at >= self.TOUCH_INTERVAL:
+            self.touch(key, now)
+        return json.loads(value, parse_float=parse_float, parse_constant=parse_float)
+
+    def touch(self, key, now):
+        with self.touch_lock:
+            if not self.touches:
+                self.touched_at = now
+            self.touches[key] = now
+            due = len(self.touches) >= self.TOUCH_BATCH or now - self.touched_at >= self.TOUCH_INTERVAL
+        if due:
+            self.flush_touches()
+
+    def flush_touches(self):
+        with self.touch_lock:
+            touches, self.touches = self.touches, {}
+        if not touches:
+            return
+
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            conn.executemany(
+                'UPDATE cache_entries SET accessed_at = MAX(accessed_at, ?) WHERE key = ?',
+                [(accessed_at, key) for key, accessed_at in touches.items()]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        conn = self._conn()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value), expires_at, now)
+        )
+
+        # Trimming needs a COUNT, so only do it every few writes
+        self.writes += 1
+        if self.writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        self.flush_touches()
+        conn = self._conn()
+        excess = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0] - self.max_size
+        if excess > 0:
+            cursor = conn.execute(
+                'DELETE FROM cache_entries WHERE key IN '
+                '(SELECT key FROM cache_entries ORDER BY accessed_at LIMIT ?)', (excess,)
+            )
+            self.stats.evictions += cursor.rowcount
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def clear(self):
+        self._conn().execute('DELETE FROM cache_entries')
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+
+class NullBackend:
+    # Disables caching while keeping the same interface
+    shared = False
+
+    def __init__(self, stats=None, **kwargs):
+        self.stats = stats or CacheStats()
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+class ReadThroughCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.stats = backend.stats
+
+    @staticmethod
+    def key(namespace, id):
+        return f'{namespace}:{id}'
+
+    def get(self, namespace, id, loader):
+        key = self.key(namespace, id)
+        value = self.backend.get(key)
+
+        if value is not None:
+            self.stats.hits += 1
+            return value
+
+        self.stats.misses += 1
+        value = loader()
+
+        # Missing rows are not cached so a later insert is seen immediately
+        if value is not None:
+            self.backend.set(key, value)
+        return value
+
+    def peek(self, namespace, id):
+        # Plain lookup for values that are written with put(), not loaded
+        return self.backend.get(self.key(namespace, id))
+
+    def put(self, namespace, id, value):
+        self.backend.set(self.key(namespace, id), value)
+
+    def invalidate(self, namespace, id):
+        self.stats.invalidations += 1
+        self.backend.delete(self.key(namespace, id))
+
+    def clear(self):
+        self.backend.clear()
+
+    def info(self):
+        info = self.stats.to_dict()
+        info['backend'] = type(self.backend).__name__
+        info['size'] = len(self.backend)
+        info['max_size'] = getattr(self.backend, 'max_size', None)
+        return info
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'sqlite': SQLiteBackend,
+    'null': NullBackend
+}
+
+def init_cache(app):
+    name = app.config.get('CACHE_BACKEND', 'memory')
+    options = {
+        'max_size': app.config.get('CACHE_MAX_SIZE', 10000),
+        'ttl': app.config.get('CACHE_TTL', 300)
+    }
+    if name == 'sqlite':
+        options['path'] = app.config['CACHE_PATH']
+
+    cache = ReadThroughCache(BACKENDS[name](**options))
+    app.extensions['cache'] = cache
+    return cache
+
+def get_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('cache')
+
+def cached_row(model, id, loader):
+    # Read-through lookup of a serialized row; loads directly without a cache
+    cache = get_cache()
+    if cache is None:
+        return loader()
+    return cache.get(model.__tablename__, id, loader)
+
+def cached_value(namespace, key, loader):
+    # Same as cached_row for values that aren't rows (e.g. COUNT results)
+    cache = get_cache()
+    if cache is None:
+        return loader()
+    return cache.get(namespace, key, loader)
+
+def register_invalidation(*models):
+    # Drop cached rows once the transaction that changed them commits
+    def queue_invalidation(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('cache_invalidations', set()).add(
+                (mapper.class_.__tablename__, target.id)
+            )
+
+    for model in models:
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, queue_invalidation)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    pending = session.info.pop('cache_invalidations', None)
+    cache = get_cache()
+    if pending and cache is not None:
+        for namespace, id in pending:
+            cache.invalidate(namespace, id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('cache_invalidations', None)
@@ -0,0 +1,99 @@
+import time
+from flask import current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from utils.metrics import record_serialization
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib encoding only without it
+    orjson = None
+
+COMPACT = (',', ':')
+
+class StdlibFloat(float):
+    # A float orjson spells differently from stdlib: NaN/Infinity (orjson
+    # writes null) and exponent form (1e16 and 1e-7 for 1e+16 and 1e-07).
+    # orjson refuses float subclasses, so a payload holding one goes to the
+    # stdlib encoder.
+    __slots__ = ()
+
+def exact_float(value):
+    # Both encoders write plain decimals for 1e-4 <= |value| < 1e16
+    if value and not 1e-4 <= abs(value) < 1e16:
+        return StdlibFloat(value)
+    return value
+
+def parse_float(text):
+    # json.loads() hook keeping exact_float() across a JSON round trip
+    return exact_float(float(text))
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Flask's JSON provider with orjson doing the encoding when it produces
+    # the stdlib bytes: sorted keys, compact or indent=2, ASCII only, str
+    # keys, 64-bit ints. Anything else (including the non-ASCII text that
+    # stdlib escapes, and StdlibFloat) goes through the stdlib encoder.
+    # Float columns read back through exact_float(); a float computed in a
+    # route that is NaN/Infinity or needs exponent form should be passed
+    # through it too. Without orjson installed this is the stdlib provider.
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        encoded = self._dumps(obj, **kwargs)
+        record_serialization(time.perf_counter() - start)
+        return encoded
+
+    def _dumps(self, obj, **kwargs):
+        if orjson is not None and self.sort_keys and self.ensure_ascii:
+            indent = kwargs.get('indent')
+            if set(kwargs) <= {'indent', 'separators'} and (
+                (indent == 2 and 'separators' not in kwargs) or (indent is None and kwargs.get('separators') == COMPACT)
+            ):
+                encoded = self._orjson(obj, indent == 2)
+                if encoded is not None:
+                    return encoded
+        return super().dumps(obj, **kwargs)
+
+    def _orjson(self, obj, indent):
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            encoded = orjson.dumps(obj, default=self.default, option=option)
+        except (orjson.JSONEncodeError, TypeError):
+            return None
+        return encoded.decode() if encoded.isascii() else None
+
+def stream_json(payload, key='items'):
+    # Same bytes as jsonify(payload), but payload[key] may be an iterator of
+    # item batches (Serializer.iter_dump) that is encoded and sent one batch
+    # at a time, so neither the item dicts nor the body are held in full.
+    # The first batch is encoded here, inside the caller's error handling,
+    # so a failing row still becomes an error response instead of a 200
+    # that stops halfway.
+    provider = current_app.json
+    batches = payload[key]
+    if isinstance(batches, list):
+        batches = iter([batches])
+
+    # Same switch as DefaultJSONProvider.response(); pretty output is buffered
+    if (provider.compact is None and current_app.debug) or provider.compact is False:
+        items = [item for batch in batches for item in batch]
+        return current_app.response_class(
+            provider.dumps({**payload, key: items}, indent=2) + '\n', mimetype=provider.mimetype
+        )
+
+    marker = '\x00stream\x00'
+    head, tail = provider.dumps({**payload, key: marker}, separators=COMPACT).split(
+        provider.dumps(marker, separators=COMPACT)
+    )
+    first = provider.dumps(next(batches, []), separators=COMPACT)[1:-1]
+
+    def generate():
+        yield head + '[' + first
+        separator = ',' if first else ''
+        for batch in batches:
+            if batch:
+                yield separator + provider.dumps(batch, separators=COMPACT)[1:-1]
+                separator = ','
+        yield ']' + tail + '\n'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype=provider.mimetype)
@@ -0,0 +1,209 @@
+import math
+import time
+from collections import defaultdict
+from threading import Lock
+import numpy as np
+from flask import current_app
+from sqlalchemy import event
+from models import Pharmacy
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = 111.32
+
+# Bumped whenever a pharmacy row changes so every index knows it is stale
+_generation = 0
+
+def calculate_distance(lat1, lng1, lat2, lng2):
+    # Haversine formula to calculate distance between two points
+    R = EARTH_RADIUS_KM
+
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+
+    a = (math.sin(dlat/2) * math.sin(dlat/2) +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dlng/2) * math.sin(dlng/2))
+
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    distance = R * c
+
+    return round(distance, 2)
+
+def bounding_box(lat, lng, radius_km):
+    # Smallest lat/lng box that contains every point within radius_km
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat = max(lat - dlat, -90.0)
+    max_lat = min(lat + dlat, 90.0)
+
+    cos_lat = min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+    if cos_lat <= 1e-9 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+
+    dlng = radius_km / (KM_PER_DEGREE * cos_lat)
+    return min_lat, max_lat, lng - dlng, lng + dlng
+
+def haversine_many(lat, lng, lat_rad, lng_rad, cos_lat=None):
+    # Vectorized haversine from one origin (degrees) to arrays of points
+    # already in radians; matches calculate_distance to 2 decimals
+    lat0 = math.radians(lat)
+    lng0 = math.radians(lng)
+    if cos_lat is None:
+        cos_lat = np.cos(lat_rad)
+
+    sin_dlat = np.sin((lat_rad - lat0) / 2)
+    sin_dlng = np.sin((lng_rad - lng0) / 2)
+    a = sin_dlat * sin_dlat + math.cos(lat0) * cos_lat * sin_dlng * sin_dlng
+
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return np.round(EARTH_RADIUS_KM * c, 2)
+
+def distances_from(lat, lng, lats, lngs):
+    # Batch version of calculate_distance for plain degree sequences
+    return haversine_many(
+        lat, lng,
+        np.radians(np.asarray(lats, dtype=float)),
+        np.radians(np.asarray(lngs, dtype=float))
+    )
+
+def nearest_k(distances, k):
+    # Positions of the k smallest distances, nearest first
+    if k is None or k >= len(distances):
+        return np.argsort(distances, kind='stable')
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    part = np.argpartition(distances, k - 1)[:k]
+    return part[np.argsort(distances[part], kind='stable')]
+
+class GridIndex:
+    # Buckets points into fixed-size lat/lng cells so a radius query only
+    # has to look at the handful of cells its bounding box overlaps.
+    # Coordinates are kept as arrays, pre-converted to radians.
+    def __init__(self, cell_size=0.1):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.size = 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.lats = self.lngs = np.empty(0)
+        self.lat_rad = self.lng_rad = self.cos_lat = np.empty(0)
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size))
+
+    def build(self, points):
+        points = [p for p in points if p[1] is not None and p[2] is not None]
+
+        self.size = len(points)
+        self.ids = np.array([p[0] for p in points], dtype=np.int64)
+        self.lats = np.array([p[1] for p in points], dtype=float)
+        self.lngs = np.array([p[2] for p in points], dtype=float)
+        self.lat_rad = np.radians(self.lats)
+        self.lng_rad = np.radians(self.lngs)
+        self.cos_lat = np.cos(self.lat_rad)
+
+        cells = defaultdict(list)
+        for i, (_, lat, lng) in enumerate(points):
+            cells[self._cell(lat, lng)].append(i)
+        self.cells = {key: np.array(positions, dtype=np.intp) for key, positions in cells.items()}
+
+        return self
+
+    def candidates(self, lat, lng, radius_km):
+        # Positions of the points inside the bounding box around (lat, lng)
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        row_lo, col_lo = self._cell(min_lat, min_lng)
+        row_hi, col_hi = self._cell(max_lat, max_lng)
+
+        # Longitudes past the antimeridian wrap around
+        cols = range(col_lo, col_hi + 1)
+        if min_lng < -180 or max_lng > 180:
+            cols = range(self._cell(0, -180)[1], self._cell(0, 180)[1] + 1)
+            min_lng, max_lng = -180.0, 180.0
+
+        found = [
+            self.cells[(row, col)]
+            for row in range(row_lo, row_hi + 1)
+            for col in cols
+            if (row, col) in self.cells
+        ]
+        if not found:
+            return np.empty(0, dtype=np.intp)
+
+        positions = np.concatenate(found)
+        lats = self.lats[positions]
+        lngs = self.lngs[positions]
+        mask = (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+        return positions[mask]
+
+    def within(self, lat, lng, radius_km, limit=None):
+        # Only points that survive the bounding box prefilter pay for haversine,
+        # and those are computed in a single vectorized pass
+        positions = self.candidates(lat, lng, radius_km)
+        distances = haversine_many(
+            lat, lng,
+            self.lat_rad[positions], self.lng_rad[positions], self.cos_lat[positions]
+        )
+
+        keep = distances <= radius_km
+        positions, distances = positions[keep], distances[keep]
+
+        order = nearest_k(distances, limit)
+        return list(zip(self.ids[positions[order]].tolist(), distances[order].tolist()))
+
+class PharmacyIndex:
+    # Grid index over pharmacy coordinates, rebuilt lazily after pharmacy writes.
+    # max_age bounds how stale an index can get from writes made by other workers.
+    def __init__(self, cell_size=0.1, max_age=60):
+        self.grid = GridIndex(cell_size)
+        self.max_age = max_age
+        self.generation = None
+        self.built_at = 0
+        self.lock = Lock()
+
+    def _stale(self):
+        if self.generation != _generation:
+            return True
+        return self.max_age is not None and time.monotonic() - self.built_at > self.max_age
+
+    def refresh(self, force=False):
+        if not force and not self._stale():
+            return self.grid
+
+        with self.lock:
+            if force or self._stale():
+                generation = _generation
+                rows = Pharmacy.query.with_entities(
+                    Pharmacy.id, Pharmacy.latitude, Pharmacy.longitude
+                ).filter(
+                    Pharmacy.latitude.isnot(None),
+                    Pharmacy.longitude.isnot(None)
+                ).all()
+
+                grid = GridIndex(self.grid.cell_size).build(rows)
+                self.grid = grid
+                self.generation = generation
+                self.built_at = time.monotonic()
+
+        return self.grid
+
+    def within(self, lat, lng, radius_km, limit=None):
+        return self.refresh().within(lat, lng, radius_km, limit)
+
+def get_pharmacy_index():
+    index = current_app.extensions.get('pharmacy_index')
+
+    if index is None:
+        index = PharmacyIndex(
+            cell_size=current_app.config.get('GEO_INDEX_CELL_SIZE', 0.1),
+            max_age=current_app.config.get('GEO_INDEX_MAX_AGE', 60)
+        )
+        current_app.extensions['pharmacy_index'] = index
+
+    return index
+
+@event.listens_for(Pharmacy, 'after_insert')
+@event.listens_for(Pharmacy, 'after_update')
+@event.listens_for(Pharmacy, 'after_delete')
+def _invalidate_pharmacy_index(mapper, connection, target):
+    global _generation
+    _generation += 1
@@ -1,7 +1,117 @@
-from flask import jsonify
+import base64
+import hashlib
+import json
+import time
+from datetime import datetime
+from flask import jsonify, g, current_app
 from functools import wraps
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
-from models import User
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt, create_access_token
+from sqlalchemy import event, update
+from sqlalchemy.orm import object_session
+from models import User, Pharmacy, db
+from utils.cache import cached_value, get_cache
+
+# Cache namespace of the per-user auth state checked on every protected request
+AUTH_NAMESPACE = 'auth'
+
+class AuthContext:
+    # Who is making the current request, read from the token claims
+    def __init__(self, user_id, role, pharmacy_ids=None):
+        self.user_id = user_id
+        self.role = role
+        self.pharmacy_ids = pharmacy_ids or []
+
+    @property
+    def pharmacy_id(self):
+        if self.pharmacy_ids:
+            return self.pharmacy_ids[0]
+
+        # Tokens issued before the pharmacy existed carry no ids
+        pharmacy = Pharmacy.query.with_entities(Pharmacy.id).filter_by(
+            owner_id=self.user_id
+        ).order_by(Pharmacy.id).first()
+        return pharmacy.id if pharmacy else None
+
+def current_auth():
+    return g.get('auth')
+
+def owned_pharmacy_ids(user):
+    if user.role != 'pharmacist':
+        return []
+
+    rows = Pharmacy.query.with_entities(Pharmacy.id).filter_by(
+        owner_id=user.id
+    ).order_by(Pharmacy.id).all()
+    return [row.id for row in rows]
+
+def create_user_token(user):
+    # Role, owned pharmacies and token version travel in the token so
+    # protected routes can authorize without touching the database
+    claims = {
+        'role': user.role,
+        'pharmacy_ids': owned_pharmacy_ids(user),
+        'ver': user.token_version or 0
+    }
+    return create_access_token(identity=user.id, additional_claims=claims)
+
+def _load_auth_state(user_id):
+    row = db.session.query(User.role, User.token_version).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    return {'role': row.role, 'token_version': row.token_version or 0, 'loaded_at': time.time()}
+
+def user_auth_state(user_id):
+    # Read through the cache and dropped when the user's row changes, so the
+    # worker that revokes (and every worker, with a shared backend) sees it
+    # at once. Workers with their own memory cache re-read the row once the
+    # entry is AUTH_STATE_TTL seconds old.
+    cache = get_cache()
+    if cache is None:
+        return _load_auth_state(user_id)
+
+    state = cache.get(AUTH_NAMESPACE, user_id, lambda: _load_auth_state(user_id))
+    if state is not None and time.time() - state['loaded_at'] >= current_app.config.get('AUTH_STATE_TTL', 30):
+        state = _load_auth_state(user_id)
+        if state is None:
+            cache.invalidate(AUTH_NAMESPACE, user_id)
+        else:
+            cache.put(AUTH_NAMESPACE, user_id, state)
+    return state
+
+def _queue_auth_invalidations(target, user_ids):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('cache_invalidations', set()).update(
+            (AUTH_NAMESPACE, user_id) for user_id in user_ids
+        )
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    _queue_auth_invalidations(target, [target.id])
+
+def _revoke_owner_tokens(connection, target, owner_ids):
+    # Tokens carry their owner's pharmacy ids, so a change in who owns a
+    # pharmacy revokes the tokens of everyone it affects
+    owner_ids = sorted({owner_id for owner_id in owner_ids if owner_id is not None})
+    if not owner_ids:
+        return
+
+    connection.execute(
+        update(User).where(User.id.in_(owner_ids)).values(token_version=db.func.coalesce(User.token_version, 0) + 1)
+    )
+    _queue_auth_invalidations(target, owner_ids)
+
+@event.listens_for(Pharmacy, 'after_insert')
+@event.listens_for(Pharmacy, 'after_delete')
+def _pharmacy_added_or_removed(mapper, connection, target):
+    _revoke_owner_tokens(connection, target, [target.owner_id])
+
+@event.listens_for(Pharmacy, 'after_update')
+def _pharmacy_owner_changed(mapper, connection, target):
+    history = db.inspect(target).attrs.owner_id.history
+    if history.has_changes():
+        _revoke_owner_tokens(connection, target, list(history.added) + list(history.deleted))
 
 def role_required(roles):
     def decorator(f):
@@ -9,26 +119,112 @@ def role_required(roles):
         def decorated_function(*args, **kwargs):
             verify_jwt_in_request()
             current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
-            
-            if not user or user.role not in roles:
+            claims = get_jwt()
+
+            if 'role' in claims:
+                # Revoked when the user's token_version has moved on (role change)
+                state = user_auth_state(current_user_id)
+                if not state or state['token_version'] != claims.get('ver', 0):
+                    return jsonify({'message': 'Token has been revoked, please log in again'}), 401
+
+                auth = AuthContext(current_user_id, claims['role'], claims.get('pharmacy_ids'))
+            else:
+                # Tokens issued before role claims existed
+                user = User.query.get(current_user_id)
+                if not user:
+                    return jsonify({'message': 'Access denied: insufficient permissions'}), 403
+
+                auth = AuthContext(user.id, user.role, owned_pharmacy_ids(user))
+
+            if auth.role not in roles:
                 return jsonify({'message': 'Access denied: insufficient permissions'}), 403
-                
+
+            g.auth = auth
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
-def paginate(query, page, per_page):
-    pagination = query.paginate(
-        page=page, 
-        per_page=per_page, 
-        error_out=False
-    )
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token, columns):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if len(values) != len(columns):
+            raise ValueError
+        return [
+            datetime.fromisoformat(v) if isinstance(column.type, db.DateTime) and v is not None else v
+            for column, v in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid pagination cursor')
+
+def count_total(query):
+    # COUNT(*) for cursor mode, cached for the cache TTL since it is an estimate anyway
+    count_query = query.order_by(None)
+    compiled = count_query.statement.compile(db.engine)
+    key = hashlib.sha1(f'{compiled}|{sorted(compiled.params.items())!r}'.encode()).hexdigest()
+    return cached_value('count', key, count_query.count)
+
+def paginate(query, page, per_page, keyset=None, after=None, include_total=False, serializer=None, stream=False):
+    # Default mode: LIMIT/OFFSET pages with an exact total.
+    # Cursor mode (keyset=(sort_column, id_column) and after is not None, use
+    # after='' for the first page): newest first, seeking past the previous
+    # page's last row with an index-friendly row-value comparison.
+    # stream=True (needs a serializer) leaves 'items' as a lazy iterator of
+    # batches for stream_json().
+    per_page = max(1, min(per_page, current_app.config.get('MAX_PER_PAGE', 100)))
+    
+    # Eager-load whatever the serializer declares so to_dict() does no I/O
+    if serializer is not None:
+        query = serializer.prepare(query)
+    if stream:
+        batch_size = current_app.config.get('STREAM_BATCH_SIZE', 25)
+        dump = lambda rows: serializer.iter_dump(rows, batch_size)
+    elif serializer is not None:
+        dump = serializer.dump
+    else:
+        dump = lambda rows: [row.to_dict() for row in rows]
+    
+    if keyset is None or after is None:
+        pagination = query.paginate(
+            page=page, 
+            per_page=per_page, 
+            error_out=False
+        )
+        
+        return {
+            'items': dump(pagination.items),
+            'page': pagination.page,
+            'per_page': pagination.per_page,
+            'total': pagination.total,
+            'pages': pagination.pages
+        }
+        
+    sort_column, id_column = keyset
+    base = query.order_by(None)
+    seek = base
+    
+    if after:
+        seek = seek.filter(db.tuple_(sort_column, id_column) < db.tuple_(*decode_cursor(after, keyset)))
+        
+    items = seek.order_by(sort_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    
+    result = {
+        'items': dump(items),
+        'per_page': per_page,
+        'has_more': has_more,
+        'next_cursor': encode_cursor([getattr(items[-1], column.key) for column in keyset]) if has_more else None
+    }
     
-    return {
-        'items': [item.to_dict() for item in pagination.items],
-        'page': pagination.page,
-        'per_page': pagination.per_page,
-        'total': pagination.total,
-        'pages': pagination.pages
-    }
\ No newline at end of file
+    if include_total:
+        result['total'] = count_total(base)
+        
+    return result
@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import update
+from models import Inventory, Reservation, db
+from utils.rollups import bump
+
+logger = logging.getLogger(__name__)
+
+class SweepStats:
+    def __init__(self):
+        self.runs = 0
+        self.released = 0
+        self.units = 0
+        self.last_run = None
+        self.last_released = 0
+        self.last_duration = None
+
+    def record(self, released, units, duration):
+        self.runs += 1
+        self.released += released
+        self.units += units
+        self.last_run = datetime.utcnow()
+        self.last_released = released
+        self.last_duration = duration
+
+    def to_dict(self):
+        return {
+            'runs': self.runs,
+            'released': self.released,
+            'units_returned': self.units,
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_released': self.last_released,
+            'last_duration_ms': round(self.last_duration * 1000, 2) if self.last_duration is not None else None
+        }
+
+def _release_batch(status, cutoff, batch_size):
+    # Expire up to batch_size overdue holds and return their stock in one
+    # transaction; returns (holds released, units returned), or None when a
+    # concurrent status change raced us and the batch should be retried
+    rows = db.session.query(
+        Reservation.id, Reservation.pharmacy_id, Reservation.medication_id,
+        Reservation.quantity, Reservation.created_at
+    ).filter(
+        Reservation.status == status,
+        # A hold without created_at has no age to expire by
+        Reservation.created_at.isnot(None),
+        Reservation.created_at < cutoff
+    ).order_by(Reservation.id).limit(batch_size).all()
+
+    if not rows:
+        return 0, 0
+
+    expired = db.session.execute(
+        update(Reservation).where(
+            Reservation.id.in_([row.id for row in rows]),
+            Reservation.status == status
+        ).values(status='expired').execution_options(synchronize_session=False)
+    ).rowcount
+
+    if expired != len(rows):
+        db.session.rollback()
+        return None
+
+    # One increment per SKU rather than per reservation
+    returns = defaultdict(int)
+    days = defaultdict(int)
+    for row in rows:
+        returns[(row.pharmacy_id, row.medication_id)] += row.quantity or 0
+        days[row.created_at.date()] += 1
+
+    target = db.session.query(Inventory.id).filter(
+        Inventory.pharmacy_id == db.bindparam('p'),
+        Inventory.medication_id == db.bindparam('m')
+    ).order_by(Inventory.id).limit(1).scalar_subquery()
+
+    db.session.execute(
+        update(Inventory.__table__).where(Inventory.__table__.c.id == target).values(
+            stock_quantity=Inventory.__table__.c.stock_quantity + db.bindparam('q')
+        ),
+        [{'p': p, 'm': m, 'q': q} for (p, m), q in returns.items()]
+    )
+
+    # The status UPDATE bypasses ORM events, so move the rollup counts here
+    connection = db.session.connection()
+    for day, count in days.items():
+        bump(connection, day, 'reservations', status, delta=-count)
+        bump(connection, day, 'reservations', 'expired', delta=count)
+
+    db.session.commit()
+    return len(rows), sum(returns.values())
+
+def sweep_expired_holds(ttls, batch_size=500, now=None):
+    # Expire reservations older than their status TTL and give the stock back
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    released = units = 0
+
+    for status, ttl in ttls.items():
+        cutoff = now - ttl
+        while True:
+            result = _release_batch(status, cutoff, batch_size)
+            if result is None:
+                continue
+
+            count, returned = result
+            released += count
+            units += returned
+            if count < batch_size:
+                break
+
+    return released, units, time.perf_counter() - started
+
+def run_sweep(app):
+    stats = app.extensions.setdefault('hold_sweeper', SweepStats())
+
+    with app.app_context():
+        released, units, duration = sweep_expired_holds(
+            app.config['RESERVATION_HOLD_TTLS'],
+            batch_size=app.config.get('HOLD_SWEEP_BATCH_SIZE', 500)
+        )
+
+    stats.record(released, units, duration)
+    logger.info('Released %d expired holds (%d units) in %.1f ms', released, units, duration * 1000)
+    return released, units, duration
+
+def start_hold_sweeper(app):
+    # Background sweeper thread; safe to run in several workers at once because
+    # every batch only expires reservations still in the status it read
+    interval = app.config.get('HOLD_SWEEP_INTERVAL', 300)
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                run_sweep(app)
+            except Exception:
+                logger.exception('Hold sweep failed')
+
+    thread = threading.Thread(target=loop, name='hold-sweeper', daemon=True)
+    thread.start()
+    return thread
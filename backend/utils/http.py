@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import zlib
+from datetime import datetime, timedelta, timezone
+from flask import current_app, g, request
+from sqlalchemy import func
+from database import db
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+COMPRESSIBLE = ('application/json', 'text/')
+
+def table_version(timestamp_column, id_column, *criteria):
+    # Cheap validator for a set of rows: (latest change, row count) from one
+    # aggregate query, without loading the rows
+    return query_version(db.session.query(timestamp_column), timestamp_column, id_column, *criteria)
+
+def query_version(query, timestamp_column, id_column, *criteria):
+    # Same over an existing query's joins and filters. timestamp_column may be
+    # a tuple, for rows whose body includes joined rows that change on their own.
+    columns = timestamp_column if isinstance(timestamp_column, tuple) else (timestamp_column,)
+    row = query.with_entities(*(func.max(column) for column in columns), func.count(id_column)).filter(*criteria).one()
+    stamps = [stamp for stamp in row[:-1] if stamp is not None]
+    return (max(stamps) if stamps else None, row[-1])
+
+def not_modified(*versions, last_modified=True):
+    # Registers validators for this request built from (timestamp, count)
+    # versions and extra key parts. Returns a 304 response when the client's
+    # copy is current, so the caller can skip the query and serialization.
+    # Pass last_modified=False when the body can change without a newer
+    # timestamp in the versions (counts over rows that left the set).
+    stamps = [part[0] for part in versions if isinstance(part, tuple) and part and part[0] is not None]
+    last_modified = max(stamps).replace(microsecond=0, tzinfo=timezone.utc) if stamps and last_modified else None
+    # Last-Modified has whole seconds: until that second is over, a later
+    # change could carry the same value, so leave it to the ETag
+    if last_modified and datetime.utcnow().replace(tzinfo=timezone.utc) < last_modified + timedelta(seconds=1):
+        last_modified = None
+
+    # Weak: the tag names the data, not the bytes (compression changes those)
+    etag = hashlib.sha1(repr((request.full_path,) + tuple(versions)).encode()).hexdigest()
+    g.validators = (etag, last_modified)
+
+    # If-Modified-Since only sees timestamps, not deleted rows, so the ETag
+    # decides whenever the client sent one
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        fresh = bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
+
+    if not fresh:
+        return None
+
+    response = current_app.response_class(status=304)
+    _set_validators(response)
+    return response
+
+def _set_validators(response):
+    etag, last_modified = g.validators
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Clients may keep the body but must revalidate before reusing it
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+
+def _negotiate():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def _compress_stream(chunks, compressor, finish):
+    for chunk in chunks:
+        data = compressor(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield finish()
+
+def _stream_compressor(encoding, level):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=min(level, 11))
+        return compressor.process, compressor.finish
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    return compressor.compress, compressor.flush
+
+def compress_response(response):
+    if request.method == 'HEAD' or response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    if not response.mimetype.startswith(COMPRESSIBLE):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _negotiate()
+    if encoding is None:
+        return response
+
+    level = current_app.config['COMPRESS_LEVEL']
+
+    # Streamed bodies (stream_json) are list pages; compress them as they go
+    if response.is_streamed:
+        compressor, finish = _stream_compressor(encoding, level)
+        response.response = _compress_stream(response.response, compressor, finish)
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    body = response.get_data()
+    if len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    if encoding == 'br':
+        body = brotli.compress(body, quality=min(level, 11))
+    else:
+        body = gzip.compress(body, compresslevel=level, mtime=0)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_http(app):
+    @app.after_request
+    def finish_response(response):
+        if response.status_code == 200 and g.get('validators'):
+            _set_validators(response)
+        return compress_response(response)
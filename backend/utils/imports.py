@@ -0,0 +1,304 @@
+import codecs
+import csv
+import json
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from models import Inventory, Medication, db
+
+FORMATS = ('csv', 'ndjson')
+MODES = ('set', 'add')
+
+class InvalidImport(ValueError):
+    pass
+
+class RowError(ValueError):
+    pass
+
+def detect_format(filename=None, content_type=None, requested=None):
+    if requested:
+        if requested not in FORMATS:
+            raise InvalidImport(f'Unsupported format, use one of: {", ".join(FORMATS)}')
+        return requested
+
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return 'csv'
+
+def _lines(stream):
+    # Decode the upload incrementally; only one line is held at a time
+    return codecs.getreader('utf-8-sig')(stream)
+
+def read_rows(stream, fmt):
+    # Yields (row number, dict or RowError) without buffering the upload
+    if fmt == 'csv':
+        reader = csv.DictReader(_lines(stream))
+        if reader.fieldnames:
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        for number, row in enumerate(reader, start=1):
+            yield number, row
+        return
+
+    for number, line in enumerate(_lines(stream), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, RowError('Invalid JSON')
+            continue
+        yield number, row if isinstance(row, dict) else RowError('Each line must be a JSON object')
+
+def _value(row, *names):
+    for name in names:
+        value = row.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ''):
+            return value
+    return None
+
+class MedicationLookup:
+    # Resolves medication references (id, name or generic name) in one query
+    # per chunk, remembering every answer (including misses) for the import
+    def __init__(self):
+        self.ids = {}
+        self.names = {}
+        self.generic_names = {}
+
+    @staticmethod
+    def reference(row):
+        medication_id = _value(row, 'medication_id')
+        if medication_id is not None:
+            try:
+                return 'id', int(medication_id)
+            except (TypeError, ValueError):
+                raise RowError('medication_id must be an integer')
+
+        name = _value(row, 'name', 'medication', 'medication_name')
+        if name is not None:
+            return 'name', str(name).lower()
+
+        generic_name = _value(row, 'generic_name')
+        if generic_name is not None:
+            return 'generic_name', str(generic_name).lower()
+
+        raise RowError('medication_id, name or generic_name is required')
+
+    def load(self, references):
+        wanted = {'id': set(), 'name': set(), 'generic_name': set()}
+        known = {'id': self.ids, 'name': self.names, 'generic_name': self.generic_names}
+        for kind, key in references:
+            if key not in known[kind]:
+                wanted[kind].add(key)
+
+        if wanted['id']:
+            found = {id for (id,) in db.session.query(Medication.id).filter(Medication.id.in_(wanted['id']))}
+            for id in wanted['id']:
+                self.ids[id] = id if id in found else None
+
+        # Lowest id wins when several medications share a name
+        for kind, column in (('name', Medication.name), ('generic_name', Medication.generic_name)):
+            if not wanted[kind]:
+                continue
+            lowered = func.lower(column)
+            rows = db.session.query(lowered, func.min(Medication.id)).filter(
+                lowered.in_(wanted[kind])
+            ).group_by(lowered).all()
+            found = dict(rows)
+            for key in wanted[kind]:
+                known[kind][key] = found.get(key)
+
+    def resolve(self, reference):
+        kind, key = reference
+        return {'id': self.ids, 'name': self.names, 'generic_name': self.generic_names}[kind].get(key)
+
+def parse_row(row):
+    if isinstance(row, RowError):
+        raise row
+
+    reference = MedicationLookup.reference(row)
+
+    stock_quantity = _value(row, 'stock_quantity', 'quantity', 'stock')
+    price = _value(row, 'price')
+    if stock_quantity is None and price is None:
+        raise RowError('stock_quantity or price is required')
+
+    try:
+        stock_quantity = None if stock_quantity is None else int(stock_quantity)
+    except (TypeError, ValueError):
+        raise RowError('stock_quantity must be an integer')
+    try:
+        price = None if price is None else float(price)
+    except (TypeError, ValueError):
+        raise RowError('price must be a number')
+
+    if stock_quantity is not None and stock_quantity < 0:
+        raise RowError('stock_quantity cannot be negative')
+    if price is not None and price < 0:
+        raise RowError('price cannot be negative')
+
+    return reference, stock_quantity, price
+
+class ImportReport:
+    def __init__(self, max_errors=1000):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self.aborted = None
+
+    def abort(self, number, message):
+        # A chunk failed to write: it and everything after it is skipped,
+        # earlier chunks stay committed
+        self.aborted = {'row': number, 'message': message}
+
+    def error(self, number, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': number, 'message': message})
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+            'errors_truncated': self.failed > len(self.errors),
+            'aborted': self.aborted
+        }
+
+def _write_chunk(pharmacy_id, chunk, lookup, mode, report):
+    lookup.load(reference for _, (reference, _, _) in chunk)
+
+    # Collapse repeated medications so each SKU is written once per chunk
+    merged = {}
+    for number, (reference, stock_quantity, price) in chunk:
+        medication_id = lookup.resolve(reference)
+        if medication_id is None:
+            report.error(number, 'Medication not found')
+            continue
+
+        if medication_id in merged:
+            _, previous_stock, previous_price = merged[medication_id]
+            if stock_quantity is None:
+                stock_quantity = previous_stock
+            elif mode == 'add' and previous_stock is not None:
+                stock_quantity += previous_stock
+            if price is None:
+                price = previous_price
+        merged[medication_id] = (number, stock_quantity, price)
+
+    if not merged:
+        return
+
+    # Only to tell inserts from updates in the report, and to require a
+    # price for new SKUs; the writes themselves are upserts
+    existing = _stocked(pharmacy_id, merged)
+
+    table = Inventory.__table__
+    now = datetime.utcnow()
+    upserts = {}
+    updates = []
+    for medication_id, (number, stock_quantity, price) in merged.items():
+        if price is None:
+            if medication_id not in existing:
+                report.error(number, 'price is required for medications not yet in inventory')
+                continue
+            # Stock only: the SKU exists and keeps its price
+            updates.append({'m': medication_id, 'new_stock': stock_quantity})
+            continue
+
+        # executemany needs identical parameter sets, so group rows by
+        # whether they change the stock level
+        upserts.setdefault(stock_quantity is not None, []).append({
+            'pharmacy_id': pharmacy_id,
+            'medication_id': medication_id,
+            'stock_quantity': stock_quantity or 0,
+            'price': price,
+            'updated_at': now
+        })
+
+    for has_stock, params in upserts.items():
+        statement = _insert(table)
+        values = {'price': statement.excluded.price, 'updated_at': statement.excluded.updated_at}
+        if has_stock:
+            values['stock_quantity'] = statement.excluded.stock_quantity
+            if mode == 'add':
+                values['stock_quantity'] = table.c.stock_quantity + statement.excluded.stock_quantity
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.pharmacy_id, table.c.medication_id], set_=values
+        ), params)
+
+    if updates:
+        stock = db.bindparam('new_stock')
+        db.session.execute(table.update().where(
+            table.c.pharmacy_id == pharmacy_id,
+            table.c.medication_id == db.bindparam('m')
+        ).values(
+            stock_quantity=table.c.stock_quantity + stock if mode == 'add' else stock,
+            updated_at=now
+        ), updates)
+
+    db.session.commit()
+    written = [row['medication_id'] for params in upserts.values() for row in params] + [row['m'] for row in updates]
+    report.inserted += sum(1 for medication_id in written if medication_id not in existing)
+    report.updated += sum(1 for medication_id in written if medication_id in existing)
+
+def _stocked(pharmacy_id, medication_ids):
+    return {medication_id for (medication_id,) in db.session.query(Inventory.medication_id).filter(
+        Inventory.pharmacy_id == pharmacy_id,
+        Inventory.medication_id.in_(medication_ids)
+    )}
+
+def _insert(table):
+    # INSERT ... ON CONFLICT needs the dialect's own insert() construct
+    dialects = {'sqlite': sqlite, 'postgresql': postgresql}
+    name = db.session.get_bind().dialect.name
+    if name not in dialects:
+        raise InvalidImport(f'Inventory import does not support {name} databases')
+    return dialects[name].insert(table)
+
+def import_inventory(pharmacy_id, rows, mode='set', chunk_size=1000, max_errors=1000):
+    # Upsert parsed rows into a pharmacy's inventory, one transaction per chunk.
+    # mode='set' replaces stock levels (POS exports), 'add' increments them.
+    if mode not in MODES:
+        raise InvalidImport(f'Unsupported mode, use one of: {", ".join(MODES)}')
+
+    report = ImportReport(max_errors=max_errors)
+    lookup = MedicationLookup()
+    chunk = []
+
+    for number, row in rows:
+        report.rows += 1
+        try:
+            chunk.append((number, parse_row(row)))
+        except RowError as e:
+            report.error(number, str(e))
+            continue
+
+        if len(chunk) >= chunk_size:
+            if not _write(pharmacy_id, chunk, lookup, mode, report):
+                return report
+            chunk = []
+
+    if chunk:
+        _write(pharmacy_id, chunk, lookup, mode, report)
+
+    return report
+
+def _write(pharmacy_id, chunk, lookup, mode, report):
+    try:
+        _write_chunk(pharmacy_id, chunk, lookup, mode, report)
+        return True
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        report.abort(chunk[0][0], str(e.orig if getattr(e, 'orig', None) is not None else e))
+        return False
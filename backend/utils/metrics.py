@@ -0,0 +1,186 @@
+import hmac
+import time
+from bisect import bisect_left
+from threading import Lock
+from flask import abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Prometheus' default latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class EndpointStats:
+    __slots__ = ('buckets', 'duration', 'statuses', 'statements', 'sql_seconds', 'response_bytes')
+
+    def __init__(self, bucket_count):
+        self.buckets = [0] * (bucket_count + 1)  # last slot is +Inf
+        self.duration = 0.0
+        self.statuses = {}
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.response_bytes = 0
+
+class Metrics:
+    # In-process request metrics per (endpoint, method). Each worker process
+    # keeps its own, so with several gunicorn workers a scrape sees the
+    # worker that answered it.
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.bucket_bounds = tuple(buckets)
+        self.endpoints = {}
+        self.lock = Lock()
+
+    def observe(self, endpoint, method, status, duration, statements, sql_seconds, response_bytes):
+        key = (endpoint, method)
+        with self.lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats(len(self.bucket_bounds))
+            stats.buckets[bisect_left(self.bucket_bounds, duration)] += 1
+            stats.duration += duration
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.statements += statements
+            stats.sql_seconds += sql_seconds
+            stats.response_bytes += response_bytes
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        with self.lock:
+            snapshot = [
+                (endpoint, method, list(stats.buckets), stats.duration, dict(stats.statuses),
+                 stats.statements, stats.sql_seconds, stats.response_bytes)
+                for (endpoint, method), stats in sorted(self.endpoints.items())
+            ]
+
+        lines = [
+            '# HELP pharmalink_http_requests_total Requests handled, by endpoint, method and status.',
+            '# TYPE pharmalink_http_requests_total counter',
+        ]
+        for endpoint, method, _, _, statuses, _, _, _ in snapshot:
+            for status, count in sorted(statuses.items()):
+                lines.append(f'pharmalink_http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP pharmalink_http_request_duration_seconds Time from routing to the last body byte.',
+            '# TYPE pharmalink_http_request_duration_seconds histogram',
+        ]
+        for endpoint, method, buckets, duration, _, _, _, _ in snapshot:
+            labels = f'endpoint="{endpoint}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(self.bucket_bounds + ('+Inf',), buckets):
+                cumulative += count
+                lines.append(f'pharmalink_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'pharmalink_http_request_duration_seconds_sum{{{labels}}} {duration:.6f}')
+            lines.append(f'pharmalink_http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+        for name, help_text, index, fmt in (
+            ('pharmalink_db_statements_total', 'SQL statements executed while handling requests.', 5, '{}'),
+            ('pharmalink_db_duration_seconds_total', 'Time spent executing SQL while handling requests.', 6, '{:.6f}'),
+            ('pharmalink_http_response_bytes_total', 'Response body bytes sent (after compression).', 7, '{}'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for row in snapshot:
+                lines.append(f'{name}{{endpoint="{row[0]}",method="{row[1]}"}} ' + fmt.format(row[index]))
+
+        return '\n'.join(lines) + '\n'
+
+class RequestTiming:
+    __slots__ = ('start', 'statements', 'sql_seconds', 'json_seconds', 'status', 'response_bytes')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.json_seconds = 0.0
+        self.status = 500
+        self.response_bytes = 0
+
+def request_timing():
+    if has_request_context():
+        return g.get('request_timing')
+    return None
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_start'] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start']
+    timing = request_timing()
+    if timing is not None:
+        timing.statements += 1
+        timing.sql_seconds += elapsed
+
+def record_serialization(seconds):
+    # Called by the JSON provider for each encode
+    timing = request_timing()
+    if timing is not None:
+        timing.json_seconds += seconds
+
+def _count_bytes(chunks, timing):
+    for chunk in chunks:
+        timing.response_bytes += len(chunk)
+        yield chunk
+
+def _server_timing(timing):
+    # Covers the work done before the headers went out; a streamed body's
+    # queries and encoding happen later and only reach /api/metrics
+    total = (time.perf_counter() - timing.start) * 1000
+    return (
+        f'db;dur={timing.sql_seconds * 1000:.2f};desc="{timing.statements} queries", '
+        f'json;dur={timing.json_seconds * 1000:.2f}, '
+        f'app;dur={total:.2f}'
+    )
+
+def init_metrics(app):
+    metrics = Metrics()
+    app.extensions['metrics'] = metrics
+    if not app.config.get('METRICS_ENABLED', True):
+        return metrics
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_timing():
+        g.request_timing = RequestTiming()
+
+    # Registered ahead of the compression hook so it runs after it (Flask
+    # runs after_request functions in reverse) and sees the final body
+    @app.after_request
+    def finish_timing(response):
+        timing = g.get('request_timing')
+        if timing is None:
+            return response
+        timing.status = response.status_code
+        if current_app.config.get('SERVER_TIMING'):
+            response.headers['Server-Timing'] = _server_timing(timing)
+        if response.is_streamed:
+            response.response = _count_bytes(response.response, timing)
+        else:
+            timing.response_bytes = response.calculate_content_length() or 0
+        return response
+
+    # Runs once the request context is gone, which for stream_with_context
+    # responses is after the last chunk has been sent
+    @app.teardown_request
+    def record_request(error):
+        timing = g.pop('request_timing', None)
+        if timing is None:
+            return
+        metrics.observe(
+            request.endpoint or 'unmatched', request.method, timing.status,
+            time.perf_counter() - timing.start, timing.statements, timing.sql_seconds, timing.response_bytes
+        )
+
+    @app.route('/api/metrics')
+    def export_metrics():
+        token = current_app.config.get('METRICS_TOKEN')
+        if not token:
+            # Open only where the app isn't serving the public
+            if not (current_app.debug or current_app.testing):
+                abort(404)
+        elif not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            return current_app.response_class('Unauthorized\n', status=401, mimetype='text/plain')
+        return current_app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    return metrics
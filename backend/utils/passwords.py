@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+from flask import current_app, has_app_context, has_request_context
+
+DEFAULT_ROUNDS = 12
+
+class HasherBusy(RuntimeError):
+    pass
+
+def _init_worker(nice):
+    # Hashing yields the CPU to the request threads of the web worker
+    if nice and hasattr(os, 'nice'):
+        os.nice(nice)
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _verify(password_hash, password):
+    return bcrypt.checkpw(password, password_hash.encode('utf-8'))
+
+def hash_rounds(password_hash):
+    # Cost factor of a "$2b$12$..." hash, None if it isn't a bcrypt hash
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    # bcrypt in a bounded process pool. At most workers + max_queue calls are
+    # in flight per web worker process; beyond that, or when a call outlasts
+    # timeout, HasherBusy is raised instead of queueing, so a login burst
+    # can't take every request thread. workers=0 hashes inline in the calling
+    # thread, as do calls outside a request (CLI commands, seeding, scripts).
+    # Spawned workers re-import __main__: a script that serves requests
+    # through the pool (e.g. with the test client) needs the
+    # `if __name__ == '__main__':` guard, like benchmarks/bench_login.py.
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=0, max_queue=0, timeout=None, nice=0):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self.nice = nice
+        self.slots = threading.BoundedSemaphore(workers + max_queue) if workers else None
+        self.lock = threading.Lock()
+        self.pool = None
+        self.pid = None
+
+    def _executor(self):
+        # Started on first use, so create_app stays cheap, and again in a
+        # forked child (gunicorn --preload). Workers are spawned rather than
+        # forked from a process holding database connections and threads.
+        with self.lock:
+            if self.pool is None or self.pid != os.getpid():
+                self.pool = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker, initargs=(self.nice,)
+                )
+                self.pid = os.getpid()
+            return self.pool
+
+    def _run(self, fn, *args):
+        if not self.workers or not has_request_context():
+            return fn(*args)
+        if not self.slots.acquire(blocking=False):
+            raise HasherBusy('Too many sign-ins in progress, try again shortly')
+
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        # The slot is held until the hash is done, even if the caller timed out
+        future.add_done_callback(lambda _: self.slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HasherBusy('Sign-in is taking longer than usual, try again shortly')
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call
+            with self.lock:
+                self.pool = None
+            raise
+
+    def hash(self, password):
+        return self._run(_hash, password.encode('utf-8'), self.rounds)
+
+    def verify(self, password_hash, password):
+        return self._run(_verify, password_hash, password.encode('utf-8'))
+
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+
+_inline = PasswordHasher()
+
+def password_hasher():
+    # The app's hasher, or inline hashing at the default cost outside an app
+    if has_app_context():
+        hasher = current_app.extensions.get('password_hasher')
+        if hasher is not None:
+            return hasher
+    return _inline
+
+def init_password_hasher(app):
+    hasher = PasswordHasher(
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_ROUNDS),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 0),
+        max_queue=app.config.get('PASSWORD_HASH_MAX_QUEUE', 0),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT'),
+        nice=app.config.get('PASSWORD_HASH_NICE', 0)
+    )
+    app.extensions['password_hasher'] = hasher
+    return hasher
@@ -0,0 +1,133 @@
+import logging
+import os
+import re
+import sys
+import time
+import traceback
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class NPlusOneError(RuntimeError):
+    pass
+
+# Literals and bind lists vary between the repetitions of one query
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_BIND_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)|\(\s*%\(\w+\)s(?:\s*,\s*%\(\w+\)s)*\s*\)')
+_NAMED_BINDS = re.compile(r'%\(\w+\)s|:\w+')
+_SPACE = re.compile(r'\s+')
+
+_fingerprints = {}
+
+def fingerprint(statement):
+    # Normalized form of a statement: literals and binds become ?, IN lists
+    # of any length collapse to (?), whitespace is folded
+    cached = _fingerprints.get(statement)
+    if cached is not None:
+        return cached
+
+    normalized = _NAMED_BINDS.sub('?', _LITERALS.sub('?', statement))
+    normalized = _SPACE.sub(' ', _BIND_LISTS.sub('(?)', normalized)).strip()
+    if len(_fingerprints) < 10000:
+        _fingerprints[statement] = normalized
+    return normalized
+
+def _app_stack():
+    # The caller's frames inside this code base, innermost first. Only
+    # (file, line, function) is kept; source lines are read when reported.
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(BACKEND_DIR) and 'site-packages' not in filename:
+            frames.append((filename, frame.f_lineno, frame.f_code.co_name))
+        frame = frame.f_back
+    return frames
+
+def format_stack(frames):
+    summary = traceback.StackSummary.from_list([(filename, line, name, None) for filename, line, name in reversed(frames)])
+    return ''.join(summary.format())
+
+def allow_repeated_queries(f):
+    # For views that deliberately run the same statement per batch (bulk
+    # imports, sweeps); skips the N+1 check for the request
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        g.query_watch_exempt = True
+        return f(*args, **kwargs)
+    return decorated
+
+def _watch(conn, cursor, statement, parameters, context, executemany):
+    conn.info['watch_start'] = time.perf_counter()
+
+    if not has_request_context() or g.get('query_watch_exempt'):
+        return
+    seen = g.get('query_watch')
+    if seen is None:
+        return
+
+    key = fingerprint(statement)
+    entry = seen.get(key)
+    if entry is None:
+        seen[key] = [1, _app_stack()]
+        return
+
+    entry[0] += 1
+    config = current_app.config
+    if entry[0] > config['N_PLUS_ONE_THRESHOLD'] and config['N_PLUS_ONE_RAISE']:
+        error = NPlusOneError(
+            f'{request.endpoint}: statement repeated {entry[0]} times in one request '
+            f'(threshold {config["N_PLUS_ONE_THRESHOLD"]}): {key}\nFirst issued at:\n{format_stack(entry[1])}'
+        )
+        # Kept for raise_swallowed(): the view's own except may turn this into a 500
+        g.query_watch_error = error
+        raise error
+
+def _log_slow(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('watch_start', None)
+    if start is None or not has_app_context() or not current_app.config.get('QUERY_WATCH_ENABLED'):
+        return
+
+    elapsed = (time.perf_counter() - start) * 1000
+    if elapsed >= current_app.config['SLOW_QUERY_MS']:
+        endpoint = request.endpoint if has_request_context() else None
+        logger.warning('Slow query (%.1f ms) in %s: %s', elapsed, endpoint or '-', fingerprint(statement))
+
+def init_query_watch(app):
+    if not app.config.get('QUERY_WATCH_ENABLED'):
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', _watch):
+        event.listen(Engine, 'before_cursor_execute', _watch)
+        event.listen(Engine, 'after_cursor_execute', _log_slow)
+
+    @app.before_request
+    def start_watch():
+        g.query_watch = {}
+
+    # Routes catch every exception into a JSON 500; raise the N+1 again once
+    # the view has returned so it reaches Flask (and the test) either way
+    @app.after_request
+    def raise_swallowed(response):
+        error = g.pop('query_watch_error', None)
+        if error is not None:
+            raise error
+        return response
+
+    @app.teardown_request
+    def report_repeats(error):
+        seen = g.pop('query_watch', None)
+        if not seen or g.get('query_watch_exempt'):
+            return
+        threshold = app.config['N_PLUS_ONE_THRESHOLD']
+        for key, (count, stack) in seen.items():
+            if count > threshold:
+                logger.warning(
+                    'Possible N+1 in %s: statement ran %d times (threshold %d): %s\nFirst issued at:\n%s',
+                    request.endpoint, count, threshold, key, format_stack(stack)
+                )
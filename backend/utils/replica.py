@@ -0,0 +1,57 @@
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+from database import REPLICA_BIND, RoutingSession
+from utils.cache import get_cache
+from utils.helpers import current_auth
+
+def replica_configured():
+    return REPLICA_BIND in (current_app.config.get('SQLALCHEMY_BINDS') or {})
+
+def init_replica(app):
+    # The read-your-writes stamp lives in the cache, so every worker has to
+    # see the same one: without a shared backend a user could read their own
+    # write stale from the replica on another worker (or always, with null)
+    if REPLICA_BIND not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        return
+    if not app.extensions['cache'].backend.shared:
+        raise RuntimeError(
+            'REPLICA_DATABASE_URL needs a cache shared between workers for read-your-writes, '
+            f"set CACHE_BACKEND=sqlite (is {app.config.get('CACHE_BACKEND')!r})"
+        )
+
+def _current_user_id():
+    auth = current_auth()
+    return auth.user_id if auth is not None else None
+
+def recently_wrote(user_id):
+    # True inside the read-your-writes window after the user's last commit.
+    # The stamp lives in the shared cache (init_replica insists on one) so
+    # every worker sees it.
+    cache = get_cache()
+    if cache is None or user_id is None:
+        return False
+
+    stamp = cache.peek('last_write', user_id)
+    return stamp is not None and time.time() - stamp < current_app.config['READ_YOUR_WRITES_WINDOW']
+
+def read_replica(view):
+    # Route this view's reads to the replica bind, unless the caller wrote
+    # something within READ_YOUR_WRITES_WINDOW seconds
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if replica_configured() and not recently_wrote(_current_user_id()):
+            g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stamp_write(session):
+    if not session.info.get('wrote') or not has_request_context():
+        return
+
+    cache = get_cache()
+    user_id = _current_user_id()
+    if cache is not None and user_id is not None:
+        cache.put('last_write', user_id, time.time())
@@ -0,0 +1,255 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import User, Pharmacy, Reservation, Subscription, DailyStat, db
+
+BUCKETS = ('day', 'week', 'month')
+
+def _day(value):
+    if value is None:
+        return datetime.utcnow().date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def bump(connection, day, metric, key='', delta=1):
+    # Add delta to one rollup cell, creating it if needed, on the
+    # connection of the flush that triggered it
+    if not delta:
+        return
+
+    table = DailyStat.__table__
+    values = {'day': day, 'metric': metric, 'key': str(key), 'value': delta}
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else pg_insert
+        statement = insert(table).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=['day', 'metric', 'key'],
+            set_={'value': table.c.value + statement.excluded.value}
+        )
+        connection.execute(statement)
+        return
+
+    updated = connection.execute(
+        table.update().where(
+            table.c.day == day, table.c.metric == metric, table.c.key == str(key)
+        ).values(value=table.c.value + delta)
+    )
+    if not updated.rowcount:
+        connection.execute(table.insert().values(**values))
+
+def _previous(target, attribute):
+    history = db.inspect(target).attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attribute)
+
+def _keep_previous(target, value, oldvalue, initiator):
+    pass
+
+# Load the old value when one of these is set on an expired instance (after
+# a commit), so _previous() sees what the rollup counted
+for _attribute in (Reservation.status, Subscription.status, Subscription.amount):
+    event.listen(_attribute, 'set', _keep_previous, active_history=True)
+
+@event.listens_for(User, 'after_insert')
+def _user_inserted(mapper, connection, target):
+    bump(connection, _day(target.created_at), 'registrations')
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    bump(connection, _day(target.created_at), 'registrations', delta=-1)
+
+@event.listens_for(Pharmacy, 'after_insert')
+def _pharmacy_inserted(mapper, connection, target):
+    bump(connection, _day(target.created_at), 'pharmacies')
+
+@event.listens_for(Pharmacy, 'after_delete')
+def _pharmacy_deleted(mapper, connection, target):
+    bump(connection, _day(target.created_at), 'pharmacies', delta=-1)
+
+@event.listens_for(Reservation, 'after_insert')
+def _reservation_inserted(mapper, connection, target):
+    day = _day(target.created_at)
+    bump(connection, day, 'reservations', target.status)
+    bump(connection, day, 'medication_reservations', target.medication_id)
+
+def reservation_status_changed(connection, created_at, old_status, new_status):
+    # Also called directly by set-based UPDATEs that bypass ORM events
+    if old_status != new_status:
+        day = _day(created_at)
+        bump(connection, day, 'reservations', old_status, delta=-1)
+        bump(connection, day, 'reservations', new_status)
+
+@event.listens_for(Reservation, 'after_update')
+def _reservation_updated(mapper, connection, target):
+    reservation_status_changed(connection, target.created_at, _previous(target, 'status'), target.status)
+
+@event.listens_for(Reservation, 'after_delete')
+def _reservation_deleted(mapper, connection, target):
+    day = _day(target.created_at)
+    bump(connection, day, 'reservations', target.status, delta=-1)
+    bump(connection, day, 'medication_reservations', target.medication_id, delta=-1)
+
+def _subscription_day(target):
+    return _day(target.created_at or target.start_date)
+
+def _subscription_counted(connection, day, status, amount, sign):
+    # Subscriptions and their amounts by status, for the dashboard totals
+    bump(connection, day, 'subscriptions', status, delta=sign)
+    bump(connection, day, 'subscription_amount', status, delta=sign * (amount or 0))
+
+@event.listens_for(Subscription, 'after_insert')
+def _subscription_inserted(mapper, connection, target):
+    day = _subscription_day(target)
+    bump(connection, day, 'revenue', delta=target.amount or 0)
+    _subscription_counted(connection, day, target.status, target.amount, 1)
+
+@event.listens_for(Subscription, 'after_update')
+def _subscription_updated(mapper, connection, target):
+    day = _subscription_day(target)
+    old_amount, old_status = _previous(target, 'amount'), _previous(target, 'status')
+    bump(connection, day, 'revenue', delta=(target.amount or 0) - (old_amount or 0))
+    if (old_status, old_amount) != (target.status, target.amount):
+        _subscription_counted(connection, day, old_status, old_amount, -1)
+        _subscription_counted(connection, day, target.status, target.amount, 1)
+
+@event.listens_for(Subscription, 'after_delete')
+def _subscription_deleted(mapper, connection, target):
+    day = _subscription_day(target)
+    bump(connection, day, 'revenue', delta=-(target.amount or 0))
+    _subscription_counted(connection, day, target.status, target.amount, -1)
+
+def rebuild_daily_stats(start=None, end=None):
+    # Compaction job: recompute the rollup for [start, end] (whole history
+    # by default) from the base tables. Fixes drift from bulk writes that
+    # bypass ORM events.
+    def in_range(column):
+        conditions = []
+        if start is not None:
+            conditions.append(column >= datetime.combine(start, datetime.min.time()))
+        if end is not None:
+            conditions.append(column < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        return conditions
+
+    subscription_created = func.coalesce(Subscription.created_at, Subscription.start_date)
+    sources = [
+        ('registrations', func.date(User.created_at), None, func.count(User.id), in_range(User.created_at)),
+        ('pharmacies', func.date(Pharmacy.created_at), None, func.count(Pharmacy.id), in_range(Pharmacy.created_at)),
+        ('reservations', func.date(Reservation.created_at), Reservation.status,
+         func.count(Reservation.id), in_range(Reservation.created_at)),
+        ('medication_reservations', func.date(Reservation.created_at), Reservation.medication_id,
+         func.count(Reservation.id), in_range(Reservation.created_at)),
+        ('revenue', func.date(subscription_created), None,
+         func.coalesce(func.sum(Subscription.amount), 0), in_range(subscription_created)),
+        ('subscriptions', func.date(subscription_created), Subscription.status,
+         func.count(Subscription.id), in_range(subscription_created)),
+        ('subscription_amount', func.date(subscription_created), Subscription.status,
+         func.coalesce(func.sum(Subscription.amount), 0), in_range(subscription_created)),
+    ]
+
+    rows = []
+    for metric, day, key, value, conditions in sources:
+        columns = [day, value] if key is None else [day, key, value]
+        query = db.session.query(*columns).filter(*conditions).group_by(*columns[:-1])
+
+        for result in query.all():
+            if result[0] is None:
+                continue
+            rows.append({
+                'day': _day(result[0]),
+                'metric': metric,
+                'key': '' if key is None else str(result[1]),
+                'value': result[-1]
+            })
+
+    delete = DailyStat.query
+    if start is not None:
+        delete = delete.filter(DailyStat.day >= start)
+    if end is not None:
+        delete = delete.filter(DailyStat.day <= end)
+    delete.delete(synchronize_session=False)
+
+    if rows:
+        db.session.execute(DailyStat.__table__.insert(), rows)
+    db.session.commit()
+
+    return len(rows)
+
+def backfill_daily_stats():
+    # Populate an empty rollup from existing history (first run after upgrade)
+    if DailyStat.query.first() is None and User.query.first() is not None:
+        rebuild_daily_stats()
+
+def bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+def stats_series(start, end, bucket='day'):
+    # Totals and per-bucket series for [start, end], read only from the rollup
+    rows = db.session.query(
+        DailyStat.day, DailyStat.metric, DailyStat.key, DailyStat.value
+    ).filter(
+        DailyStat.day.between(start, end),
+        DailyStat.metric != 'medication_reservations',
+        # Cells bumped back to zero would show as empty buckets until a rebuild
+        DailyStat.value != 0
+    ).all()
+
+    def empty():
+        return {'registrations': 0, 'reservations': 0, 'reservations_by_status': defaultdict(int), 'revenue': 0}
+
+    totals = empty()
+    buckets = defaultdict(empty)
+    for day, metric, key, value in rows:
+        for target in (totals, buckets[bucket_start(_day(day), bucket)]):
+            if metric == 'reservations':
+                target['reservations'] += int(value)
+                target['reservations_by_status'][key] += int(value)
+            elif metric == 'registrations':
+                target['registrations'] += int(value)
+            elif metric == 'revenue':
+                target['revenue'] += value
+
+    series = []
+    for period in sorted(buckets):
+        entry = buckets[period]
+        entry['reservations_by_status'] = dict(entry['reservations_by_status'])
+        entry['period'] = period.isoformat()
+        series.append(entry)
+
+    totals['reservations_by_status'] = dict(totals['reservations_by_status'])
+    return totals, series
+
+def running_totals():
+    # All-time totals for the admin dashboard, summed over the rollup's days
+    # (ix_daily_stats_metric_key_day) rather than counted from base rows
+    rows = db.session.query(DailyStat.metric, DailyStat.key, func.sum(DailyStat.value)).filter(
+        DailyStat.metric.in_(('registrations', 'pharmacies', 'subscriptions', 'subscription_amount'))
+    ).group_by(DailyStat.metric, DailyStat.key).all()
+    values = {(metric, key): value for metric, key, value in rows}
+
+    return {
+        'users': int(values.get(('registrations', ''), 0)),
+        'pharmacies': int(values.get(('pharmacies', ''), 0)),
+        'active_subscriptions': int(values.get(('subscriptions', 'active'), 0)),
+        'active_revenue': values.get(('subscription_amount', 'active'), 0)
+    }
+
+def popular_medication_ids(start, end, limit=5):
+    total = func.sum(DailyStat.value)
+    rows = db.session.query(DailyStat.key, total).filter(
+        DailyStat.metric == 'medication_reservations',
+        DailyStat.day.between(start, end)
+    ).group_by(DailyStat.key).having(total > 0).order_by(total.desc()).limit(limit).all()
+
+    return [(int(key), int(count)) for key, count in rows]
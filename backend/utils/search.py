@@ -0,0 +1,144 @@
+import re
+from flask import current_app
+from sqlalchemy import text, or_
+from models import Medication, db
+
+FTS_TABLE = 'medications_fts'
+
+# Column weights for bm25 ranking: name, generic_name, category
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Minimum trigram overlap for a fuzzy (typo-tolerant) match to be kept
+FUZZY_THRESHOLD = 0.3
+
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, generic_name, category,
+        content='medications', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS medications_fts_ai AFTER INSERT ON medications BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, generic_name, category)
+        VALUES (new.id, new.name, new.generic_name, new.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS medications_fts_ad AFTER DELETE ON medications BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, generic_name, category)
+        VALUES ('delete', old.id, old.name, old.generic_name, old.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS medications_fts_au AFTER UPDATE ON medications BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, generic_name, category)
+        VALUES ('delete', old.id, old.name, old.generic_name, old.category);
+        INSERT INTO {FTS_TABLE}(rowid, name, generic_name, category)
+        VALUES (new.id, new.name, new.generic_name, new.category);
+    END""",
+]
+
+def init_medication_search(engine):
+    # Create the FTS5 index and its sync triggers; returns False on engines
+    # without FTS5 so callers fall back to LIKE matching
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': FTS_TABLE}
+            ).first()
+
+            for statement in FTS_SCHEMA:
+                conn.execute(text(statement))
+
+            # Index rows that existed before the FTS table did
+            if not exists:
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    except Exception:
+        return False
+
+    return True
+
+def fts_enabled():
+    enabled = current_app.extensions.get('medication_fts')
+
+    if enabled is None:
+        engine = db.engine
+        enabled = engine.dialect.name == 'sqlite' and db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': FTS_TABLE}
+        ).first() is not None
+        current_app.extensions['medication_fts'] = enabled
+
+    return enabled
+
+def _tokens(term):
+    return [token for token in re.split(r'\s+', term.strip().lower()) if token]
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+def _quote(token):
+    return '"' + token.replace('"', '""') + '"'
+
+def _similarity(term, *values):
+    wanted = set().union(*(_trigrams(token) for token in _tokens(term)))
+    best = 0.0
+    for value in values:
+        if not value or not wanted:
+            continue
+        have = set().union(*(_trigrams(token) for token in _tokens(value)))
+        if have:
+            best = max(best, len(wanted & have) / len(wanted | have))
+    return best
+
+def _escape_like(token):
+    return token.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+def _fts_query(match, limit, short=()):
+    # short: tokens under 3 characters, which the trigram index can't hold;
+    # each must still start a word of the name, generic name or category
+    weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+    params = {'match': match, 'limit': limit}
+    conditions = ''
+    for i, token in enumerate(short):
+        params[f'start{i}'] = _escape_like(token) + '%'
+        params[f'word{i}'] = '% ' + _escape_like(token) + '%'
+        conditions += ' AND (' + ' OR '.join(
+            f"m.{column} LIKE :start{i} ESCAPE '!' OR m.{column} LIKE :word{i} ESCAPE '!'"
+            for column in ('name', 'generic_name', 'category')
+        ) + ')'
+
+    return db.session.execute(text(
+        f"""SELECT m.id, m.name, m.generic_name
+            FROM {FTS_TABLE} JOIN medications m ON m.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH :match{conditions}
+            ORDER BY bm25({FTS_TABLE}, {weights}), m.id
+            LIMIT :limit"""
+    ), params).all()
+
+def search_medication_ids(term, limit=10):
+    # Ranked medication ids matching term on name, generic_name or category.
+    # Returns None when the FTS index can't answer so callers use LIKE.
+    tokens = [token for token in _tokens(term) if len(token) >= 3]
+    short = [token for token in _tokens(term) if len(token) < 3]
+
+    if not tokens or not fts_enabled():
+        return None
+
+    # Substring/prefix match: trigram tokenizer matches any 3+ char fragment;
+    # shorter ones ("vitamin c") are matched as word prefixes with LIKE
+    rows = _fts_query(' AND '.join(_quote(token) for token in tokens), limit, short)
+
+    if not rows:
+        # Typo tolerance: any shared trigram, then keep the close ones
+        grams = set().union(*(_trigrams(token) for token in tokens))
+        candidates = _fts_query(' OR '.join(_quote(gram) for gram in sorted(grams)), limit * 5, short)
+        rows = [
+            row for row in candidates
+            if _similarity(term, row.name, row.generic_name) >= FUZZY_THRESHOLD
+        ][:limit]
+
+    return [row.id for row in rows]
+
+def medication_filter(term):
+    # LIKE fallback used when FTS is unavailable or the term is too short
+    return or_(
+        Medication.name.ilike(f'%{term}%'),
+        Medication.generic_name.ilike(f'%{term}%')
+    )
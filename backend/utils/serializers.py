@@ -0,0 +1,153 @@
+from contextlib import contextmanager
+from flask import current_app, has_app_context
+from sqlalchemy import Date, DateTime, event, inspect as db_inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import contains_eager, joinedload, selectinload, raiseload
+from models import (
+    User, Pharmacy, Medication, Inventory, Reservation, Subscription, Advertisement,
+    LazyLoadError, strict_serialization, related_dict
+)
+
+def strict_mode():
+    return has_app_context() and current_app.config.get('RAISE_ON_LAZY_LOAD', False)
+
+@contextmanager
+def no_io(serializer):
+    # In strict mode any SQL issued while serializing is a missing eager load
+    token = strict_serialization.set(serializer if strict_mode() else None)
+    try:
+        yield
+    finally:
+        strict_serialization.reset(token)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _guard_serialization(conn, cursor, statement, parameters, context, executemany):
+    serializer = strict_serialization.get()
+    if serializer is not None:
+        raise LazyLoadError(
+            f'{serializer!r} issued SQL during serialization, declare the relation: {statement}'
+        )
+
+# Field lists mirroring each model's to_dict(), in the same order. Dumped by
+# reading the instance __dict__ directly, which skips the attribute
+# descriptors and per-relation inspect() that to_dict() goes through.
+# tests/test_json.py checks each one against to_dict() field by field.
+FIELDS = {
+    User: ('id', 'email', 'role', 'name', 'phone', 'created_at'),
+    Pharmacy: ('id', 'name', 'address', 'latitude', 'longitude', 'phone', 'subscription_status', 'created_at'),
+    Medication: ('id', 'name', 'category', 'description', 'generic_name'),
+    Inventory: ('id', 'pharmacy_id', 'medication_id', 'stock_quantity', 'price', 'updated_at', 'medication'),
+    Reservation: ('id', 'user_id', 'pharmacy_id', 'medication_id', 'quantity', 'unit_price', 'status',
+                  'customer_name', 'customer_phone', 'notes', 'created_at', 'medication', 'pharmacy'),
+    Subscription: ('id', 'pharmacy_id', 'plan_type', 'amount', 'start_date', 'end_date', 'status'),
+    Advertisement: ('id', 'title', 'content', 'image_url', 'advertiser_name', 'budget', 'clicks',
+                    'impressions', 'active', 'created_at')
+}
+
+COLUMN, TIMESTAMP, RELATION = range(3)
+
+_dumpers = {}
+
+def row_dumper(model):
+    # Build (once per model) a function equivalent to model.to_dict().
+    # Rows with expired attributes fall back to to_dict().
+    if model in _dumpers:
+        return _dumpers[model]
+
+    mapper = db_inspect(model)
+    fields = []
+    for name in FIELDS[model]:
+        if name in mapper.relationships:
+            target = mapper.relationships[name].mapper.class_
+            fields.append((name, RELATION, row_dumper(target), target))
+        elif isinstance(mapper.columns[name].type, (Date, DateTime)):
+            fields.append((name, TIMESTAMP, None, None))
+        else:
+            fields.append((name, COLUMN, None, None))
+    fields = tuple(fields)
+
+    def dump(row):
+        d = row.__dict__
+        data = {}
+        try:
+            for name, kind, nested, target in fields:
+                if kind == COLUMN:
+                    data[name] = d[name]
+                elif kind == TIMESTAMP:
+                    value = d[name]
+                    data[name] = value.isoformat() if value is not None else None
+                elif name in d:
+                    value = d[name]
+                    data[name] = nested(value) if value is not None else None
+                else:
+                    data[name] = related_dict(row, name, target)
+        except KeyError:
+            return row.to_dict()
+        return data
+
+    _dumpers[model] = dump
+    return dump
+
+class Serializer:
+    # Declares which relations an endpoint's to_dict() needs so they are
+    # loaded with the query instead of one lazy load per row
+    def __init__(self, model, relations=(), joined=()):
+        self.model = model
+        self.relations = tuple(relations)
+        self.joined = tuple(joined)
+        self.dump_row = row_dumper(model)
+
+    def __repr__(self):
+        return f'Serializer({self.model.__name__}, {self.relations})'
+
+    def with_joined(self, *names):
+        # Same serializer for a query that already joins these relations
+        # (to filter on them); they are populated from that join
+        return Serializer(self.model, self.relations, self.joined + names)
+
+    def options(self):
+        options = []
+        for name in self.relations:
+            attribute = getattr(self.model, name)
+            if name in self.joined:
+                loader = contains_eager
+            # Collections get their own IN query; many-to-one rides along as a join
+            elif attribute.property.uselist:
+                loader = selectinload
+            else:
+                loader = joinedload
+            options.append(loader(attribute))
+
+        if strict_mode():
+            options.append(raiseload('*'))
+        return options
+
+    def prepare(self, query):
+        return query.options(*self.options())
+
+    def dump(self, rows):
+        dump_row = self.dump_row
+        with no_io(self):
+            return [dump_row(row) for row in rows]
+
+    def iter_dump(self, rows, batch_size=25):
+        # dump() in lists of batch_size items, for stream_json(). Each batch
+        # is dumped in one go so the strict-mode guard is never left set
+        # while the response waits to send it.
+        dump_row = self.dump_row
+        for start in range(0, len(rows), batch_size):
+            with no_io(self):
+                batch = [dump_row(row) for row in rows[start:start + batch_size]]
+            yield batch
+
+    def dump_one(self, row):
+        with no_io(self):
+            return self.dump_row(row)
+
+# Shared declarations for the list endpoints
+reservations = Serializer(Reservation, relations=('medication', 'pharmacy'))
+inventory_items = Serializer(Inventory, relations=('medication',))
+users = Serializer(User)
+pharmacies = Serializer(Pharmacy)
+subscriptions = Serializer(Subscription)
+advertisements = Serializer(Advertisement)